@@ -0,0 +1,27 @@
+# Generated by Django 4.0.7 on 2026-10-18 16:12
+
+import accounts.utils
+from django.db import migrations, models
+import django.db.models.deletion
+import utils.storage
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('common', '0001_initial'),
+        ('accounts', '0002_initial'),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name='certificatedocument',
+            name='document',
+            field=models.FileField(blank=True, null=True, storage=utils.storage.ContentAddressedStorage(), upload_to='', validators=[accounts.utils.verify_document_mime_type, accounts.utils.verify_document_size]),
+        ),
+        migrations.AddField(
+            model_name='certificatedocument',
+            name='blob',
+            field=models.ForeignKey(blank=True, editable=False, null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='certificate_documents', to='common.contentblob'),
+        ),
+    ]
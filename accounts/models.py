@@ -31,6 +31,7 @@ from authorization.role_list import (
 from common.location.models import City, State, Country
 
 from utils.db_interactors import get_record_by_filters, db_get_family, get_single_record_by_filters, db_add_many_to_many_field_data
+from utils.storage import content_addressed_storage
 
 
 class User(AbstractUser):
@@ -205,7 +206,15 @@ class CertificateDocument(Model):
 
     name = CharField(_('Name'), choices=Name.choices, max_length=50)
     document_no = CharField(_('Document Number'), max_length=50, null=True, blank=True)
-    document = FileField(validators=[verify_document_mime_type, verify_document_size], null=True, blank=True)
+    document = FileField(
+        storage=content_addressed_storage, validators=[verify_document_mime_type, verify_document_size], null=True,
+        blank=True
+    )
+    # Deduplicated blob behind document, set once the upload is stored
+    blob = ForeignKey(
+        'common.ContentBlob', on_delete=SET_NULL, null=True, blank=True, editable=False,
+        related_name='certificate_documents'
+    )
     status = CharField(_('Status'), choices=Status.choices, max_length=50, default=Status.SAVED)
     # add company FK
     def __str__(self):
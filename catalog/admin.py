@@ -9,7 +9,7 @@ from utils.admin import CustomBaseModelAdmin
 
 @admin.register(Category)
 class CategoryAdmin(CustomBaseModelAdmin):
-	list_display = ('id', 'name',)
+	list_display = ('id', 'name', 'parent')
 	search_fields = ['id', 'name']
 	model = Category
 	verbose_name = "Category"
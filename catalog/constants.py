@@ -1,5 +1,153 @@
 CATALOG_PERMISSION_ERROR_MESSAGE = 'You do not have permission to perform this action on catalog endpoint.'
 PRODUCT_NOT_EXIST_ERROR = 'Product does not exist.'
 PRODUCT_CREATE_SUCCESS = 'Product Created Successfully.'
+PRODUCT_UPDATE_SUCCESS = 'Product Updated Successfully.'
+PRODUCT_DELETE_SUCCESS = 'Product Deleted Successfully.'
 PRODUCT_LIST_SUCCESS = 'Product list fetched Successfully.'
 PRODUCT_RETRIEVE_SUCCESS = 'Product details fetched Successfully.'
+PRODUCT_SEARCH_SUCCESS = 'Product search results fetched Successfully.'
+
+PRODUCT_SEARCH_INDEX = 'products'
+PRODUCT_SEARCH_INDEXING_CHUNK_SIZE = 500
+
+SEARCH_CONFIG = 'english'
+
+AUTOCOMPLETE_SUCCESS = 'Autocomplete suggestions fetched Successfully.'
+AUTOCOMPLETE_MIN_LENGTH = 2
+AUTOCOMPLETE_DEFAULT_LIMIT = 10
+AUTOCOMPLETE_MAX_LIMIT = 20
+AUTOCOMPLETE_CACHE_KEY = 'CATALOG-AUTOCOMPLETE:{limit}-{text_hash}'
+AUTOCOMPLETE_CACHE_TIMEOUT = 60  # Seconds
+
+PRODUCT_DETAIL_VERSION_KEY = 'PRODUCT-DETAIL-VERSION:{product_id}'
+# Bumped when products move in or out of filtered lists without a change of their own `updated`
+PRODUCT_MEMBERSHIP_VERSION_KEY = 'PRODUCT-MEMBERSHIP-VERSION'
+# Set while every product has a card, see ProductViewSet.lists_from_cards
+PRODUCT_CARDS_COMPLETE_KEY = 'PRODUCT-CARDS:COMPLETE'
+PRODUCT_CARDS_COMPLETE_TIMEOUT = 300  # Seconds
+PRODUCT_DETAIL_CACHE_KEY = 'PRODUCT-DETAIL:{product_id}-{version}'
+PRODUCT_DETAIL_CACHE_HITS_KEY = 'PRODUCT-DETAIL-CACHE:HITS'
+PRODUCT_DETAIL_CACHE_MISSES_KEY = 'PRODUCT-DETAIL-CACHE:MISSES'
+PRODUCT_DETAIL_CACHE_TIMEOUT = 86400  # Seconds
+
+PRODUCT_FACETS_SUCCESS = 'Product facets fetched Successfully.'
+PRODUCT_FACETS_CACHE_KEY = 'CATALOG-FACETS:{filters_hash}'
+PRODUCT_FACETS_CACHE_TIMEOUT = 60  # Seconds
+# Query parameters that change the page or its shape but not the filtered set
+NON_FILTER_QUERY_PARAMS = ['page', 'page_size', 'cursor', 'ordering', 'fields', 'expand']
+
+# Free-text quantity units normalized to a base unit (unit, multiplier) before they are stored in the numeric
+# shadow columns. Units missing here (pcs, boxes, cartons, ...) are stored as written.
+QUANTITY_UNIT_CONVERSIONS = {
+    'mg': ('g', '0.001'),
+    'g': ('g', '1'), 'gm': ('g', '1'), 'gms': ('g', '1'), 'gr': ('g', '1'), 'gram': ('g', '1'), 'grams': ('g', '1'),
+    'kg': ('g', '1000'), 'kgs': ('g', '1000'), 'kilo': ('g', '1000'), 'kilos': ('g', '1000'),
+    'kilogram': ('g', '1000'), 'kilograms': ('g', '1000'),
+    't': ('g', '1000000'), 'ton': ('g', '1000000'), 'tons': ('g', '1000000'), 'tonne': ('g', '1000000'),
+    'tonnes': ('g', '1000000'), 'mt': ('g', '1000000'),
+    'lb': ('g', '453.59237'), 'lbs': ('g', '453.59237'), 'oz': ('g', '28.349523125'),
+    'ml': ('ml', '1'), 'cl': ('ml', '10'), 'dl': ('ml', '100'),
+    'l': ('ml', '1000'), 'lt': ('ml', '1000'), 'ltr': ('ml', '1000'), 'ltrs': ('ml', '1000'),
+    'litre': ('ml', '1000'), 'litres': ('ml', '1000'), 'liter': ('ml', '1000'), 'liters': ('ml', '1000'),
+}
+QUANTITY_MAX_DIGITS = 14
+QUANTITY_DECIMAL_PLACES = 3
+QUANTITY_UNIT_MAX_LENGTH = 20
+
+MIN_PRODUCT_RATING = 1
+MAX_PRODUCT_RATING = 5
+
+PRODUCT_REVIEW_LIST_SUCCESS = 'Product reviews fetched Successfully.'
+PRODUCT_REVIEW_CREATE_SUCCESS = 'Product review added Successfully.'
+PRODUCT_REVIEW_RETRIEVE_SUCCESS = 'Product review fetched Successfully.'
+PRODUCT_REVIEW_NOT_EXIST_ERROR = 'Product review does not exist.'
+PRODUCT_REVIEWS_VERSION_KEY = 'PRODUCT-REVIEWS-VERSION:{product_id}'
+PRODUCT_REVIEWS_CACHE_KEY = 'PRODUCT-REVIEWS:{product_id}-{page_size}-{version}'
+PRODUCT_REVIEWS_CACHE_TIMEOUT = 86400  # Seconds
+
+PRODUCT_BULK_SUCCESS = 'Products fetched Successfully.'
+PRODUCT_BULK_IDS_REQUIRED_ERROR = 'Provide a comma separated list of product ids in `ids`.'
+PRODUCT_BULK_MAX_IDS = 100
+PRODUCT_BULK_MAX_IDS_ERROR = f'At most {PRODUCT_BULK_MAX_IDS} products can be fetched at once.'
+
+SPARSE_FIELDS_QUERY_PARAM = 'fields'
+SPARSE_EXPAND_QUERY_PARAM = 'expand'
+
+PRODUCT_EXPORT_FORMATS = {'ndjson': 'application/x-ndjson', 'csv': 'text/csv'}
+PRODUCT_EXPORT_DEFAULT_FORMAT = 'ndjson'
+PRODUCT_EXPORT_FORMAT_ERROR = f'file_format must be one of {", ".join(PRODUCT_EXPORT_FORMATS)}.'
+PRODUCT_EXPORT_CHUNK_SIZE = 1000
+PRODUCT_EXPORT_FIELDS = (
+    'id', 'name', 'description', 'advance_payment', 'shelf_life', 'packaging_details', 'grade', 'bar_code',
+    'bar_code_type', 'is_private_label_available', 'rating_average', 'rating_count', 'review_count', 'updated'
+)
+PRODUCT_EXPORT_VARIANT_FIELDS = (
+    'net_weight_per_volume', 'gross_weight_per_volume', 'quantity_per_carton', 'quantity_of_items_per_pallete',
+    'volume'
+)
+PRODUCT_EXPORT_SHIPPING_FIELDS = (
+    'quantity_in_the_box', 'payment_terms', 'moq', 'ltl_available', 'lead_time_first_shipment', 'annual_production',
+    'min_no_boxes_pallet', 'max_no_boxes_pallet', 'max_no_items_in_full_40_inch_container', 'shipment_terms',
+    'shipping_modes', 'types_of_pallets_used'
+)
+PRODUCT_EXPORT_COLUMNS = (
+    *PRODUCT_EXPORT_FIELDS, 'manufacturer_name', 'brand_name', 'supplier_name', 'supplier_address', 'image',
+    'variants', 'shipping'
+)
+
+CATALOG_SNAPSHOT_DIRECTORY = 'catalog/snapshots'
+CATALOG_SNAPSHOT_MANIFEST = 'manifest.json'
+ALL_PRODUCTS_SNAPSHOT_KEY = 'all'
+CATALOG_SNAPSHOT_CHUNK_SIZE = 1000
+CATALOG_SNAPSHOTS_SUCCESS = 'Catalog snapshots fetched Successfully.'
+CATALOG_SNAPSHOT_LOCK_KEY = 'CATALOG-SNAPSHOTS:LOCK'
+CATALOG_SNAPSHOT_LOCK_TIMEOUT = 3600  # Seconds
+
+PRODUCT_IMAGE_THUMBNAIL_SIZE = 160  # Pixels, square
+PRODUCT_IMAGE_THUMBNAIL_QUALITY = 85
+PRODUCT_IMAGE_WIDTHS = (320, 640, 1024)  # Pixels, WebP srcset candidates
+PRODUCT_IMAGE_WEBP_QUALITY = 80
+PRODUCT_IMAGE_DERIVATIVES_DIRECTORY = 'derivatives'
+PRODUCT_IMAGE_DERIVATIVES_BATCH_SIZE = 50
+
+# Failed card rebuilds are retried by a task, waiting 30s, 60s, 120s... between attempts
+PRODUCT_CARD_REFRESH_MAX_RETRIES = 6
+PRODUCT_CARD_REFRESH_RETRY_DELAY = 30  # Seconds
+
+# Product.additional_data keys filtered on often enough to get their own expression index and ?data_<key>= filter.
+# Adding a key here needs a migration for its index (makemigrations picks it up); keys must be valid identifiers.
+PRODUCT_DATA_INDEXED_KEYS = ('origin',)
+
+CATEGORY_TREE_VERSION_KEY = 'CATEGORY-TREE-VERSION'
+CATEGORY_DESCENDANTS_CACHE_KEY = 'CATEGORY-DESCENDANTS:{category_id}-{version}'
+CATEGORY_DESCENDANTS_CACHE_TIMEOUT = 86400  # Seconds
+
+SUPPLIER_STOREFRONT_SUCCESS = 'Supplier products fetched Successfully.'
+SUPPLIER_STOREFRONT_SUMMARY_SUCCESS = 'Supplier storefront summary fetched Successfully.'
+SUPPLIER_NOT_EXIST_ERROR = 'Supplier does not exist.'
+SUPPLIER_STOREFRONT_VERSION_KEY = 'SUPPLIER-STOREFRONT-VERSION:{supplier_id}'
+SUPPLIER_STOREFRONT_SUMMARY_CACHE_KEY = 'SUPPLIER-STOREFRONT-SUMMARY:{supplier_id}-{version}-{tree_version}'
+SUPPLIER_STOREFRONT_SUMMARY_CACHE_TIMEOUT = 86400  # Seconds
+
+SIMILAR_PRODUCTS_COUNT = 10  # Neighbors stored per product
+SIMILAR_PRODUCTS_DIMENSIONS = 1024  # Hashed bag-of-words buckets; 4 KB of float32 per product
+SIMILAR_PRODUCTS_BLOCK_SIZE = 1024  # Rows per side of each similarity matrix product
+SIMILAR_PRODUCTS_SAVE_BATCH_SIZE = 1000  # Products whose neighbors are replaced per transaction
+SIMILAR_PRODUCTS_MIN_SCORE = 0.05  # Cosine similarity below which a neighbor is not worth showing
+# Weight of the tokens of each text source in the product vectors
+SIMILAR_PRODUCTS_FIELD_WEIGHTS = {'name': 2.0, 'categories': 1.5, 'description': 1.0, 'ingredients': 1.0}
+SIMILAR_PRODUCTS_LOCK_KEY = 'SIMILAR-PRODUCTS:LOCK'
+SIMILAR_PRODUCTS_LOCK_TIMEOUT = 3600  # Seconds
+SIMILAR_PRODUCTS_SUCCESS = 'Similar products fetched Successfully.'
+
+# Redis bitmap with the bit of every in-stock product id set, see catalog.utils.get_product_stock_bits
+PRODUCT_STOCK_BITMAP_KEY = 'PRODUCT-STOCK:BITMAP'
+PRODUCT_IN_STOCK_QUERY_PARAM = 'in_stock'
+
+PRODUCT_CHANGES_SUCCESS = 'Product changes fetched Successfully.'
+PRODUCT_CHANGES_TOKEN_ERROR = 'Invalid change token.'
+PRODUCT_CHANGES_DEFAULT_LIMIT = 500  # Log entries per batch
+PRODUCT_CHANGES_MAX_LIMIT = 2000
+
+# Nested product listing keys sent as JSON strings in multipart requests, next to the `images` uploads
+PRODUCT_LISTING_JSON_KEYS = ['variants', 'shipping', 'category', 'additional_data']
@@ -1,11 +1,852 @@
+from decimal import Decimal
+
+from django.contrib.postgres.aggregates import ArrayAgg
+from django.contrib.postgres.search import SearchVector, SearchVectorField, TrigramWordSimilarity
+from django.db import connection
+from django.db.models import Prefetch, Q, Max, Min, Count, F, DecimalField, Exists, OuterRef, Subquery, Value
+from django.db.models.expressions import CombinedExpression, RawSQL
+from django.db.models.functions import Greatest, Cast, Coalesce, NullIf
+from django.db.transaction import atomic
+from django.utils.timezone import now
+
+from .constants import (
+    SEARCH_CONFIG, MIN_PRODUCT_RATING, MAX_PRODUCT_RATING, PRODUCT_EXPORT_FIELDS, PRODUCT_EXPORT_VARIANT_FIELDS,
+    PRODUCT_EXPORT_SHIPPING_FIELDS
+)
+
 from .models import (
     Product, Category, ProductVariant,
     ProductConfig, SupplierProducts,
     Manufacturer, ProductReview,
     ProductRatings, ProductImages,
-    ShippingAndOrdering
+    ShippingAndOrdering, ProductCard, CatalogSnapshot, SimilarProduct, ProductSimilarityState, ProductChange
+)
+from accounts.models import AccountManager
+from common.db_interactors import db_get_content_blob_ids, db_delete_unrecorded_content_blobs
+from utils.helpers import get_image_path
+from .utils import get_cached_category_descendant_ids, set_cached_category_descendant_ids
+from .serializers import ProductListSerializer
+
+
+# The manufacturer's stored vector is folded in, so one GIN index answers searches for the product and its brand
+PRODUCT_SEARCH_VECTOR = CombinedExpression(
+    SearchVector('name', weight='A', config=SEARCH_CONFIG)
+    + SearchVector('description', weight='B', config=SEARCH_CONFIG)
+    + SearchVector('packaging_details', weight='C', config=SEARCH_CONFIG),
+    '||',
+    Coalesce(
+        Subquery(Manufacturer.objects.filter(id=OuterRef('manufacturer_id')).values('search_vector')[:1]),
+        Value('', output_field=SearchVectorField())
+    ),
+    output_field=SearchVectorField()
+)
+MANUFACTURER_SEARCH_VECTOR = (
+    SearchVector('name', weight='A', config=SEARCH_CONFIG)
+    + SearchVector('brand_name', weight='A', config=SEARCH_CONFIG)
+    + SearchVector('ingredients', weight='C', config=SEARCH_CONFIG)
 )
 
 
 def db_get_all_products():
-    return Product.objects.defer("created", "updated").order_by("-id")
\ No newline at end of file
+    return Product.objects.defer("created", "updated").order_by("-id")
+
+
+def get_product_suppliers_prefetch():
+    return Prefetch(
+        'supplierproducts_set',
+        queryset=SupplierProducts.objects.select_related('supplier').order_by('id'),
+        to_attr='prefetched_suppliers'
+    )
+
+
+def get_product_images_prefetch():
+    return Prefetch('product_images', queryset=ProductImages.objects.order_by('id'), to_attr='prefetched_images')
+
+
+def get_product_shipping_prefetch():
+    return Prefetch('product', queryset=ShippingAndOrdering.objects.order_by('id'), to_attr='prefetched_shipping')
+
+
+def db_prefetch_product_list_data(queryset):
+    """
+    Resolve manufacturer, suppliers and images for a whole page of products in a fixed number of queries.
+    """
+    return queryset.select_related('manufacturer').prefetch_related(
+        get_product_suppliers_prefetch(), get_product_images_prefetch()
+    )
+
+
+def db_prefetch_product_details_data(queryset):
+    return db_prefetch_product_list_data(queryset).prefetch_related(get_product_shipping_prefetch())
+
+
+def db_get_product_list_queryset():
+    # `updated` stays loaded, the list validators of a keyset page are read from its rows
+    return db_prefetch_product_list_data(Product.objects.defer('created').order_by('-id'))
+
+
+def db_get_sparse_product_queryset(fields: list = None, extra_columns: list = None):
+    """
+    Product queryset loading only what the given serializer fields render: the product columns through .only(),
+    the manufacturer join and the supplier, image and shipping prefetches only when a field reads them.
+    `extra_columns` are loaded as well, e.g. the ordering columns read by keyset pagination.
+    """
+    fields = set(fields)
+    product_columns = {field.name for field in Product._meta.concrete_fields}
+    columns = {'id', *(fields & product_columns), *(extra_columns or ())}
+    queryset = Product.objects.all()
+    if 'manufacturer' in fields:
+        manufacturer_columns = [
+            f'manufacturer__{field.name}' for field in Manufacturer._meta.concrete_fields
+            if field.name != 'search_vector'
+        ]
+        columns.update(['manufacturer', *manufacturer_columns])
+        queryset = queryset.select_related('manufacturer')
+    elif 'manufacturer_name' in fields:
+        columns.update(['manufacturer', 'manufacturer__name'])
+        queryset = queryset.select_related('manufacturer')
+    if fields & {'supplier_name', 'supplier_address'}:
+        queryset = queryset.prefetch_related(get_product_suppliers_prefetch())
+    if fields & {'image', 'image_srcset'}:
+        queryset = queryset.prefetch_related(get_product_images_prefetch())
+    if 'shipping_data' in fields:
+        queryset = queryset.prefetch_related(get_product_shipping_prefetch())
+    return queryset.only(*columns).order_by('-id')
+
+
+def db_get_product_details(_id: int = None):
+    try:
+        return True, db_prefetch_product_details_data(Product.objects.all()).get(id=_id)
+    except Exception as e:
+        return False, str(e)
+
+
+def replace_product_children(model, product: Product = None, rows: list = None, created: bool = False):
+    if not created:
+        # Deleted through the ORM so the per row delete handlers, e.g. derivative cleanup, still run
+        model.objects.filter(product=product).delete()
+    for row in rows:
+        row.product = product
+        if hasattr(row, 'populate_numeric_fields'):
+            # bulk_create skips save(), which fills the numeric shadow fields
+            row.populate_numeric_fields()
+    return model.objects.bulk_create(rows)
+
+
+def db_save_product_listing(product: Product = None, data: dict = None, supplier_ids: list = None):
+    """
+    Creates or updates a product together with its variants, shipping terms, images, stock config and categories
+    in one transaction. Every nested key present in `data` replaces the stored rows of that table with a single
+    bulk INSERT, so a listing costs the same number of INSERTs however many variants or images it carries.
+    A created product is linked to the `supplier_ids` companies, whose managers may then edit it.
+
+    bulk_create sends no post_save. The product save already refreshes its card and cached details on commit,
+    which covers the children; the created images are returned so their derivatives can be scheduled. Image files
+    are stored before their rows exist, so on failure the blobs no committed row records are removed again.
+    Returns (status, (product, images)).
+    """
+    data = dict(data)
+    variants, shipping = data.pop('variants', None), data.pop('shipping', None)
+    uploads, is_in_stock = data.pop('images', None), data.pop('is_in_stock', None)
+    categories = data.pop('category', None)
+    stored_files = []
+    try:
+        with atomic():
+            created = product is None
+            product = product or Product()
+            for name, value in data.items():
+                setattr(product, name, value)
+            product.save()
+
+            if variants is not None:
+                replace_product_children(
+                    ProductVariant, product, [ProductVariant(**variant) for variant in variants], created
+                )
+            if shipping is not None:
+                replace_product_children(
+                    ShippingAndOrdering, product, [ShippingAndOrdering(**terms) for terms in shipping], created
+                )
+            images = None
+            if uploads is not None:
+                images = []
+                for upload in uploads:
+                    image = ProductImages(product=product)
+                    # Stored first so the blob rows can be created in bulk and linked in the INSERT
+                    image.image.save(upload.name, upload, save=False)
+                    stored_files.append(image.image)
+                    images.append(image)
+                status, blob_ids = db_get_content_blob_ids(files=[image.image for image in images])
+                if not status:
+                    raise Exception(blob_ids)
+                for image in images:
+                    image.blob_id = blob_ids.get(image.image.name)
+                images = replace_product_children(ProductImages, product, images, created)
+            if is_in_stock is not None:
+                # A single row, saved normally so the availability bitmap follows
+                if not created:
+                    ProductConfig.objects.filter(product=product).delete()
+                ProductConfig.objects.create(product=product, is_in_stock=is_in_stock)
+            if categories is not None:
+                product.category.set(categories)
+            if created:
+                for supplier_id in supplier_ids or ():
+                    SupplierProducts.objects.create(product=product, supplier_id=supplier_id)
+            return True, (product, images)
+    except Exception as e:
+        if stored_files:
+            db_delete_unrecorded_content_blobs(files=stored_files)
+        return False, str(e)
+
+
+def db_delete_product(product: Product = None):
+    try:
+        return True, product.delete()
+    except Exception as e:
+        return False, str(e)
+
+
+def db_get_managed_company_ids(user=None) -> list:
+    return list(AccountManager.objects.filter(user=user).values_list('company_id', flat=True))
+
+
+def db_get_products_details_in_bulk(product_ids: list = None):
+    """
+    {id: product} of the existing products among product_ids, with the detail relations prefetched for all of
+    them at once.
+    """
+    try:
+        return True, db_prefetch_product_details_data(Product.objects.all()).in_bulk(product_ids)
+    except Exception as e:
+        return False, str(e)
+
+
+def db_get_all_product_cards():
+    return ProductCard.objects.order_by('-pk')
+
+
+def db_get_sparse_product_cards(fields: list = None, extra_columns: list = None):
+    card_columns = {field.name for field in ProductCard._meta.concrete_fields}
+    columns = {'product', *(set(fields) & card_columns), *(extra_columns or ())}
+    return db_get_all_product_cards().only(*columns)
+
+
+def db_get_product_ids_by_manufacturer(manufacturer_id: int = None) -> list:
+    return list(Product.objects.filter(manufacturer_id=manufacturer_id).values_list('id', flat=True))
+
+
+def db_get_product_ids_by_supplier(supplier_id: int = None) -> list:
+    return list(SupplierProducts.objects.filter(supplier_id=supplier_id).values_list('product_id', flat=True))
+
+
+def db_get_supplier_ids_by_products(product_ids: list = None) -> list:
+    return list(
+        SupplierProducts.objects.filter(product_id__in=product_ids).values_list('supplier_id', flat=True).distinct()
+    )
+
+
+def db_get_product_ids_by_category(category_id: int = None) -> list:
+    return list(Product.category.through.objects.filter(category_id=category_id).values_list('product_id', flat=True))
+
+
+def db_get_supplier_product_cards(supplier_id: int = None):
+    """
+    Product cards of one supplier. The semi-join reads the supplier's product ids straight off the
+    (supplier, product) unique index, so the cost follows the page size rather than the catalog size.
+    """
+    return db_get_all_product_cards().filter(
+        product_id__in=SupplierProducts.objects.filter(supplier_id=supplier_id).values('product_id')
+    )
+
+
+def db_get_supplier_storefront_summary(supplier_id: int = None):
+    """
+    Product count of a supplier and its products per category, most populated categories first.
+    """
+    try:
+        supplier_products = SupplierProducts.objects.filter(supplier_id=supplier_id)
+        categories = Product.category.through.objects.filter(
+            product_id__in=supplier_products.values('product_id')
+        ).values('category_id', 'category__name', 'category__parent_id').annotate(
+            count=Count('product_id')
+        ).order_by('-count', 'category__name')
+        return True, {
+            'product_count': supplier_products.count(),
+            'categories': [
+                {
+                    'id': category['category_id'], 'name': category['category__name'],
+                    'parent': category['category__parent_id'], 'count': category['count']
+                }
+                for category in categories
+            ]
+        }
+    except Exception as e:
+        return False, str(e)
+
+
+def db_refresh_product_cards(product_ids: list = None):
+    """
+    Rebuild the ProductCard rows of the given products from ProductListSerializer output.
+    Cards of products that no longer exist are dropped.
+    """
+    try:
+        products = db_prefetch_product_list_data(Product.objects.filter(id__in=product_ids))
+        cards = [
+            ProductCard(product_id=data.pop('id'), **data)
+            for data in ProductListSerializer(products, many=True).data
+        ]
+        with atomic():
+            ProductCard.objects.filter(product_id__in=product_ids).delete()
+            return True, ProductCard.objects.bulk_create(cards)
+    except Exception as e:
+        return False, str(e)
+
+
+def append_product_changes(changes: dict):
+    """
+    Appends {product_id: ProductChange.Action} to the change log inside the current transaction, stamped with
+    its transaction id. Readers stop short of the transactions still in progress instead of writers queueing
+    on a lock, see db_get_product_changes.
+    """
+    if not changes:
+        return []
+    with atomic():
+        with connection.cursor() as cursor:
+            cursor.execute('SELECT txid_current()')
+            transaction_id = cursor.fetchone()[0]
+        return ProductChange.objects.bulk_create([
+            ProductChange(product_id=product_id, action=action, transaction_id=transaction_id)
+            for product_id, action in changes.items()
+        ])
+
+
+def db_log_product_changes(product_ids: list = None, action: str = None):
+    try:
+        return True, append_product_changes({product_id: action for product_id in product_ids})
+    except Exception as e:
+        return False, str(e)
+
+
+# Every transaction with a lower id has finished, so no change ordered before it can still appear
+PRODUCT_CHANGE_HORIZON = RawSQL('txid_snapshot_xmin(txid_current_snapshot())', [])
+
+
+def db_get_product_change_token() -> tuple:
+    # Where a client that just pulled a full snapshot starts following the feed, as (transaction_id, id)
+    with connection.cursor() as cursor:
+        cursor.execute('SELECT txid_snapshot_xmin(txid_current_snapshot())')
+        return cursor.fetchone()[0], 0
+
+
+def db_get_product_changes(since: tuple = None, limit: int = None):
+    """
+    Up to `limit` logged changes after the (transaction_id, id) position `since`, as
+    (transaction_id, id, product_id, action, created) rows in log order, read as one range scan.
+
+    Sequence ids are drawn at insert time, so a transaction can commit a lower id after a higher one was read.
+    Only changes of transactions older than every one still in progress are returned: those are final, and
+    everything that commits later sorts after them.
+    """
+    try:
+        transaction_id, change_id = since
+        return True, list(
+            ProductChange.objects.filter(
+                Q(transaction_id__gt=transaction_id) | Q(transaction_id=transaction_id, id__gt=change_id),
+                transaction_id__lt=PRODUCT_CHANGE_HORIZON
+            ).order_by('transaction_id', 'id').values_list(
+                'transaction_id', 'id', 'product_id', 'action', 'created'
+            )[:limit]
+        )
+    except Exception as e:
+        return False, str(e)
+
+
+def db_get_products_without_cards_exist() -> bool:
+    return Product.objects.filter(card__isnull=True).exists()
+
+
+def db_get_existing_product_ids(product_ids: list = None) -> set:
+    return set(Product.objects.filter(id__in=product_ids).values_list('id', flat=True))
+
+
+def db_get_product_card_times(product_ids: list = None) -> dict:
+    # {product_id: time the card was last rebuilt} of the products that have a card
+    return dict(ProductCard.objects.filter(product_id__in=product_ids).values_list('product_id', 'updated'))
+
+
+def db_get_product_cards_by_ids(product_ids: list = None, fields: list = None):
+    cards = db_get_sparse_product_cards(fields=fields) if fields else db_get_all_product_cards()
+    return cards.filter(product_id__in=product_ids)
+
+
+def db_compact_product_changes(start: int = None, end: int = None):
+    """
+    Deletes the changes with start < id <= end that a later change of the same product supersedes. Replaying
+    the log from any token still ends in the same state, the feed only ever needs the last change of a product.
+    """
+    try:
+        later_changes = ProductChange.objects.filter(product_id=OuterRef('product_id')).filter(
+            Q(transaction_id__gt=OuterRef('transaction_id'))
+            | Q(transaction_id=OuterRef('transaction_id'), id__gt=OuterRef('id'))
+        )
+        return True, ProductChange.objects.filter(id__gt=start, id__lte=end).filter(Exists(later_changes)).delete()[0]
+    except Exception as e:
+        return False, str(e)
+
+
+def db_update_product_search_vector(product_ids: list = None):
+    try:
+        return True, Product.objects.filter(id__in=product_ids).update(search_vector=PRODUCT_SEARCH_VECTOR)
+    except Exception as e:
+        return False, str(e)
+
+
+def db_update_manufacturer_search_vector(manufacturer_ids: list = None):
+    try:
+        return True, Manufacturer.objects.filter(id__in=manufacturer_ids).update(
+            search_vector=MANUFACTURER_SEARCH_VECTOR)
+    except Exception as e:
+        return False, str(e)
+
+
+def db_get_autocomplete_suggestions(text: str = None, limit: int = None):
+    """
+    Top product and brand suggestions for a partial, possibly misspelled, text. The word-similarity and
+    icontains lookups are both served by the trigram GIN indexes.
+    """
+    try:
+        products = Product.objects.filter(
+            Q(name__trigram_word_similar=text) | Q(name__icontains=text)
+        ).annotate(
+            similarity=TrigramWordSimilarity(text, 'name')
+        ).order_by('-similarity', 'id').values('id', 'name')[:limit]
+        brands = Manufacturer.objects.filter(
+            Q(name__trigram_word_similar=text) | Q(brand_name__trigram_word_similar=text)
+            | Q(name__icontains=text) | Q(brand_name__icontains=text)
+        ).annotate(
+            similarity=Greatest(TrigramWordSimilarity(text, 'name'), TrigramWordSimilarity(text, 'brand_name'))
+        ).order_by('-similarity', 'id').values('id', 'name', 'brand_name')[:limit]
+        return True, {'products': list(products), 'brands': list(brands)}
+    except Exception as e:
+        return False, str(e)
+
+
+def db_touch_products(product_ids: list = None):
+    # Keeps Product.updated in step with changes to rows rendered inside the product payloads.
+    try:
+        return True, Product.objects.filter(id__in=product_ids).update(updated=now())
+    except Exception as e:
+        return False, str(e)
+
+
+def db_get_product_last_modified(_id: int = None):
+    try:
+        return True, Product.objects.filter(id=_id).values_list('updated', flat=True).get()
+    except Exception as e:
+        return False, str(e)
+
+
+def db_get_queryset_validators(queryset=None):
+    try:
+        return True, queryset.order_by().aggregate(last_modified=Max('updated'), count=Count('pk'))
+    except Exception as e:
+        return False, str(e)
+
+
+PRODUCT_FACETS = ('category', 'grade', 'bar_code_type', 'is_private_label_available', 'is_in_stock')
+
+
+def db_get_product_facet_counts(queryset=None):
+    """
+    Facet counts of a filtered product queryset computed by a single GROUPING SETS aggregate. Configs are folded
+    into one availability flag per product first, a product is in stock when any of its configs is.
+    """
+    try:
+        filtered_sql, params = queryset.order_by().values('id').query.sql_with_params()
+        category_through = Product.category.through
+        sql = f"""
+            SELECT
+                product_category.category_id, category.name, product.grade, product.bar_code_type,
+                product.is_private_label_available, config.is_in_stock,
+                GROUPING(
+                    product_category.category_id, product.grade, product.bar_code_type,
+                    product.is_private_label_available, config.is_in_stock
+                ),
+                COUNT(DISTINCT product.id)
+            FROM {Product._meta.db_table} product
+            LEFT JOIN {category_through._meta.db_table} product_category ON product_category.product_id = product.id
+            LEFT JOIN {Category._meta.db_table} category ON category.id = product_category.category_id
+            LEFT JOIN (
+                SELECT product_id, bool_or(is_in_stock) AS is_in_stock
+                FROM {ProductConfig._meta.db_table}
+                GROUP BY product_id
+            ) config ON config.product_id = product.id
+            WHERE product.id IN ({filtered_sql})
+            GROUP BY GROUPING SETS (
+                (product_category.category_id, category.name), (product.grade), (product.bar_code_type),
+                (product.is_private_label_available), (config.is_in_stock)
+            )
+        """
+        with connection.cursor() as cursor:
+            cursor.execute(sql, params)
+            rows = cursor.fetchall()
+
+        # GROUPING() sets the bit of every argument that is not part of the row's grouping set.
+        all_bits = (1 << len(PRODUCT_FACETS)) - 1
+        facet_by_grouping = {
+            all_bits ^ (1 << (len(PRODUCT_FACETS) - 1 - index)): facet for index, facet in enumerate(PRODUCT_FACETS)
+        }
+        facets = {facet: [] for facet in PRODUCT_FACETS}
+        for category_id, category_name, grade, bar_code_type, private_label, in_stock, grouping, count in rows:
+            facet = facet_by_grouping[grouping]
+            if facet == 'category':
+                facets[facet].append({'value': category_id, 'label': category_name, 'count': count})
+            else:
+                value = {
+                    'grade': grade, 'bar_code_type': bar_code_type,
+                    'is_private_label_available': private_label, 'is_in_stock': in_stock
+                }[facet]
+                facets[facet].append({'value': value, 'count': count})
+        for values in facets.values():
+            values.sort(key=lambda item: -item['count'])
+        return True, facets
+    except Exception as e:
+        return False, str(e)
+
+
+def db_update_product_rating_aggregates(product_id: int = None, rating: int = None, delta: int = 1):
+    """
+    Add (delta=1) or remove (delta=-1) one rating in the product's aggregates with a single UPDATE. Every
+    expression reads the row as locked by the UPDATE, so concurrent writers never lose increments.
+    """
+    try:
+        rating_sum = F('rating_sum') + delta * rating
+        rating_count = F('rating_count') + delta
+        average = Cast(rating_sum, DecimalField(max_digits=12, decimal_places=2)) / NullIf(rating_count, 0)
+        return True, Product.objects.filter(id=product_id).update(
+            rating_sum=rating_sum,
+            rating_count=rating_count,
+            rating_average=Coalesce(average, 0, output_field=DecimalField(max_digits=3, decimal_places=2)),
+            updated=now(),
+            **{f'rating_{rating}_count': F(f'rating_{rating}_count') + delta}
+        )
+    except Exception as e:
+        return False, str(e)
+
+
+def db_update_product_review_count(product_id: int = None, delta: int = 1):
+    try:
+        return True, Product.objects.filter(id=product_id).update(
+            review_count=F('review_count') + delta, updated=now())
+    except Exception as e:
+        return False, str(e)
+
+
+def db_get_product_reviews(product_id: int = None):
+    # Newest first; served by the (product, created, id) index.
+    return ProductReview.objects.filter(product_id=product_id).order_by('-created', '-id')
+
+
+def db_get_product_review_count(product_id: int = None):
+    try:
+        return True, Product.objects.filter(id=product_id).values_list('review_count', flat=True).get()
+    except Exception as e:
+        return False, str(e)
+
+
+def db_get_product_rating(rating_id: int = None):
+    # (product_id, rating) of a stored rating, or None for a rating that is not saved yet.
+    try:
+        return True, ProductRatings.objects.filter(id=rating_id).values_list('product_id', 'rating').first()
+    except Exception as e:
+        return False, str(e)
+
+
+def db_repair_product_rating_aggregates(product_ids: list = None):
+    """
+    Recompute the rating and review aggregates of the given products from their rows and write the ones that
+    drifted. Returns the ids of the repaired products.
+    """
+    try:
+        aggregates = {
+            product_id: dict.fromkeys(Product.aggregate_fields, 0) for product_id in product_ids
+        }
+        star_counts = ProductRatings.objects.filter(
+            product_id__in=product_ids, rating__range=(MIN_PRODUCT_RATING, MAX_PRODUCT_RATING)
+        ).order_by().values(
+            'product_id', 'rating').annotate(count=Count('id'))
+        for row in star_counts:
+            product_aggregates = aggregates[row['product_id']]
+            product_aggregates[f'rating_{row["rating"]}_count'] = row['count']
+            product_aggregates['rating_count'] += row['count']
+            product_aggregates['rating_sum'] += row['rating'] * row['count']
+        review_counts = ProductReview.objects.filter(product_id__in=product_ids).order_by().values(
+            'product_id').annotate(count=Count('id'))
+        for row in review_counts:
+            aggregates[row['product_id']]['review_count'] = row['count']
+
+        products = []
+        with atomic():
+            for product in Product.objects.select_for_update().filter(id__in=product_ids).only(
+                    'id', *Product.aggregate_fields):
+                expected = aggregates[product.id]
+                if expected['rating_count']:
+                    expected['rating_average'] = round(Decimal(expected['rating_sum']) / expected['rating_count'], 2)
+                if any(getattr(product, field) != value for field, value in expected.items()):
+                    for field, value in expected.items():
+                        setattr(product, field, value)
+                    product.updated = now()
+                    products.append(product)
+            Product.objects.bulk_update(products, [*Product.aggregate_fields, 'updated'])
+        return True, [product.id for product in products]
+    except Exception as e:
+        return False, str(e)
+
+
+def db_iter_product_export_batches(queryset=None, chunk_size: int = None):
+    """
+    Yield the export rows of the products in queryset, `chunk_size` products at a time.
+
+    Products and their manufacturer are read through a server-side cursor; variants, suppliers, images and
+    shipping are joined per batch with one query each, so memory depends on chunk_size only.
+    """
+    products = queryset.order_by('id').values(
+        *PRODUCT_EXPORT_FIELDS, manufacturer_name=F('manufacturer__name'), brand_name=F('manufacturer__brand_name')
+    ).iterator(chunk_size=chunk_size)
+    batch = []
+    for product in products:
+        batch.append(product)
+        if len(batch) == chunk_size:
+            yield _join_product_export_batch(batch)
+            batch = []
+    if batch:
+        yield _join_product_export_batch(batch)
+
+
+def _join_product_export_batch(products: list) -> list:
+    rows = {product['id']: {**product, 'supplier_name': None, 'supplier_address': None, 'image': None,
+                            'variants': [], 'shipping': None} for product in products}
+    product_ids = list(rows)
+    for variant in ProductVariant.objects.filter(product_id__in=product_ids).order_by('id').values(
+            'product_id', *PRODUCT_EXPORT_VARIANT_FIELDS):
+        rows[variant.pop('product_id')]['variants'].append(variant)
+    for supplier in SupplierProducts.objects.filter(product_id__in=product_ids).order_by('-id').values(
+            'product_id', 'supplier__name', 'supplier__legal_address'):
+        # Descending ids so the first supplier, as shown in the product list, is written last.
+        rows[supplier['product_id']].update(
+            supplier_name=supplier['supplier__name'], supplier_address=supplier['supplier__legal_address'])
+    for image in ProductImages.objects.filter(product_id__in=product_ids).order_by('-id').values(
+            'product_id', 'image'):
+        rows[image['product_id']]['image'] = get_image_path(image['image'])
+    for shipping in ShippingAndOrdering.objects.filter(product_id__in=product_ids).order_by('-id').values(
+            'product_id', *PRODUCT_EXPORT_SHIPPING_FIELDS):
+        rows[shipping.pop('product_id')]['shipping'] = shipping
+    return list(rows.values())
+
+
+def db_touch_categories(category_ids: list = None):
+    try:
+        return True, Category.objects.filter(id__in=category_ids).update(updated=now())
+    except Exception as e:
+        return False, str(e)
+
+
+def db_get_category_ids_by_product(product_id: int = None) -> list:
+    return list(Product.category.through.objects.filter(product_id=product_id).values_list('category_id', flat=True))
+
+
+def db_get_category_descendant_ids(category_ids: list = None) -> dict:
+    """
+    {category_id: ids of the category and all of its descendants}, read with two queries from the MPTT
+    (tree_id, lft, rght) ranges however deep the trees are. Unknown ids are left out.
+    """
+    nodes = list(Category.objects.filter(id__in=category_ids).values_list('id', 'tree_id', 'lft', 'rght'))
+    if not nodes:
+        return {}
+    ranges = Q()
+    for _, tree_id, lft, rght in nodes:
+        ranges |= Q(tree_id=tree_id, lft__gte=lft, lft__lte=rght)
+    rows = list(Category.objects.filter(ranges).values_list('id', 'tree_id', 'lft'))
+    return {
+        category_id: [
+            _id for _id, row_tree_id, row_lft in rows if row_tree_id == tree_id and lft <= row_lft <= rght
+        ]
+        for category_id, tree_id, lft, rght in nodes
+    }
+
+
+def db_get_cached_category_descendant_ids(category_ids: list = None) -> dict:
+    # db_get_category_descendant_ids read through the cached descendant sets, which any tree edit drops
+    version, descendant_ids = get_cached_category_descendant_ids(list(category_ids))
+    missing_ids = set(category_ids).difference(descendant_ids)
+    if missing_ids:
+        found = db_get_category_descendant_ids(category_ids=list(missing_ids))
+        set_cached_category_descendant_ids(version, found)
+        descendant_ids.update(found)
+    return descendant_ids
+
+
+def db_get_category_snapshot_states():
+    """
+    {category_id: (name, last change)} for every category, the last change being the newest update of a category
+    in its subtree or of a product filed under one, the same subtree its listing and snapshot hold.
+    """
+    categories = list(Category.objects.annotate(last_product_update=Max('products__updated')).values_list(
+        'id', 'name', 'updated', 'last_product_update'))
+    own_changes = {
+        category_id: max(filter(None, (updated, last_product_update)))
+        for category_id, _, updated, last_product_update in categories
+    }
+    descendant_ids = db_get_cached_category_descendant_ids(category_ids=list(own_changes))
+    return {
+        category_id: (name, max(
+            own_changes[_id] for _id in descendant_ids.get(category_id, [category_id]) if _id in own_changes
+        ))
+        for category_id, name, *_ in categories
+    }
+
+
+def db_get_catalog_snapshots() -> dict:
+    return {snapshot.key: snapshot for snapshot in CatalogSnapshot.objects.select_related('category')}
+
+
+def db_get_snapshot_product_cards(category_id: int = None):
+    # A category holds the products of its whole subtree, as its listing does, each product once
+    cards = db_get_all_product_cards()
+    if category_id is not None:
+        descendant_ids = db_get_cached_category_descendant_ids(category_ids=[category_id]).get(category_id, [])
+        cards = cards.filter(product_id__in=Product.category.through.objects.filter(
+            category_id__in=descendant_ids
+        ).values('product_id'))
+    return cards
+
+
+def db_save_catalog_snapshot(key: str = None, data: dict = None):
+    try:
+        return True, CatalogSnapshot.objects.update_or_create(key=key, defaults=data)[0]
+    except Exception as e:
+        return False, str(e)
+
+
+def db_get_product_images_needing_derivatives(image_ids: list = None):
+    # Images whose derivatives are missing or were generated from a previous upload.
+    return [
+        image for image in ProductImages.objects.filter(id__in=image_ids).exclude(image__isnull=True).exclude(image='')
+        if image.derivatives_source != image.image.name
+    ]
+
+
+def db_get_product_image_derivatives_by_source(sources: list = None) -> dict:
+    # {original name: derivatives} already generated for these originals by any row, rows sharing a blob share them
+    return dict(ProductImages.objects.filter(derivatives_source__in=sources).exclude(derivatives={}).values_list(
+        'derivatives_source', 'derivatives'
+    ))
+
+
+def db_get_product_image_sources_in_use(sources: list = None) -> set:
+    return set(ProductImages.objects.filter(derivatives_source__in=sources).values_list(
+        'derivatives_source', flat=True
+    ))
+
+
+def db_save_product_image_derivatives(images: list = None):
+    try:
+        return True, ProductImages.objects.bulk_update(images, ['derivatives', 'derivatives_source'])
+    except Exception as e:
+        return False, str(e)
+
+
+def db_get_product_stock_availability(product_ids: list = None) -> dict:
+    """
+    {product_id: in stock} for the given products, a product being in stock when any of its configs is.
+    """
+    in_stock_ids = set(ProductConfig.objects.filter(
+        product_id__in=product_ids, is_in_stock=True
+    ).values_list('product_id', flat=True))
+    return {product_id: product_id in in_stock_ids for product_id in product_ids}
+
+
+def db_iter_in_stock_product_ids(chunk_size: int = None):
+    return ProductConfig.objects.filter(is_in_stock=True).order_by('product_id').values_list(
+        'product_id', flat=True
+    ).distinct().iterator(chunk_size=chunk_size)
+
+
+def db_iter_similarity_documents(chunk_size: int = None):
+    """
+    The texts the product vectors of the similar products engine are built from, read with one grouped query and
+    yielded in id order as {product_id: {'name', 'description', 'ingredients', 'categories'}} chunks.
+    """
+    products = Product.objects.order_by('id').values(
+        'id', 'name', 'description', 'manufacturer__ingredients'
+    ).annotate(category_names=ArrayAgg('category__name', filter=Q(category__isnull=False), distinct=True))
+    documents = {}
+    for product in products.iterator(chunk_size=chunk_size):
+        documents[product['id']] = {
+            'name': product['name'], 'description': product['description'] or '',
+            'ingredients': product['manufacturer__ingredients'] or '',
+            'categories': ' '.join(sorted(product['category_names'] or []))
+        }
+        if len(documents) == chunk_size:
+            yield documents
+            documents = {}
+    if documents:
+        yield documents
+
+
+def db_get_similarity_states(k: int = None) -> dict:
+    """
+    {product_id: (signature, score floor, short)}. The floor is the score a new neighbor has to beat to enter the
+    product's list of `k`, 0 while the list has free places. A list is short when a neighbor was deleted since it was
+    computed, the cascade having removed its row.
+    """
+    states = ProductSimilarityState.objects.annotate(
+        stored_count=Count('product__similar_products'), lowest_score=Min('product__similar_products__score')
+    ).values_list('product_id', 'signature', 'neighbor_count', 'stored_count', 'lowest_score')
+    return {
+        product_id: (signature, lowest_score if stored_count >= k else 0, stored_count < neighbor_count)
+        for product_id, signature, neighbor_count, stored_count, lowest_score in states.iterator()
+    }
+
+
+def db_get_product_ids_by_neighbors(neighbor_ids: list = None) -> list:
+    return list(
+        SimilarProduct.objects.filter(neighbor_id__in=neighbor_ids).values_list('product_id', flat=True).distinct()
+    )
+
+
+def db_save_similar_products(neighbors: dict = None, signatures: dict = None):
+    """
+    Replaces the neighbor rows and similarity states of the products in `neighbors`, given as
+    {product_id: [(neighbor_id, score), ...]} best first.
+    """
+    try:
+        with atomic():
+            product_ids = list(neighbors)
+            SimilarProduct.objects.filter(product_id__in=product_ids).delete()
+            ProductSimilarityState.objects.filter(product_id__in=product_ids).delete()
+            SimilarProduct.objects.bulk_create([
+                SimilarProduct(product_id=product_id, neighbor_id=neighbor_id, rank=rank, score=score)
+                for product_id, product_neighbors in neighbors.items()
+                for rank, (neighbor_id, score) in enumerate(product_neighbors)
+            ])
+            ProductSimilarityState.objects.bulk_create([
+                ProductSimilarityState(
+                    product_id=product_id, signature=signatures[product_id], neighbor_count=len(product_neighbors)
+                )
+                for product_id, product_neighbors in neighbors.items()
+            ])
+        return True, len(product_ids)
+    except Exception as e:
+        return False, str(e)
+
+
+def db_get_similar_products(product_id: int = None):
+    """
+    Stored neighbors of a product with their product cards, best first, in one joined query.
+    """
+    try:
+        return True, SimilarProduct.objects.filter(
+            product_id=product_id, neighbor__card__isnull=False
+        ).select_related('neighbor__card').order_by('rank')
+    except Exception as e:
+        return False, str(e)
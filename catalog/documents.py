@@ -0,0 +1,127 @@
+from django_elasticsearch_dsl import Document, fields
+from django_elasticsearch_dsl.registries import registry
+from elasticsearch_dsl import Q
+
+from accounts.models import Company
+from .constants import PRODUCT_SEARCH_INDEX, PRODUCT_SEARCH_INDEXING_CHUNK_SIZE
+from .db_interactors import db_prefetch_product_list_data
+from .models import Product, Category, Manufacturer, SupplierProducts, ProductImages
+from .serializers import ProductListSerializer
+
+
+@registry.register_document
+class ProductDocument(Document):
+    """
+    Search document for products. Besides the searchable text it stores every field ProductListSerializer
+    emits, so search results are rendered straight from the hits.
+    """
+    id = fields.IntegerField()
+    name = fields.TextField(fields={'raw': fields.KeywordField()})
+    description = fields.TextField()
+    advance_payment = fields.KeywordField(index=False)
+    shelf_life = fields.IntegerField()
+    packaging_details = fields.TextField()
+    grade = fields.KeywordField()
+    bar_code = fields.KeywordField()
+    bar_code_type = fields.KeywordField()
+    is_private_label_available = fields.BooleanField()
+    manufacturer_id = fields.IntegerField()
+    manufacturer_name = fields.TextField()
+    brand_name = fields.TextField(fields={'raw': fields.KeywordField()})
+    ingredients = fields.TextField()
+    category_ids = fields.IntegerField(multi=True)
+    category_names = fields.TextField(multi=True)
+    supplier_name = fields.TextField()
+    supplier_address = fields.KeywordField(index=False)
+    image = fields.KeywordField(index=False)
+
+    class Index:
+        name = PRODUCT_SEARCH_INDEX
+        settings = {'number_of_shards': 1, 'number_of_replicas': 0}
+
+    class Django:
+        model = Product
+        related_models = [Manufacturer, Category, SupplierProducts, ProductImages, Company]
+
+    def get_queryset(self):
+        return db_prefetch_product_list_data(super().get_queryset()).prefetch_related('category')
+
+    def get_indexing_queryset(self):
+        # QuerySet.iterator() drops prefetch_related, so index in id chunks instead.
+        queryset = self.get_queryset()
+        product_ids = list(queryset.order_by('id').values_list('id', flat=True))
+        for start in range(0, len(product_ids), PRODUCT_SEARCH_INDEXING_CHUNK_SIZE):
+            yield from queryset.filter(id__in=product_ids[start:start + PRODUCT_SEARCH_INDEXING_CHUNK_SIZE])
+
+    def get_instances_from_related(self, related_instance):
+        if isinstance(related_instance, Manufacturer):
+            return related_instance.product_set.all()
+        elif isinstance(related_instance, Category):
+            return related_instance.products.all()
+        elif isinstance(related_instance, Company):
+            return Product.objects.filter(supplierproducts__supplier=related_instance)
+        elif isinstance(related_instance, (SupplierProducts, ProductImages)):
+            return related_instance.product
+
+    def update(self, thing, refresh=None, action='index', parallel=False, **kwargs):
+        # Re-read products with their related data prefetched before preparing the documents.
+        if action == 'index':
+            product_ids = [thing.pk] if isinstance(thing, Product) else [product.pk for product in thing]
+            thing = self.get_queryset().filter(id__in=product_ids)
+        return super().update(thing, refresh=refresh, action=action, parallel=parallel, **kwargs)
+
+    def prepare_manufacturer_name(self, instance):
+        return instance.manufacturer.name if instance.manufacturer else None
+
+    def prepare_brand_name(self, instance):
+        return instance.manufacturer.brand_name if instance.manufacturer else None
+
+    def prepare_ingredients(self, instance):
+        return instance.manufacturer.ingredients if instance.manufacturer else None
+
+    def prepare_category_ids(self, instance):
+        return [category.id for category in instance.category.all()]
+
+    def prepare_category_names(self, instance):
+        return [category.name for category in instance.category.all()]
+
+    def prepare_supplier_name(self, instance):
+        return ProductListSerializer().get_supplier_name(instance)
+
+    def prepare_supplier_address(self, instance):
+        return ProductListSerializer().get_supplier_address(instance)
+
+    def prepare_image(self, instance):
+        return ProductListSerializer().get_image(instance)
+
+
+def get_product_search_query(search_text: str):
+    if not search_text:
+        return Q('match_all')
+    return Q('bool', minimum_should_match=1, should=[
+        Q('term', bar_code={'value': search_text, 'boost': 10}),
+        Q(
+            'multi_match',
+            query=search_text,
+            fuzziness='AUTO',
+            fields=[
+                'name^4', 'brand_name^3', 'manufacturer_name^2', 'category_names^2',
+                'description', 'ingredients', 'packaging_details', 'grade'
+            ]
+        ),
+    ])
+
+
+def get_product_search_filters(query_params) -> Q:
+    filters = []
+    if query_params.get('grade'):
+        filters.append(Q('terms', grade=query_params['grade'].split(',')))
+    if query_params.get('bar_code_type'):
+        filters.append(Q('terms', bar_code_type=query_params['bar_code_type'].split(',')))
+    if query_params.get('category'):
+        filters.append(Q('terms', category_ids=query_params['category'].split(',')))
+    if query_params.get('manufacturer'):
+        filters.append(Q('terms', manufacturer_id=query_params['manufacturer'].split(',')))
+    if query_params.get('is_private_label_available') in ['true', 'false']:
+        filters.append(Q('term', is_private_label_available=query_params['is_private_label_available'] == 'true'))
+    return Q('bool', filter=filters)
@@ -0,0 +1,59 @@
+from django.contrib.postgres.search import SearchQuery, SearchRank
+from django.db.models import F
+from rest_framework.filters import BaseFilterBackend, SearchFilter
+from rest_framework.settings import api_settings
+
+from utils.paginations import KeysetCursorPagination
+
+from .constants import SEARCH_CONFIG, PRODUCT_IN_STOCK_QUERY_PARAM
+from .models import ProductConfig
+from .db_interactors import db_get_product_stock_availability
+from .utils import get_product_stock_bits
+
+
+class ProductFullTextSearchFilter(SearchFilter):
+    """
+    Drop-in replacement for SearchFilter on products, see settings.PRODUCT_SEARCH_FILTER_BACKEND. Matches the
+    stored product `search_vector`, which includes the manufacturer's text, through its GIN index and ranks the
+    matches with SearchRank. The rank ordering only applies when the client did not ask for an explicit ordering.
+    """
+
+    def filter_queryset(self, request, queryset, view):
+        search_text = request.query_params.get(self.search_param, '').strip()
+        if not search_text:
+            return queryset
+
+        query = SearchQuery(search_text, search_type='websearch', config=SEARCH_CONFIG)
+        queryset = queryset.filter(search_vector=query).annotate(search_rank=SearchRank(F('search_vector'), query))
+        if request.query_params.get(api_settings.ORDERING_PARAM):
+            return queryset
+        return queryset.order_by('-search_rank', '-id')
+
+
+def get_in_stock_flags(rows: list) -> list:
+    product_ids = [row.pk for row in rows]
+    flags = get_product_stock_bits(product_ids) if product_ids else []
+    if flags is None:
+        availability = db_get_product_stock_availability(product_ids=product_ids)
+        flags = [availability[product_id] for product_id in product_ids]
+    return flags
+
+
+class ProductInStockFilter(BaseFilterBackend):
+    """
+    `?in_stock=true` keeps in-stock products only, for querysets of Product or ProductCard (keyed by product).
+
+    Under keyset pagination the candidates are not filtered up front: the paginator reads them in batches and
+    checks each batch against the Redis availability bitmap with one pipelined GETBIT round trip, so the cost
+    follows the page size rather than the catalog, catalog queries need no join on ProductConfig and stock flips
+    never touch the catalog rows or their caches. While the bitmap is unavailable the batches are checked against
+    ProductConfig. Page number pagination has to count the matches, so it filters with a subquery on ProductConfig.
+    """
+
+    def filter_queryset(self, request, queryset, view):
+        if request.query_params.get(PRODUCT_IN_STOCK_QUERY_PARAM, '').lower() not in ['true', '1']:
+            return queryset
+        if isinstance(view.paginator, KeysetCursorPagination):
+            view.page_candidate_filter = get_in_stock_flags
+            return queryset
+        return queryset.filter(pk__in=ProductConfig.objects.filter(is_in_stock=True).values('product_id'))
@@ -1,60 +1,110 @@
-from django.db.models import Q
-from django.utils.timezone import now
-from django_filters import FilterSet, MultipleChoiceFilter, RangeFilter, BaseInFilter, IsoDateTimeFromToRangeFilter
+from django import forms
+from django.db.models.fields.json import KeyTransform
+from django.db.models.lookups import IsNull
+from django_filters import (
+    FilterSet, MultipleChoiceFilter, RangeFilter, BaseInFilter, BaseCSVFilter, IsoDateTimeFromToRangeFilter,
+    CharFilter, NumberFilter, Filter
+)
+from django_filters.widgets import BaseCSVWidget
+
+from .constants import PRODUCT_DATA_INDEXED_KEYS
+from .db_interactors import db_get_cached_category_descendant_ids
 
 from .models import (
     Product, Category, ProductVariant,
     ProductConfig, SupplierProducts,
     Manufacturer, ProductReview,
     ProductRatings, ProductImages,
-    ShippingAndOrdering
+    ShippingAndOrdering, ProductCard
 )
 
-class ProductFilterSet(FilterSet):
 
-    def filter_status(self, queryset, name, value):
-        user = self.request.user
-        filters = Q(status__in=value)
-        if set(value).intersection({Exam.Status.ACTIVE, Exam.Status.ASSIGNED}):
-            filters &= Q(valid_to__gte=now())
-        elif set(value).intersection({Exam.Status.RESULT_GENERATED, Exam.Status.EVALUATING_RESULT}):
-            filters |= Q(valid_to__lte=now())
-
-        if user and (user.is_student() or user.is_external_candidate() or user.is_internal_candidate() or user.is_sme()):
-            if set(value).intersection({Exam.Status.ACTIVE, Exam.Status.READY, Exam.Status.ASSIGNED})\
-                    and not set(value).intersection({Exam.Status.RESULT_GENERATED, Exam.Status.EVALUATING_RESULT}):
-                filters &= (Q(exaninee_exam_map__student=user)
-                            & ~Q(exaninee_exam_map__examinee_status=ExamineeExamMap.ExamineeStatus.COMPLETED))
-                if set(value).intersection({Exam.Status.READY, Exam.Status.ASSIGNED}):
-                    marathons = Marathon.objects.filter(created_by=user)
-                    if marathons:
-                        m_q = queryset
-                        other_exams = list(queryset.filter(~(Q(examination_type=Exam.ExaminationType.MARATHON))).values_list('id', flat=True).distinct())
-                        for marathon in marathons:
-                            marathon_exams = \
-                                m_q.filter(Q(exam_marathon_map__marathon__id=marathon.id) & 
-                                    Q(valid_from__gt=now())).order_by('valid_from').values_list('id', flat=True).distinct()[:1]
-                            if marathon_exams:
-                                other_exams += list(marathon_exams)
-                        queryset = Exam.objects.filter(Q(id__in=other_exams))
-
-            elif set(value).intersection({Exam.Status.RESULT_GENERATED, Exam.Status.EVALUATING_RESULT}):
-                filters |= (Q(exaninee_exam_map__student=user)
-                            & Q(exaninee_exam_map__examinee_status=ExamineeExamMap.ExamineeStatus.COMPLETED))
-        return queryset.filter(filters)
+class JSONFilter(Filter):
+    field_class = forms.JSONField
+
+
+class CharCSVFilter(BaseCSVFilter, CharFilter):
+    pass
+
+
+class NumberInFilter(BaseInFilter, NumberFilter):
+    pass
+
+
+class RepeatedCSVWidget(BaseCSVWidget, forms.TextInput):
+    """
+    Comma separated values that may also be sent as a repeated parameter, ?category=3,7 or ?category=3&category=7.
+    """
+
+    def value_from_datadict(self, data, files, name):
+        values = data.getlist(name) if hasattr(data, 'getlist') else []
+        if len(values) > 1:
+            return [value for csv in values for value in csv.split(',') if value]
+        return super().value_from_datadict(data, files, name)
+
+
+class ProductFilterSet(FilterSet):
 
     class Meta:
         model = Product
-        exclude = ['created', 'updated', 'additional_data']
+        exclude = ['created', 'updated', 'additional_data', 'search_vector', *Product.aggregate_fields]
+
+    # ?category=3,7 (or ?category=3&category=7) matches products in those categories or any category below them
+    category = NumberInFilter(method='filter_category', widget=RepeatedCSVWidget)
+    grade = BaseInFilter(field_name='grade', lookup_expr='in')
+    min_rating = NumberFilter(field_name='rating_average', lookup_expr='gte')
+    # Ranges on the parsed quantity columns, e.g. ?moq_max=500 or ?net_weight_min=250&net_weight_max=1000.
+    # Weights are compared in grams and volumes in millilitres, see QUANTITY_UNIT_CONVERSIONS.
+    net_weight = RangeFilter(field_name='productvariant__net_weight_per_volume_value', distinct=True)
+    net_weight_unit = CharFilter(field_name='productvariant__net_weight_per_volume_unit', distinct=True)
+    quantity_per_carton = RangeFilter(field_name='productvariant__quantity_per_carton_value', distinct=True)
+    quantity_per_pallet = RangeFilter(field_name='productvariant__quantity_of_items_per_pallete_value', distinct=True)
+    moq = RangeFilter(field_name='product__moq_value', distinct=True)
+    min_boxes_per_pallet = RangeFilter(field_name='product__min_no_boxes_pallet_value', distinct=True)
+    max_items_per_container = RangeFilter(
+        field_name='product__max_no_items_in_full_40_inch_container_value', distinct=True
+    )
+    # Supplier defined attributes, e.g. ?data_contains={"certifications": ["ISO 22000"]} served by the
+    # jsonb_path_ops GIN index, or ?data_has_keys=halal,vegan for all of the keys being present.
+    data_contains = JSONFilter(field_name='additional_data', lookup_expr='contains')
+    data_has_keys = CharCSVFilter(method='filter_data_has_keys')
+    data_has_any_keys = CharCSVFilter(field_name='additional_data', lookup_expr='has_any_keys')
+
+    def filter_category(self, queryset, name, value):
+        descendant_ids = db_get_cached_category_descendant_ids(
+            category_ids=list({int(category_id) for category_id in value})
+        )
+        # A semi-join on the link table, so a product in several of the categories is still listed once
+        product_ids = Product.category.through.objects.filter(
+            category_id__in={_id for ids in descendant_ids.values() for _id in ids}
+        ).values('product_id')
+        return queryset.filter(id__in=product_ids)
+
+    def filter_data_has_keys(self, queryset, name, value):
+        # The hot keys are checked against their expression index, the others with one `?&` on the jsonb_ops index
+        other_keys = [key for key in value if key not in PRODUCT_DATA_INDEXED_KEYS]
+        for key in set(value).intersection(PRODUCT_DATA_INDEXED_KEYS):
+            queryset = queryset.filter(IsNull(KeyTransform(key, 'additional_data'), False))
+        if other_keys:
+            queryset = queryset.filter(additional_data__has_keys=other_keys)
+        return queryset
+
+
+# Equality / IN on each hot key, e.g. ?data_origin=India,Italy, served by its expression index
+ProductFilterSet.base_filters.update({
+    f'data_{key}': CharCSVFilter(field_name=f'additional_data__{key}', lookup_expr='in')
+    for key in PRODUCT_DATA_INDEXED_KEYS
+})
+
+
+class ProductCardFilterSet(FilterSet):
+
+    class Meta:
+        model = ProductCard
+        fields = ['bar_code_type', 'is_private_label_available', 'manufacturer_name', 'supplier_name']
 
-    duration = RangeFilter()
     grade = BaseInFilter(field_name='grade', lookup_expr='in')
-    batch = BaseInFilter(field_name='batch_exam_map__batch', lookup_expr='in')
-    valid_from = IsoDateTimeFromToRangeFilter()
-    valid_to = IsoDateTimeFromToRangeFilter()
-    subject = BaseInFilter(field_name='question_paper__question_sets__subject', lookup_expr='in')
-    topic = BaseInFilter(field_name='question_paper__question_sets__question_set_questions__topic', lookup_expr='in')
-    institute = BaseInFilter(lookup_expr='in')
+    min_rating = NumberFilter(field_name='rating_average', lookup_expr='gte')
 
 
 # class ProductReviewFilterSet(FilterSet):
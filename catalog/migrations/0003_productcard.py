@@ -0,0 +1,37 @@
+# Generated by Django 4.0.7 on 2026-10-18 10:03
+
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('catalog', '0002_product_keyset_indexes'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ProductCard',
+            fields=[
+                ('product', models.OneToOneField(on_delete=django.db.models.deletion.CASCADE, primary_key=True, related_name='card', serialize=False, to='catalog.product')),
+                ('name', models.CharField(max_length=100, verbose_name='Product Name')),
+                ('description', models.TextField(max_length=1000)),
+                ('advance_payment', models.CharField(blank=True, max_length=20, null=True, verbose_name='Advance Payment')),
+                ('shelf_life', models.IntegerField(blank=True, null=True, verbose_name='Shelf Life in days')),
+                ('packaging_details', models.TextField(blank=True, max_length=1000, null=True)),
+                ('grade', models.CharField(blank=True, max_length=10, null=True, verbose_name='Grade')),
+                ('bar_code', models.CharField(max_length=20, verbose_name='Bar Code')),
+                ('bar_code_type', models.CharField(choices=[('UPC', 'Universal Product Code'), ('EAN', 'European Article Number'), ('GS1', 'GS1 DataBar'), ('QR', 'QR Codes'), ('C128', 'Code 128'), ('ITF14', 'ITF-14')], max_length=5, verbose_name='Bar Code Type')),
+                ('is_private_label_available', models.BooleanField(default=False)),
+                ('manufacturer_name', models.CharField(blank=True, max_length=100, null=True, verbose_name='Manufacturer Name')),
+                ('supplier_name', models.CharField(blank=True, max_length=100, null=True, verbose_name='Supplier Name')),
+                ('supplier_address', models.CharField(blank=True, max_length=255, null=True, verbose_name='Supplier Address')),
+                ('image', models.CharField(blank=True, max_length=255, null=True, verbose_name='Image')),
+                ('updated', models.DateTimeField(auto_now=True)),
+            ],
+            options={
+                'indexes': [models.Index(fields=['updated', 'product'], name='product_card_updated_idx'), models.Index(fields=['name', 'product'], name='product_card_name_idx')],
+            },
+        ),
+    ]
@@ -0,0 +1,50 @@
+# Generated by Django 4.0.7 on 2026-10-18 11:20
+
+import django.contrib.postgres.indexes
+import django.contrib.postgres.search
+from django.contrib.postgres.search import SearchVector
+from django.db import migrations
+
+
+def populate_search_vectors(apps, schema_editor):
+    Product = apps.get_model('catalog', 'Product')
+    Manufacturer = apps.get_model('catalog', 'Manufacturer')
+    Product.objects.update(search_vector=(
+        SearchVector('name', weight='A', config='english')
+        + SearchVector('description', weight='B', config='english')
+        + SearchVector('packaging_details', weight='C', config='english')
+    ))
+    Manufacturer.objects.update(search_vector=(
+        SearchVector('name', weight='A', config='english')
+        + SearchVector('brand_name', weight='A', config='english')
+        + SearchVector('ingredients', weight='C', config='english')
+    ))
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('catalog', '0003_productcard'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='manufacturer',
+            name='search_vector',
+            field=django.contrib.postgres.search.SearchVectorField(editable=False, null=True),
+        ),
+        migrations.AddField(
+            model_name='product',
+            name='search_vector',
+            field=django.contrib.postgres.search.SearchVectorField(editable=False, null=True),
+        ),
+        migrations.AddIndex(
+            model_name='manufacturer',
+            index=django.contrib.postgres.indexes.GinIndex(fields=['search_vector'], name='manufacturer_search_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='product',
+            index=django.contrib.postgres.indexes.GinIndex(fields=['search_vector'], name='product_search_idx'),
+        ),
+        migrations.RunPython(populate_search_vectors, migrations.RunPython.noop),
+    ]
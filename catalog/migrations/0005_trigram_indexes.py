@@ -0,0 +1,28 @@
+# Generated by Django 4.0.7 on 2026-10-18 12:05
+
+import django.contrib.postgres.indexes
+from django.contrib.postgres.operations import TrigramExtension
+from django.db import migrations
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('catalog', '0004_full_text_search'),
+    ]
+
+    operations = [
+        TrigramExtension(),
+        migrations.AddIndex(
+            model_name='manufacturer',
+            index=django.contrib.postgres.indexes.GinIndex(fields=['name'], name='manufacturer_name_trgm_idx', opclasses=['gin_trgm_ops']),
+        ),
+        migrations.AddIndex(
+            model_name='manufacturer',
+            index=django.contrib.postgres.indexes.GinIndex(fields=['brand_name'], name='manufacturer_brand_trgm_idx', opclasses=['gin_trgm_ops']),
+        ),
+        migrations.AddIndex(
+            model_name='product',
+            index=django.contrib.postgres.indexes.GinIndex(fields=['name'], name='product_name_trgm_idx', opclasses=['gin_trgm_ops']),
+        ),
+    ]
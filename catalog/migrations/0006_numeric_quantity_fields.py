@@ -0,0 +1,61 @@
+# Generated by Django 4.0.7 on 2026-10-18 13:10
+
+from django.db import migrations, models
+
+
+def value_field():
+    return models.DecimalField(blank=True, decimal_places=3, editable=False, max_digits=14, null=True)
+
+
+def unit_field():
+    return models.CharField(blank=True, editable=False, max_length=20, null=True)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('catalog', '0005_trigram_indexes'),
+    ]
+
+    operations = [
+        migrations.AddField(model_name='productvariant', name='net_weight_per_volume_value', field=value_field()),
+        migrations.AddField(model_name='productvariant', name='net_weight_per_volume_unit', field=unit_field()),
+        migrations.AddField(model_name='productvariant', name='quantity_per_carton_value', field=value_field()),
+        migrations.AddField(model_name='productvariant', name='quantity_per_carton_unit', field=unit_field()),
+        migrations.AddField(model_name='productvariant', name='quantity_of_items_per_pallete_value', field=value_field()),
+        migrations.AddField(model_name='productvariant', name='quantity_of_items_per_pallete_unit', field=unit_field()),
+        migrations.AddField(model_name='shippingandordering', name='moq_value', field=value_field()),
+        migrations.AddField(model_name='shippingandordering', name='moq_unit', field=unit_field()),
+        migrations.AddField(model_name='shippingandordering', name='min_no_boxes_pallet_value', field=value_field()),
+        migrations.AddField(model_name='shippingandordering', name='min_no_boxes_pallet_unit', field=unit_field()),
+        migrations.AddField(
+            model_name='shippingandordering', name='max_no_items_in_full_40_inch_container_value', field=value_field()
+        ),
+        migrations.AddField(
+            model_name='shippingandordering', name='max_no_items_in_full_40_inch_container_unit', field=unit_field()
+        ),
+        migrations.AddIndex(
+            model_name='productvariant',
+            index=models.Index(fields=['net_weight_per_volume_value'], name='variant_net_weight_value_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='productvariant',
+            index=models.Index(fields=['quantity_per_carton_value'], name='variant_qty_carton_value_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='productvariant',
+            index=models.Index(fields=['quantity_of_items_per_pallete_value'], name='variant_qty_pallet_value_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='shippingandordering',
+            index=models.Index(fields=['moq_value'], name='shipping_moq_value_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='shippingandordering',
+            index=models.Index(fields=['min_no_boxes_pallet_value'], name='shipping_min_boxes_value_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='shippingandordering',
+            index=models.Index(fields=['max_no_items_in_full_40_inch_container_value'], name='shipping_max_items_value_idx'),
+        ),
+    ]
@@ -0,0 +1,17 @@
+# Generated by Django 4.0.7 on 2026-10-18 14:05
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('catalog', '0007_rating_aggregates'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='productreview',
+            index=models.Index(fields=['product', 'created', 'id'], name='review_product_created_idx'),
+        ),
+    ]
@@ -0,0 +1,33 @@
+# Generated by Django 4.0.7 on 2026-10-18 14:50
+
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('catalog', '0008_review_feed_index'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='category',
+            name='updated',
+            field=models.DateTimeField(auto_now=True),
+        ),
+        migrations.CreateModel(
+            name='CatalogSnapshot',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('key', models.CharField(max_length=50, unique=True)),
+                ('version', models.BigIntegerField()),
+                ('path', models.CharField(max_length=255)),
+                ('previous_path', models.CharField(blank=True, max_length=255, null=True)),
+                ('product_count', models.PositiveIntegerField(default=0)),
+                ('source_updated', models.DateTimeField(blank=True, null=True)),
+                ('generated', models.DateTimeField()),
+                ('category', models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='snapshots', to='catalog.category')),
+            ],
+        ),
+    ]
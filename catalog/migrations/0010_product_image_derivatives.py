@@ -0,0 +1,28 @@
+# Generated by Django 4.0.7 on 2026-10-18 15:30
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('catalog', '0009_catalog_snapshots'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='productimages',
+            name='derivatives',
+            field=models.JSONField(blank=True, default=dict, editable=False),
+        ),
+        migrations.AddField(
+            model_name='productimages',
+            name='derivatives_source',
+            field=models.CharField(blank=True, editable=False, max_length=255, null=True),
+        ),
+        migrations.AddField(
+            model_name='productcard',
+            name='image_srcset',
+            field=models.TextField(blank=True, null=True),
+        ),
+    ]
@@ -0,0 +1,28 @@
+# Generated by Django 4.0.7 on 2026-10-18 16:12
+
+import catalog.models
+from django.db import migrations, models
+import django.db.models.deletion
+import utils.helpers
+import utils.storage
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('common', '0001_initial'),
+        ('catalog', '0010_product_image_derivatives'),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name='productimages',
+            name='image',
+            field=models.ImageField(blank=True, null=True, storage=utils.storage.ContentAddressedStorage(), upload_to=utils.helpers.catalog_directory_path, validators=[catalog.models.verify_product_image_mime_type, catalog.models.verify_product_image_size]),
+        ),
+        migrations.AddField(
+            model_name='productimages',
+            name='blob',
+            field=models.ForeignKey(blank=True, editable=False, null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='product_images', to='common.contentblob'),
+        ),
+    ]
@@ -0,0 +1,23 @@
+# Generated by Django 4.0.7 on 2026-10-18 16:40
+
+import django.contrib.postgres.indexes
+from django.db import migrations, models
+import django.db.models.fields.json
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('catalog', '0011_content_addressed_images'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='product',
+            index=django.contrib.postgres.indexes.GinIndex(fields=['additional_data'], name='product_additional_data_idx', opclasses=['jsonb_path_ops']),
+        ),
+        migrations.AddIndex(
+            model_name='product',
+            index=models.Index(django.db.models.fields.json.KeyTransform('origin', 'additional_data'), name='product_data_origin_idx'),
+        ),
+    ]
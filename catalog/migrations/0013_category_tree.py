@@ -0,0 +1,58 @@
+# Generated by Django 4.0.7 on 2026-10-18 17:05
+
+from django.db import migrations, models
+import django.db.models.deletion
+import mptt.fields
+
+
+def make_existing_categories_roots(apps, schema_editor):
+    # Every flat category becomes the single node of its own tree
+    Category = apps.get_model('catalog', 'Category')
+    categories = list(Category.objects.order_by('name', 'id'))
+    for tree_id, category in enumerate(categories, start=1):
+        category.tree_id, category.lft, category.rght, category.level = tree_id, 1, 2, 0
+    Category.objects.bulk_update(categories, ['tree_id', 'lft', 'rght', 'level'], batch_size=1000)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('catalog', '0012_product_additional_data_indexes'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='category',
+            name='parent',
+            field=mptt.fields.TreeForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.CASCADE, related_name='children', to='catalog.category'),
+        ),
+        migrations.AddField(
+            model_name='category',
+            name='level',
+            field=models.PositiveIntegerField(default=0, editable=False),
+            preserve_default=False,
+        ),
+        migrations.AddField(
+            model_name='category',
+            name='lft',
+            field=models.PositiveIntegerField(default=0, editable=False),
+            preserve_default=False,
+        ),
+        migrations.AddField(
+            model_name='category',
+            name='rght',
+            field=models.PositiveIntegerField(default=0, editable=False),
+            preserve_default=False,
+        ),
+        migrations.AddField(
+            model_name='category',
+            name='tree_id',
+            field=models.PositiveIntegerField(db_index=True, default=0, editable=False),
+            preserve_default=False,
+        ),
+        migrations.RunPython(make_existing_categories_roots, migrations.RunPython.noop),
+        migrations.AlterIndexTogether(
+            name='category',
+            index_together={('tree_id', 'lft')},
+        ),
+    ]
@@ -0,0 +1,46 @@
+# Generated by Django 4.0.7 on 2026-10-18 17:30
+
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+def remove_duplicate_supplier_products(apps, schema_editor):
+    # Keeps the oldest link of every (supplier, product) pair so the unique constraint can be added
+    SupplierProducts = apps.get_model('catalog', 'SupplierProducts')
+    duplicates = SupplierProducts.objects.values('supplier_id', 'product_id').annotate(
+        first_id=models.Min('id'), links=models.Count('id')
+    ).filter(links__gt=1)
+    for duplicate in duplicates.iterator():
+        SupplierProducts.objects.filter(
+            supplier_id=duplicate['supplier_id'], product_id=duplicate['product_id']
+        ).exclude(id=duplicate['first_id']).delete()
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('accounts', '0003_content_addressed_documents'),
+        ('catalog', '0013_category_tree'),
+    ]
+
+    operations = [
+        migrations.RunPython(remove_duplicate_supplier_products, migrations.RunPython.noop),
+        migrations.AddConstraint(
+            model_name='supplierproducts',
+            constraint=models.UniqueConstraint(fields=('supplier', 'product'), name='supplier_product_unique'),
+        ),
+        migrations.AddIndex(
+            model_name='supplierproducts',
+            index=models.Index(fields=['product', 'supplier'], name='product_supplier_idx'),
+        ),
+        migrations.AlterField(
+            model_name='supplierproducts',
+            name='product',
+            field=models.ForeignKey(db_index=False, on_delete=django.db.models.deletion.CASCADE, to='catalog.product'),
+        ),
+        migrations.AlterField(
+            model_name='supplierproducts',
+            name='supplier',
+            field=models.ForeignKey(db_index=False, on_delete=django.db.models.deletion.CASCADE, to='accounts.company'),
+        ),
+    ]
@@ -0,0 +1,23 @@
+# Generated by Django 4.0.7 on 2026-10-18 21:05
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('catalog', '0016_product_change_log'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='productchange',
+            name='transaction_id',
+            field=models.BigIntegerField(default=0),
+            preserve_default=False,
+        ),
+        migrations.AddIndex(
+            model_name='productchange',
+            index=models.Index(fields=['transaction_id', 'id'], name='product_change_order_idx'),
+        ),
+    ]
@@ -0,0 +1,34 @@
+# Generated by Django 4.0.7 on 2026-10-18 21:30
+
+from django.contrib.postgres.search import SearchVector, SearchVectorField
+from django.db import migrations
+from django.db.models import OuterRef, Subquery, Value
+from django.db.models.expressions import CombinedExpression
+from django.db.models.functions import Coalesce
+
+
+def populate_search_vectors(apps, schema_editor):
+    Product = apps.get_model('catalog', 'Product')
+    Manufacturer = apps.get_model('catalog', 'Manufacturer')
+    Product.objects.update(search_vector=CombinedExpression(
+        SearchVector('name', weight='A', config='english')
+        + SearchVector('description', weight='B', config='english')
+        + SearchVector('packaging_details', weight='C', config='english'),
+        '||',
+        Coalesce(
+            Subquery(Manufacturer.objects.filter(id=OuterRef('manufacturer_id')).values('search_vector')[:1]),
+            Value('', output_field=SearchVectorField())
+        ),
+        output_field=SearchVectorField()
+    ))
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('catalog', '0017_product_change_transaction'),
+    ]
+
+    operations = [
+        migrations.RunPython(populate_search_vectors, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,18 @@
+# Generated by Django 4.0.7 on 2026-10-18 22:10
+
+import django.contrib.postgres.indexes
+from django.db import migrations
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('catalog', '0018_product_search_vector_manufacturer'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='product',
+            index=django.contrib.postgres.indexes.GinIndex(fields=['additional_data'], name='product_data_keys_idx'),
+        ),
+    ]
@@ -9,9 +9,13 @@ from django.core.validators import (
 from django.db import models
 from django.db.models import QuerySet, Q, Model, OneToOneField, CASCADE, ManyToManyField, ForeignKey, SET_NULL, \
 	CharField, TextField, BooleanField, DateTimeField, UUIDField, TextChoices, EmailField, FileField, ImageField,\
-	IntegerField, DecimalField, JSONField
+	IntegerField, DecimalField, JSONField, PositiveIntegerField, PositiveSmallIntegerField
 from django.utils.translation import gettext_lazy as _
 from django.contrib.postgres.fields import ArrayField
+from django.contrib.postgres.indexes import GinIndex
+from django.contrib.postgres.search import SearchVectorField
+from django.db.models.fields.json import KeyTransform
+from mptt.models import MPTTModel, TreeForeignKey
 
 from accounts.models import Address
 from common.location.models import City, State, Country
@@ -19,6 +23,12 @@ from pronto.settings import IMAGE_MIME_TYPES, MAX_PRODUCT_IMAGE_SIZE
 from utils.db_interactors import get_record_by_filters, db_get_family, get_single_record_by_filters, db_add_many_to_many_field_data
 from utils.validators import check_file_mime_type, check_file_size
 from utils.helpers import catalog_directory_path
+from utils.storage import content_addressed_storage
+from .constants import (
+	QUANTITY_MAX_DIGITS, QUANTITY_DECIMAL_PLACES, QUANTITY_UNIT_MAX_LENGTH, MIN_PRODUCT_RATING, MAX_PRODUCT_RATING,
+	PRODUCT_DATA_INDEXED_KEYS
+)
+from .quantities import parse_quantity
 
 
 def verify_product_image_mime_type(image):
@@ -29,8 +39,50 @@ def verify_product_image_size(logo):
 	check_file_size(file=logo, max_size=MAX_PRODUCT_IMAGE_SIZE)
 
 
-class Category(Model):
+class NumericShadowFieldsMixin:
+	"""
+	Keeps a parsed `<field>_value` / `<field>_unit` pair next to each free-text quantity listed in `numeric_fields`
+	so range filters run in SQL. Rows written with bulk_create/bulk_update must call populate_numeric_fields().
+	"""
+	numeric_fields = ()
+
+	@classmethod
+	def get_numeric_shadow_fields(cls, fields=None) -> list:
+		return [f'{field}_{suffix}' for field in (cls.numeric_fields if fields is None else fields) for suffix in ('value', 'unit')]
+
+	def populate_numeric_fields(self):
+		for field in self.numeric_fields:
+			value, unit = parse_quantity(getattr(self, field))
+			setattr(self, f'{field}_value', value)
+			setattr(self, f'{field}_unit', unit)
+
+	def save(self, *args, **kwargs):
+		self.populate_numeric_fields()
+		update_fields = kwargs.get('update_fields')
+		if update_fields is not None:
+			changed = [field for field in self.numeric_fields if field in update_fields]
+			kwargs['update_fields'] = set(update_fields).union(self.get_numeric_shadow_fields(changed))
+		super().save(*args, **kwargs)
+
+
+def numeric_value_field():
+	return DecimalField(
+		max_digits=QUANTITY_MAX_DIGITS, decimal_places=QUANTITY_DECIMAL_PLACES, null=True, blank=True, editable=False
+	)
+
+
+def numeric_unit_field():
+	return CharField(max_length=QUANTITY_UNIT_MAX_LENGTH, null=True, blank=True, editable=False)
+
+
+class Category(MPTTModel):
 	name = CharField(max_length=255)
+	parent = TreeForeignKey('self', on_delete=CASCADE, null=True, blank=True, related_name='children')
+	# Touched when products join or leave the category, see catalog.signals.
+	updated = DateTimeField(auto_now=True)
+
+	class MPTTMeta:
+		order_insertion_by = ['name']
 
 	def __str__(self):
 		return self.name
@@ -46,6 +98,14 @@ class Manufacturer(Model):
 	lead_time = CharField(_('Lead Time'), max_length=50, null=True, blank=True)
 	quantity_available_today = CharField(_('Quantity Available Today'), max_length=50, null=True, blank=True)
 	incoterms = CharField(_('Incoterms'), max_length=50, null=True, blank=True)
+	search_vector = SearchVectorField(null=True, editable=False)
+
+	class Meta:
+		indexes = [
+			GinIndex(fields=['search_vector'], name='manufacturer_search_idx'),
+			GinIndex(fields=['name'], opclasses=['gin_trgm_ops'], name='manufacturer_name_trgm_idx'),
+			GinIndex(fields=['brand_name'], opclasses=['gin_trgm_ops'], name='manufacturer_brand_trgm_idx'),
+		]
 
 
 class Product(Model):
@@ -72,19 +132,82 @@ class Product(Model):
 	manufacturer = ForeignKey(Manufacturer, on_delete=models.CASCADE, null=True)
 	created = DateTimeField(auto_now_add=True)
 	updated = DateTimeField(auto_now=True)
+	search_vector = SearchVectorField(null=True, editable=False)
+	# Rating and review aggregates, maintained with F() updates by the handlers in catalog.signals.
+	rating_count = PositiveIntegerField(default=0, editable=False)
+	rating_sum = PositiveIntegerField(default=0, editable=False)
+	rating_average = DecimalField(max_digits=3, decimal_places=2, default=0, editable=False)
+	rating_1_count = PositiveIntegerField(default=0, editable=False)
+	rating_2_count = PositiveIntegerField(default=0, editable=False)
+	rating_3_count = PositiveIntegerField(default=0, editable=False)
+	rating_4_count = PositiveIntegerField(default=0, editable=False)
+	rating_5_count = PositiveIntegerField(default=0, editable=False)
+	review_count = PositiveIntegerField(default=0, editable=False)
+
+	aggregate_fields = (
+		'rating_count', 'rating_sum', 'rating_average', 'rating_1_count', 'rating_2_count', 'rating_3_count',
+		'rating_4_count', 'rating_5_count', 'review_count'
+	)
+
+	class Meta:
+		# Composite (value, id) indexes back the keyset pagination orderings.
+		indexes = [
+			models.Index(fields=['updated', 'id'], name='product_updated_id_idx'),
+			models.Index(fields=['rating_average', 'id'], name='product_rating_id_idx'),
+			models.Index(fields=['created', 'id'], name='product_created_id_idx'),
+			models.Index(fields=['name', 'id'], name='product_name_id_idx'),
+			GinIndex(fields=['search_vector'], name='product_search_idx'),
+			GinIndex(fields=['name'], opclasses=['gin_trgm_ops'], name='product_name_trgm_idx'),
+			# jsonb_path_ops only serves containment (@>) but is far smaller than the default jsonb_ops
+			GinIndex(fields=['additional_data'], opclasses=['jsonb_path_ops'], name='product_additional_data_idx'),
+			# Key existence (?, ?| and ?&) of the keys that have no expression index needs the default jsonb_ops
+			GinIndex(fields=['additional_data'], name='product_data_keys_idx'),
+			# Equality and IN on the hot keys, e.g. additional_data__origin__in=[...]
+			*(
+				models.Index(KeyTransform(key, 'additional_data'), name=f'product_data_{key}_idx')
+				for key in PRODUCT_DATA_INDEXED_KEYS
+			),
+		]
 
 	def __str__(self):
 		return f'{self.pk}: {self.name}'
 
+	def save(self, *args, **kwargs):
+		# The aggregates are only written through F() updates; a full save of an existing row must not put back
+		# the possibly stale values it was loaded with.
+		if not self._state.adding and kwargs.get('update_fields') is None:
+			deferred_fields = self.get_deferred_fields()
+			kwargs['update_fields'] = [
+				field.name for field in self._meta.concrete_fields
+				if not field.primary_key and field.name not in self.aggregate_fields
+				and field.attname not in deferred_fields
+			]
+		super().save(*args, **kwargs)
+
+
+class ProductVariant(NumericShadowFieldsMixin, Model):
+	numeric_fields = ('net_weight_per_volume', 'quantity_per_carton', 'quantity_of_items_per_pallete')
 
-class ProductVariant(Model):
 	product = ForeignKey(Product, on_delete=models.CASCADE)
 	net_weight_per_volume = CharField(_('Net Weight/Volume'), max_length=20)
 	gross_weight_per_volume = CharField(_('Gross Weight/Volume'), max_length=20, null=True, blank=True)
 	quantity_per_carton = CharField(_('Quantity/Carton'), max_length=20, null=True, blank=True)
 	quantity_of_items_per_pallete = CharField(_('Quantity/allete'), max_length=20, null=True, blank=True)
 	volume = CharField(_('Volume'), max_length=20, null=True, blank=True)
-	
+	net_weight_per_volume_value = numeric_value_field()
+	net_weight_per_volume_unit = numeric_unit_field()
+	quantity_per_carton_value = numeric_value_field()
+	quantity_per_carton_unit = numeric_unit_field()
+	quantity_of_items_per_pallete_value = numeric_value_field()
+	quantity_of_items_per_pallete_unit = numeric_unit_field()
+
+	class Meta:
+		indexes = [
+			models.Index(fields=['net_weight_per_volume_value'], name='variant_net_weight_value_idx'),
+			models.Index(fields=['quantity_per_carton_value'], name='variant_qty_carton_value_idx'),
+			models.Index(fields=['quantity_of_items_per_pallete_value'], name='variant_qty_pallet_value_idx'),
+		]
+
 	def __str__(self):
 		return f'{self.product.name}'
 
@@ -95,8 +218,18 @@ class ProductConfig(Model):
 
 
 class SupplierProducts(Model):
-	product = ForeignKey(Product, on_delete=models.CASCADE)
-	supplier = ForeignKey('accounts.Company', on_delete=models.CASCADE)
+	# The single column FK indexes are left out, each is a prefix of one of the composite indexes below.
+	product = ForeignKey(Product, on_delete=models.CASCADE, db_index=False)
+	supplier = ForeignKey('accounts.Company', on_delete=models.CASCADE, db_index=False)
+
+	class Meta:
+		# (supplier, product) backs the supplier storefront, (product, supplier) the supplier lookups of products.
+		constraints = [
+			models.UniqueConstraint(fields=['supplier', 'product'], name='supplier_product_unique'),
+		]
+		indexes = [
+			models.Index(fields=['product', 'supplier'], name='product_supplier_idx'),
+		]
 
 
 class ProductReview(Model):
@@ -106,10 +239,18 @@ class ProductReview(Model):
 	created = DateTimeField(auto_now_add=True)
 	updated = DateTimeField(auto_now=True)
 
+	class Meta:
+		# Backs the per-product review feed ordered by (created, id).
+		indexes = [
+			models.Index(fields=['product', 'created', 'id'], name='review_product_created_idx'),
+		]
+
 
 class ProductRatings(Model):
 	buyer_name = CharField(_('Buyer Name'), max_length=100)
-	rating = DecimalField(max_digits=1, decimal_places=1, default=0.0)
+	rating = PositiveSmallIntegerField(
+		validators=[MinValueValidator(MIN_PRODUCT_RATING), MaxValueValidator(MAX_PRODUCT_RATING)]
+	)
 	product = ForeignKey(Product, on_delete=models.CASCADE)
 	created = DateTimeField(auto_now_add=True)
 	updated = DateTimeField(auto_now=True)
@@ -117,13 +258,23 @@ class ProductRatings(Model):
 
 class ProductImages(Model):
 	product = ForeignKey(Product, on_delete=CASCADE, related_name='product_images')
-	image = ImageField(upload_to=catalog_directory_path, blank=True, null=True, validators=[verify_product_image_mime_type, verify_product_image_size])
+	image = ImageField(
+		upload_to=catalog_directory_path, storage=content_addressed_storage, blank=True, null=True,
+		validators=[verify_product_image_mime_type, verify_product_image_size]
+	)
+	# Deduplicated blob behind image, set once the upload is stored
+	blob = ForeignKey(
+		'common.ContentBlob', on_delete=SET_NULL, null=True, blank=True, editable=False, related_name='product_images'
+	)
+	# {'thumbnail': path, 'widths': [[width, path], ...]} generated from the image named in derivatives_source
+	derivatives = JSONField(default=dict, blank=True, editable=False)
+	derivatives_source = CharField(max_length=255, null=True, blank=True, editable=False)
 
 	def __str__(self):
 		return f'{self.id}-{self.product.name}'
 
 
-class ShippingAndOrdering(Model):
+class ShippingAndOrdering(NumericShadowFieldsMixin, Model):
 	class PalletsTypes(TextChoices):
 		EUROPEAN_PALLET = 'EP', _('European Pallet')
 		NORTHAMERICAN_PALLET = 'NP', _('North American Pallet')
@@ -135,6 +286,8 @@ class ShippingAndOrdering(Model):
 		ISPM_15 = 'ISP', _('ISPM 15')
 		CANADIAN_PALLET  = 'CAP', _('Canadian Pallet')
 
+	numeric_fields = ('moq', 'min_no_boxes_pallet', 'max_no_items_in_full_40_inch_container')
+
 	product = ForeignKey(Product, on_delete=CASCADE, related_name='product')
 	quantity_in_the_box = CharField(_('Quantity in the box'), max_length=50)
 	payment_terms = TextField(_('Payment terms'), max_length=1000)
@@ -148,3 +301,128 @@ class ShippingAndOrdering(Model):
 	shipment_terms = CharField(_('Shipment terms'), max_length=100, null=True, blank=True)
 	shipping_modes = CharField(_('Shipment Modes'), max_length=100, null=True, blank=True)
 	types_of_pallets_used = CharField(_('Types of Pallets used'), max_length=100, null=True, blank=True)
+	moq_value = numeric_value_field()
+	moq_unit = numeric_unit_field()
+	min_no_boxes_pallet_value = numeric_value_field()
+	min_no_boxes_pallet_unit = numeric_unit_field()
+	max_no_items_in_full_40_inch_container_value = numeric_value_field()
+	max_no_items_in_full_40_inch_container_unit = numeric_unit_field()
+
+	class Meta:
+		indexes = [
+			models.Index(fields=['moq_value'], name='shipping_moq_value_idx'),
+			models.Index(fields=['min_no_boxes_pallet_value'], name='shipping_min_boxes_value_idx'),
+			models.Index(fields=['max_no_items_in_full_40_inch_container_value'], name='shipping_max_items_value_idx'),
+		]
+
+
+class ProductCard(Model):
+	"""
+	Denormalized read model holding exactly what ProductListSerializer emits for a product.
+	Rows are rebuilt from catalog writes by the handlers in catalog.signals.
+	"""
+	product = OneToOneField(Product, on_delete=CASCADE, primary_key=True, related_name='card')
+	name = CharField(_('Product Name'), max_length=100)
+	description = TextField(max_length=1000)
+	advance_payment = CharField(_('Advance Payment'), max_length=20, null=True, blank=True)
+	shelf_life = IntegerField(_('Shelf Life in days'), null=True, blank=True)
+	packaging_details = TextField(max_length=1000, blank=True, null=True)
+	grade = CharField(_('Grade'), max_length=10, null=True, blank=True)
+	bar_code = CharField(_('Bar Code'), max_length=20)
+	bar_code_type = CharField(_('Bar Code Type'), choices=Product.BarCodeType.choices, max_length=5)
+	is_private_label_available = BooleanField(default=False)
+	manufacturer_name = CharField(_('Manufacturer Name'), max_length=100, null=True, blank=True)
+	supplier_name = CharField(_('Supplier Name'), max_length=100, null=True, blank=True)
+	supplier_address = CharField(_('Supplier Address'), max_length=255, null=True, blank=True)
+	image = CharField(_('Image'), max_length=255, null=True, blank=True)
+	image_srcset = TextField(null=True, blank=True)
+	rating_average = DecimalField(max_digits=3, decimal_places=2, default=0)
+	rating_count = PositiveIntegerField(default=0)
+	review_count = PositiveIntegerField(default=0)
+	updated = DateTimeField(auto_now=True)
+
+	class Meta:
+		indexes = [
+			models.Index(fields=['updated', 'product'], name='product_card_updated_idx'),
+			models.Index(fields=['name', 'product'], name='product_card_name_idx'),
+			models.Index(fields=['rating_average', 'product'], name='product_card_rating_idx'),
+		]
+
+	def __str__(self):
+		return f'{self.pk}: {self.name}'
+
+
+class CatalogSnapshot(Model):
+	"""
+	Published gzipped JSON snapshot of the product cards of one category, or of the whole catalog.
+	Files are immutable and named after their version; the previous file is kept for clients still reading it.
+	"""
+	key = CharField(max_length=50, unique=True)
+	category = ForeignKey(Category, on_delete=SET_NULL, null=True, blank=True, related_name='snapshots')
+	version = models.BigIntegerField()
+	path = CharField(max_length=255)
+	previous_path = CharField(max_length=255, null=True, blank=True)
+	product_count = PositiveIntegerField(default=0)
+	# Latest product or category change included in the snapshot
+	source_updated = DateTimeField(null=True, blank=True)
+	generated = DateTimeField()
+
+	def __str__(self):
+		return f'{self.key}: {self.version}'
+
+
+class SimilarProduct(Model):
+	"""
+	Precomputed text similarity neighbors of a product, best first, rebuilt by the BuildSimilarProducts task.
+	"""
+	# The (product, rank) constraint covers the lookups by product
+	product = ForeignKey(Product, on_delete=CASCADE, related_name='similar_products', db_index=False)
+	neighbor = ForeignKey(Product, on_delete=CASCADE, related_name='+')
+	rank = PositiveSmallIntegerField()
+	score = models.FloatField()
+
+	class Meta:
+		constraints = [
+			models.UniqueConstraint(fields=['product', 'rank'], name='similar_product_rank_unique'),
+		]
+
+
+class ProductSimilarityState(Model):
+	"""
+	Fingerprint of the text the neighbors of a product were computed from, so rebuilds can skip unchanged rows.
+	"""
+	product = OneToOneField(Product, on_delete=CASCADE, primary_key=True, related_name='similarity_state')
+	signature = CharField(max_length=32)
+	# Neighbors stored for the product; fewer rows than this means a neighbor was deleted since
+	neighbor_count = PositiveSmallIntegerField(default=0)
+	updated = DateTimeField(auto_now=True)
+
+
+class ProductChange(Model):
+	"""
+	Append-only log of product writes backing the changes feed, written in the transaction of the write. Rows are
+	replayed in (transaction_id, id) order, which is also the sync token, and only once every older transaction
+	has finished, so a write that commits late is never skipped. Deletes are logged as tombstones.
+	"""
+	class Action(TextChoices):
+		CREATED = 'C', _('Created')
+		UPDATED = 'U', _('Updated')
+		DELETED = 'D', _('Deleted')
+
+	# Not a foreign key, tombstones must survive the product
+	product_id = models.BigIntegerField()
+	action = CharField(_('Action'), choices=Action.choices, max_length=1)
+	# Postgres txid_current() of the writing transaction
+	transaction_id = models.BigIntegerField()
+	created = DateTimeField(auto_now_add=True)
+
+	class Meta:
+		indexes = [
+			# The feed is a range scan on this index
+			models.Index(fields=['transaction_id', 'id'], name='product_change_order_idx'),
+			# Compaction finds the later change of the same product through this index
+			models.Index(fields=['product_id', 'id'], name='product_change_product_idx'),
+		]
+
+	def __str__(self):
+		return f'{self.pk}: {self.product_id} {self.action}'
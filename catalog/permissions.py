@@ -17,10 +17,45 @@ class ProductPermission(BasePermission):
     message = CATALOG_PERMISSION_ERROR_MESSAGE
 
     def has_permission(self, request, view):
-        if view.action in ['create', 'list', 'retrieve', 'update']:
+        if view.action in ['list', 'retrieve', 'cards', 'search', 'autocomplete', 'facets', 'bulk', 'export',
+                           'snapshots', 'similar', 'changes']:
             return True
+        elif view.action in ['create', 'update', 'partial_update', 'destroy']:
+            return bool(request.user and request.user.is_authenticated)
 
         return False
 
     def has_object_permission(self, request, view, obj):
+        if view.action in ['update', 'partial_update', 'destroy']:
+            # A listing is changed by the managers of the companies supplying it
+            if request.user.is_superuser:
+                return True
+            status, is_manager = db_check_existing_record(
+                model=SupplierProducts, filters={'product': obj, 'supplier__accountmanager__user': request.user}
+            )
+            return status and is_manager
         return True
+
+
+class ProductReviewPermission(BasePermission):
+
+    message = CATALOG_PERMISSION_ERROR_MESSAGE
+
+    def has_permission(self, request, view):
+        if view.action in ['list', 'retrieve']:
+            return True
+        elif view.action == 'create':
+            return bool(request.user and request.user.is_authenticated)
+
+        return False
+
+
+class SupplierStorefrontPermission(BasePermission):
+
+    message = CATALOG_PERMISSION_ERROR_MESSAGE
+
+    def has_permission(self, request, view):
+        if view.action in ['list', 'summary']:
+            return True
+
+        return False
@@ -0,0 +1,35 @@
+import re
+from decimal import Decimal, InvalidOperation
+
+from .constants import QUANTITY_UNIT_CONVERSIONS, QUANTITY_MAX_DIGITS, QUANTITY_DECIMAL_PLACES, QUANTITY_UNIT_MAX_LENGTH
+
+QUANTITY_PATTERN = re.compile(r'(?P<value>\d+(?:[.,]\d+)*)\s*(?P<unit>[^\W\d_]+)?')
+THOUSANDS_PATTERN = re.compile(r'\d{1,3}(?:,\d{3})+')
+
+
+def parse_quantity(text: str) -> tuple:
+    """
+    Parse the first number and its unit out of a free-text quantity such as "1,000 pcs", "2.5 Kg" or "500ml".
+    Mass and volume units are converted to grams and millilitres. Returns (None, None) when there is no number.
+    """
+    match = QUANTITY_PATTERN.search(text or '')
+    if not match:
+        return None, None
+    number = match.group('value')
+    if ',' in number and '.' not in number and not THOUSANDS_PATTERN.fullmatch(number):
+        number = number.replace(',', '.')  # Decimal comma, e.g. "1,5 kg"
+    else:
+        number = number.replace(',', '')
+    try:
+        value = Decimal(number)
+    except InvalidOperation:
+        return None, None
+
+    unit = (match.group('unit') or '').lower()[:QUANTITY_UNIT_MAX_LENGTH] or None
+    if unit in QUANTITY_UNIT_CONVERSIONS:
+        unit, multiplier = QUANTITY_UNIT_CONVERSIONS[unit]
+        value *= Decimal(multiplier)
+    value = value.quantize(Decimal(1).scaleb(-QUANTITY_DECIMAL_PLACES))
+    if value.adjusted() >= QUANTITY_MAX_DIGITS - QUANTITY_DECIMAL_PLACES:
+        return None, None
+    return value, unit
@@ -1,5 +1,5 @@
 from rest_framework.serializers import Serializer, ModelSerializer, CharField, ChoiceField, IntegerField, EmailField, \
-    SlugRelatedField, FileField, SerializerMethodField, BooleanField
+    SlugRelatedField, FileField, SerializerMethodField, BooleanField, ImageField, ListField
 
 from accounts.models import Company
 from utils.db_interactors import get_record_by_filters, get_record_by_id, get_single_record_by_filters, \
@@ -10,22 +10,115 @@ from .models import (
     ProductConfig, SupplierProducts,
     Manufacturer, ProductReview,
     ProductRatings, ProductImages,
-    ShippingAndOrdering
+    ShippingAndOrdering, ProductCard, CatalogSnapshot, verify_product_image_mime_type, verify_product_image_size
 )
 
 
+class ProductVariantNestedSerializer(ModelSerializer):
+
+    class Meta:
+        model = ProductVariant
+        exclude = ('product', *ProductVariant.get_numeric_shadow_fields())
+
+
+class ShippingAndOrderingNestedSerializer(ModelSerializer):
+
+    class Meta:
+        model = ShippingAndOrdering
+        exclude = ('product', *ShippingAndOrdering.get_numeric_shadow_fields())
+
+
 class ProductCreateSerializer(ModelSerializer):
+    """
+    A whole product listing: the product with its variants, shipping terms, images, stock flag and categories.
+    Each nested key that is sent replaces the stored rows, see db_save_product_listing.
+    """
+    variants = ProductVariantNestedSerializer(many=True, required=False, write_only=True)
+    shipping = ShippingAndOrderingNestedSerializer(many=True, required=False, write_only=True)
+    images = ListField(
+        child=ImageField(validators=[verify_product_image_mime_type, verify_product_image_size]),
+        required=False, write_only=True
+    )
+    is_in_stock = BooleanField(required=False, write_only=True)
 
     class Meta:
         model = Product
-        exclude = ('created', 'updated')
+        exclude = ('created', 'updated', 'search_vector')
+
+
+class SparseFieldsetMixin:
+    """
+    Trims the rendered fields to the `fields` serializer context (from `?fields=`) and adds the
+    `expandable_fields` named in the `expand` context (from `?expand=`). Without either the serializer is unchanged.
+    """
+    expandable_fields = {}
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        expand = set(self.context.get('expand') or ())
+        for name, get_field in self.expandable_fields.items():
+            if name in expand:
+                self.fields[name] = get_field()
+        requested = self.context.get('fields')
+        if requested:
+            for name in set(self.fields) - set(requested) - expand:
+                self.fields.pop(name)
+
+
+class PrefetchedProductFieldsMixin:
+    """
+    Reads supplier, image and shipping data from the lists attached by `db_prefetch_product_list_data` and
+    `db_prefetch_product_details_data`, so serializing a page never issues per-row queries.
+    """
+
+    @staticmethod
+    def _get_first_supplier(obj):
+        suppliers = getattr(obj, 'prefetched_suppliers', None)
+        return suppliers[0].supplier if suppliers else None
+
+    def get_supplier_name(self, obj):
+        supplier = self._get_first_supplier(obj)
+        if isinstance(supplier, Company):
+            return supplier.name
+
+    def get_supplier_address(self, obj):
+        supplier = self._get_first_supplier(obj)
+        if isinstance(supplier, Company):
+            return supplier.legal_address
+
+    @staticmethod
+    def _get_first_image(obj):
+        images = getattr(obj, 'prefetched_images', None)
+        return images[0] if images else None
+
+    def get_image(self, obj):
+        # The thumbnail once derivatives are generated, the original upload until then.
+        image = self._get_first_image(obj)
+        if image:
+            return get_image_path((image.derivatives or {}).get('thumbnail') or image.image)
+
+    def get_image_srcset(self, obj):
+        image = self._get_first_image(obj)
+        if image and (image.derivatives or {}).get('widths'):
+            return ', '.join(f'{get_image_path(path)} {width}w' for width, path in image.derivatives['widths'])
 
+    def get_shipping_data(self, obj):
+        shipping_objects = getattr(obj, 'prefetched_shipping', None)
+        if shipping_objects:
+            return ShippingAndOrderingSerializer(shipping_objects[0]).data
 
-class ProductListSerializer(ModelSerializer):
-    manufacturer_name = CharField(source='manufacturer.name')
+
+class ProductListSerializer(SparseFieldsetMixin, PrefetchedProductFieldsMixin, ModelSerializer):
+    manufacturer_name = CharField(source='manufacturer.name', read_only=True, default=None)
     supplier_name = SerializerMethodField()
     supplier_address = SerializerMethodField()
     image = SerializerMethodField()
+    image_srcset = SerializerMethodField()
+
+    expandable_fields = {
+        'manufacturer': lambda: ManufacturerSerializer(read_only=True),
+        'shipping_data': SerializerMethodField,
+    }
 
     class Meta:
         model = Product
@@ -33,37 +126,31 @@ class ProductListSerializer(ModelSerializer):
             'id', 'name', 'description', 'advance_payment', 'shelf_life', 
             'packaging_details', 'grade', 'bar_code', 'bar_code_type',
             'is_private_label_available', 'manufacturer_name', 'supplier_name',
-            'supplier_address', 'image'
+            'supplier_address', 'image', 'image_srcset', 'rating_average', 'rating_count', 'review_count'
         )
 
-    def get_supplier_name(self, obj):
-        _, supplier_obj = get_single_record_by_filters(SupplierProducts, filters={'product_id': obj.id})
-        if isinstance(supplier_obj, SupplierProducts):
-            return supplier_obj.name
 
-    def get_supplier_address(self, obj):
-        _, supplier = get_single_record_by_filters(Company, filters={'product_id': obj.id})
-        if isinstance(supplier, Company):
-            return supplier.legal_address
+class ProductCardSerializer(SparseFieldsetMixin, ModelSerializer):
+    id = IntegerField(source='product_id', read_only=True)
 
-    def get_image(self, obj):
-        _, prod_image_obj = get_single_record_by_filters(ProductImages, filters={'product_id': obj.id})
-        if isinstance(prod_image_obj, ProductImages):
-            return get_image_path(prod_image_obj.image)
+    class Meta:
+        model = ProductCard
+        fields = ProductListSerializer.Meta.fields
 
 
 class ManufacturerSerializer(ModelSerializer):
 
     class Meta:
         model = Manufacturer
-        fields = '__all__'
+        exclude = ('search_vector',)
 
 
 class ProductReviewSerializer(ModelSerializer):
 
     class Meta:
         model = ProductReview
-        exclude = ('created', 'updated')
+        fields = ('id', 'buyer_name', 'review', 'created')
+        read_only_fields = ('created',)
 
 
 class ProductRatingsSerializer(ModelSerializer):
@@ -84,10 +171,10 @@ class ShippingAndOrderingSerializer(ModelSerializer):
 
     class Meta:
         model = ShippingAndOrdering
-        fields = '__all__'
+        exclude = ShippingAndOrdering.get_numeric_shadow_fields()
 
 
-class ProductDetailsSerializer(ModelSerializer):
+class ProductDetailsSerializer(PrefetchedProductFieldsMixin, ModelSerializer):
     name = CharField(required=True)
     description = CharField(required=True)
     advance_payment = CharField(required=False)
@@ -97,10 +184,11 @@ class ProductDetailsSerializer(ModelSerializer):
     bar_code = CharField(required=True)
     bar_code_type = CharField(required=True)
     is_private_label_available = BooleanField(default=False)
-    manufacturer_name = CharField(source='manufacturer.name')
+    manufacturer_name = CharField(source='manufacturer.name', read_only=True, default=None)
     supplier_name = SerializerMethodField()
     supplier_address = SerializerMethodField()
     image = SerializerMethodField()
+    image_srcset = SerializerMethodField()
     manufacturer = ManufacturerSerializer()
     shipping_data = SerializerMethodField()
 
@@ -110,24 +198,18 @@ class ProductDetailsSerializer(ModelSerializer):
             'id', 'name', 'description', 'advance_payment', 'shelf_life', 
             'packaging_details', 'grade', 'bar_code', 'bar_code_type',
             'is_private_label_available', 'manufacturer_name', 'supplier_name',
-            'supplier_address', 'image', 'manufacturer', 'shipping_data'
+            'supplier_address', 'image', 'image_srcset', 'rating_average', 'rating_count',
+            'review_count', 'manufacturer', 'shipping_data'
         )
 
-    def get_supplier_name(self, obj):
-        _, supplier_obj = get_single_record_by_filters(SupplierProducts, filters={'product_id': obj.id})
-        if isinstance(supplier_obj, SupplierProducts):
-            return supplier_obj.name
 
-    def get_supplier_address(self, obj):
-        _, supplier = get_single_record_by_filters(Company, filters={'product_id': obj.id})
-        if isinstance(supplier, Company):
-            return supplier.legal_address
+class CatalogSnapshotSerializer(ModelSerializer):
+    url = SerializerMethodField()
+    category_name = CharField(source='category.name', read_only=True, default=None)
 
-    def get_image(self, obj):
-        _, prod_image_obj = get_single_record_by_filters(ProductImages, filters={'product_id': obj.id})
-        if isinstance(prod_image_obj, ProductImages):
-            return get_image_path(prod_image_obj.image)
+    class Meta:
+        model = CatalogSnapshot
+        fields = ('key', 'category', 'category_name', 'url', 'version', 'product_count', 'generated')
 
-    def get_shipping_data(self, obj):
-        _, shipping_object = get_single_record_by_filters(ShippingAndOrdering, filters={'product_id': obj.id})
-        return ShippingAndOrderingSerializer(shipping_object).data
\ No newline at end of file
+    def get_url(self, obj):
+        return get_image_path(obj.path)
@@ -0,0 +1,232 @@
+from django.db.models.signals import pre_save, post_save, pre_delete, post_delete, m2m_changed
+from django.db.transaction import on_commit
+from django.dispatch import receiver
+from mptt.signals import node_moved
+
+from accounts.models import Company
+from .db_interactors import (
+    db_get_product_ids_by_manufacturer, db_get_product_ids_by_supplier,
+    db_update_product_search_vector, db_update_manufacturer_search_vector, db_touch_products,
+    db_update_product_rating_aggregates, db_update_product_review_count, db_get_product_rating,
+    db_touch_categories, db_get_category_ids_by_product, db_get_supplier_ids_by_products,
+    db_get_product_ids_by_category, db_get_product_stock_availability, db_log_product_changes
+)
+from .constants import MIN_PRODUCT_RATING, MAX_PRODUCT_RATING
+from .models import (
+    Product, Manufacturer, SupplierProducts, ProductImages, ProductVariant, ShippingAndOrdering, ProductRatings,
+    ProductReview, Category, ProductConfig, ProductChange
+)
+from .tasks import generate_product_image_derivatives, refresh_product_cards, delete_unused_image_derivatives
+from .utils import (
+    bump_product_detail_versions, bump_product_reviews_version, bump_category_tree_version,
+    bump_supplier_storefront_versions, set_product_stock_bits, bump_product_membership_version
+)
+
+
+def refresh_product_cards_on_commit(product_ids: list, action: str = ProductChange.Action.UPDATED):
+    # The change is logged in the writing transaction, so the feed entry commits or rolls back with the write.
+    # The rebuild is deferred to commit so cascading deletes inside the same transaction never rebuild a card
+    # for a product that is about to disappear.
+    if product_ids:
+        db_log_product_changes(product_ids=product_ids, action=action)
+        on_commit(lambda: refresh_product_cards(product_ids))
+
+
+def bump_product_detail_versions_on_commit(product_ids: list):
+    # Bumping before commit would let a concurrent reader cache the old payload under the new version.
+    if product_ids:
+        on_commit(lambda: bump_product_detail_versions(product_ids))
+
+
+def bump_supplier_storefront_versions_on_commit(supplier_ids: list):
+    if supplier_ids:
+        on_commit(lambda: bump_supplier_storefront_versions(supplier_ids))
+
+
+@receiver(post_save, sender=Product)
+def product_saved(sender, instance, created, **kwargs):
+    db_update_product_search_vector(product_ids=[instance.id])
+    refresh_product_cards_on_commit(
+        [instance.id], action=ProductChange.Action.CREATED if created else ProductChange.Action.UPDATED
+    )
+    bump_product_detail_versions_on_commit([instance.id])
+
+
+@receiver(post_delete, sender=Product)
+def product_deleted(sender, instance, **kwargs):
+    bump_product_detail_versions_on_commit([instance.id])
+    db_log_product_changes(product_ids=[instance.id], action=ProductChange.Action.DELETED)
+
+
+@receiver(pre_delete, sender=Product)
+def product_deleting(sender, instance, **kwargs):
+    # The category links are removed by the cascade without an m2m_changed signal.
+    db_touch_categories(category_ids=db_get_category_ids_by_product(product_id=instance.id))
+
+
+@receiver(m2m_changed, sender=Product.category.through)
+def product_categories_changed(sender, instance, action, reverse, pk_set, **kwargs):
+    # Category snapshots are regenerated from Category.updated when their product set changes.
+    if action not in ['post_add', 'post_remove', 'pre_clear']:
+        return
+    if reverse:
+        category_ids = [instance.id]
+    elif action == 'pre_clear':
+        category_ids = db_get_category_ids_by_product(product_id=instance.id)
+    else:
+        category_ids = list(pk_set)
+    db_touch_categories(category_ids=category_ids)
+    on_commit(bump_product_membership_version)
+
+
+@receiver(m2m_changed, sender=Product.category.through)
+def product_categories_changed_for_suppliers(sender, instance, action, reverse, pk_set, **kwargs):
+    # The category breakdown of every supplier of the products changes.
+    if action not in ['post_add', 'post_remove', 'pre_clear']:
+        return
+    if not reverse:
+        product_ids = [instance.id]
+    elif action == 'pre_clear':
+        product_ids = db_get_product_ids_by_category(category_id=instance.id)
+    else:
+        product_ids = list(pk_set)
+    bump_supplier_storefront_versions_on_commit(db_get_supplier_ids_by_products(product_ids=product_ids))
+
+
+@receiver(post_save, sender=Manufacturer)
+def manufacturer_saved(sender, instance, **kwargs):
+    db_update_manufacturer_search_vector(manufacturer_ids=[instance.id])
+    product_ids = db_get_product_ids_by_manufacturer(manufacturer_id=instance.id)
+    # The product vectors carry the manufacturer's
+    db_update_product_search_vector(product_ids=product_ids)
+    db_touch_products(product_ids=product_ids)
+    refresh_product_cards_on_commit(product_ids)
+    bump_product_detail_versions_on_commit(product_ids)
+
+
+@receiver(post_save, sender=Company)
+def company_saved(sender, instance, **kwargs):
+    product_ids = db_get_product_ids_by_supplier(supplier_id=instance.id)
+    db_touch_products(product_ids=product_ids)
+    refresh_product_cards_on_commit(product_ids)
+    bump_product_detail_versions_on_commit(product_ids)
+
+
+@receiver(post_save, sender=SupplierProducts)
+@receiver(post_delete, sender=SupplierProducts)
+@receiver(post_save, sender=ProductImages)
+@receiver(post_delete, sender=ProductImages)
+def product_child_changed(sender, instance, **kwargs):
+    db_touch_products(product_ids=[instance.product_id])
+    refresh_product_cards_on_commit([instance.product_id])
+    bump_product_detail_versions_on_commit([instance.product_id])
+
+
+@receiver(post_save, sender=SupplierProducts)
+@receiver(post_delete, sender=SupplierProducts)
+def supplier_products_changed(sender, instance, **kwargs):
+    bump_supplier_storefront_versions_on_commit([instance.supplier_id])
+
+
+@receiver(post_save, sender=ProductVariant)
+@receiver(post_delete, sender=ProductVariant)
+@receiver(post_save, sender=ShippingAndOrdering)
+@receiver(post_delete, sender=ShippingAndOrdering)
+def product_detail_child_changed(sender, instance, **kwargs):
+    db_touch_products(product_ids=[instance.product_id])
+    bump_product_detail_versions_on_commit([instance.product_id])
+
+
+def apply_rating_to_aggregates(product_id: int, rating: int, delta: int):
+    if MIN_PRODUCT_RATING <= rating <= MAX_PRODUCT_RATING:
+        db_update_product_rating_aggregates(product_id=product_id, rating=rating, delta=delta)
+
+
+@receiver(pre_save, sender=ProductRatings)
+def product_rating_saving(sender, instance, **kwargs):
+    # The stored values are needed to move the rating out of the old product/star bucket on update.
+    previous = None
+    if instance.id:
+        status, previous = db_get_product_rating(rating_id=instance.id)
+        if not status:
+            # Saving without them would leave the aggregates counting the old rating
+            raise Exception(f'Error occured while fetching the stored rating {previous}')
+    instance._previous_rating = previous
+
+
+@receiver(post_save, sender=ProductRatings)
+def product_rating_saved(sender, instance, created, **kwargs):
+    previous = getattr(instance, '_previous_rating', None)
+    current = (instance.product_id, int(instance.rating))
+    if previous == current:
+        return
+    if previous:
+        apply_rating_to_aggregates(*previous, delta=-1)
+    apply_rating_to_aggregates(*current, delta=1)
+    product_ids = {product_id for product_id, _ in filter(None, (previous, current))}
+    refresh_product_cards_on_commit(list(product_ids))
+    bump_product_detail_versions_on_commit(list(product_ids))
+
+
+@receiver(post_delete, sender=ProductRatings)
+def product_rating_deleted(sender, instance, **kwargs):
+    apply_rating_to_aggregates(instance.product_id, int(instance.rating), delta=-1)
+    refresh_product_cards_on_commit([instance.product_id])
+    bump_product_detail_versions_on_commit([instance.product_id])
+
+
+def bump_product_reviews_version_on_commit(product_id: int):
+    on_commit(lambda: bump_product_reviews_version(product_id))
+
+
+def apply_review_to_aggregates(product_id: int, delta: int):
+    db_update_product_review_count(product_id=product_id, delta=delta)
+    refresh_product_cards_on_commit([product_id])
+    bump_product_detail_versions_on_commit([product_id])
+
+
+@receiver(post_save, sender=ProductReview)
+def product_review_saved(sender, instance, created, **kwargs):
+    if created:
+        apply_review_to_aggregates(instance.product_id, delta=1)
+    bump_product_reviews_version_on_commit(instance.product_id)
+
+
+@receiver(post_delete, sender=ProductReview)
+def product_review_deleted(sender, instance, **kwargs):
+    apply_review_to_aggregates(instance.product_id, delta=-1)
+    bump_product_reviews_version_on_commit(instance.product_id)
+
+
+@receiver(post_save, sender=ProductImages)
+def product_image_saved(sender, instance, **kwargs):
+    if instance.image and instance.image.name != instance.derivatives_source:
+        on_commit(lambda: generate_product_image_derivatives.delay([instance.id]))
+
+
+@receiver(post_delete, sender=ProductImages)
+def product_image_deleted(sender, instance, **kwargs):
+    if instance.derivatives:
+        stale_derivatives = {instance.derivatives_source: instance.derivatives}
+        on_commit(lambda: delete_unused_image_derivatives(stale_derivatives))
+
+
+@receiver(post_save, sender=Category)
+@receiver(post_delete, sender=Category)
+@receiver(node_moved, sender=Category)
+def category_tree_changed(sender, instance, **kwargs):
+    # Moves renumber the lft/rght of whole subtrees, so every cached descendant set is dropped at once
+    on_commit(bump_category_tree_version)
+    # Category filters match whole subtrees, so a moved category changes the members of other categories
+    on_commit(bump_product_membership_version)
+
+
+@receiver(post_save, sender=ProductConfig)
+@receiver(post_delete, sender=ProductConfig)
+def product_config_changed(sender, instance, **kwargs):
+    # Only the availability bitmap and the list membership version follow stock flips; products, cards and their
+    # caches are left alone.
+    # Availability is read back after commit so concurrent flips of one product settle on the committed state.
+    product_id = instance.product_id
+    on_commit(lambda: set_product_stock_bits(db_get_product_stock_availability(product_ids=[product_id])))
+    on_commit(bump_product_membership_version)
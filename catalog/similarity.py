@@ -0,0 +1,93 @@
+import re
+import zlib
+
+import numpy as np
+
+TOKEN_PATTERN = re.compile(r'[^\W_]{2,}')
+SIGN_BIT = 0x80000000
+
+
+def tokenize(text: str) -> list:
+    return TOKEN_PATTERN.findall((text or '').lower())
+
+
+def hash_term_frequencies(documents: list, dimensions: int) -> np.ndarray:
+    """
+    Sublinear term frequency hashed bag-of-words vectors, one float32 row per document.
+
+    A document is a list of (text, weight) pairs. Tokens are hashed with CRC32, which is stable across processes,
+    into `dimensions` buckets with a hash derived sign so collisions cancel out rather than pile up.
+    """
+    vectors = np.zeros((len(documents), dimensions), dtype=np.float32)
+    for row, document in enumerate(documents):
+        buckets, weights = [], []
+        for text, weight in document:
+            for token in tokenize(text):
+                token_hash = zlib.crc32(token.encode())
+                buckets.append(token_hash % dimensions)
+                weights.append(weight if token_hash & SIGN_BIT else -weight)
+        if buckets:
+            np.add.at(vectors[row], buckets, weights)
+    np.multiply(np.sign(vectors), np.log1p(np.abs(vectors)), out=vectors)
+    return vectors
+
+
+def apply_idf(vectors: np.ndarray, document_frequency: np.ndarray, document_count: int, block_size: int):
+    """
+    Scales term frequency rows in place by the smoothed inverse document frequency of each bucket and L2
+    normalises them, block_size rows at a time so `vectors` can be a memory mapped file.
+    """
+    idf = (np.log((1 + document_count) / (1 + document_frequency)) + 1).astype(np.float32)
+    for start in range(0, len(vectors), block_size):
+        block = vectors[start:start + block_size]
+        block *= idf
+        norms = np.linalg.norm(block, axis=1, keepdims=True)
+        norms[norms == 0] = 1
+        block /= norms
+
+
+def top_k_neighbors(query_vectors: np.ndarray, query_ids: np.ndarray, vectors: np.ndarray, ids: np.ndarray,
+                    k: int, block_size: int) -> tuple:
+    """
+    The k rows of `vectors` most cosine similar to each query row, the row itself excluded, as (neighbor ids,
+    scores) arrays of shape (len(query_ids), k) in descending score order. Vectors must be L2 normalised.
+
+    Similarities are computed one block_size x block_size matrix product at a time and folded into a running
+    top k, so memory stays flat whatever the catalog size.
+    """
+    k = min(k, max(len(ids) - 1, 0))
+    neighbor_ids = np.full((len(query_ids), k), -1, dtype=np.int64)
+    scores = np.full((len(query_ids), k), -np.inf, dtype=np.float32)
+    if not k:
+        return neighbor_ids, scores
+
+    for start in range(0, len(query_ids), block_size):
+        block_query_ids = query_ids[start:start + block_size]
+        block_neighbor_ids, block_scores = neighbor_ids[start:start + block_size], scores[start:start + block_size]
+        for column_start in range(0, len(ids), block_size):
+            column_ids = ids[column_start:column_start + block_size]
+            similarity = query_vectors[start:start + block_size] @ vectors[column_start:column_start + block_size].T
+            similarity[block_query_ids[:, None] == column_ids[None, :]] = -np.inf
+
+            candidate_scores = np.concatenate([block_scores, similarity], axis=1)
+            candidate_ids = np.concatenate(
+                [block_neighbor_ids, np.broadcast_to(column_ids, similarity.shape)], axis=1
+            )
+            best = np.argpartition(-candidate_scores, k - 1, axis=1)[:, :k]
+            block_scores[...] = np.take_along_axis(candidate_scores, best, axis=1)
+            block_neighbor_ids[...] = np.take_along_axis(candidate_ids, best, axis=1)
+
+    order = np.argsort(-scores, axis=1, kind='stable')
+    return np.take_along_axis(neighbor_ids, order, axis=1), np.take_along_axis(scores, order, axis=1)
+
+
+def max_similarity(vectors: np.ndarray, target_vectors: np.ndarray, block_size: int) -> np.ndarray:
+    """
+    Highest cosine similarity of every row of `vectors` to any of `target_vectors`, computed block by block.
+    """
+    best = np.full(len(vectors), -np.inf, dtype=np.float32)
+    for start in range(0, len(vectors), block_size):
+        for target_start in range(0, len(target_vectors), block_size):
+            similarity = vectors[start:start + block_size] @ target_vectors[target_start:target_start + block_size].T
+            np.maximum(best[start:start + block_size], similarity.max(axis=1), out=best[start:start + block_size])
+    return best
@@ -1,5 +1,15 @@
+import json
 import logging
+import os
+from hashlib import md5
+from tempfile import NamedTemporaryFile
 
+import numpy as np
+
+from django.core.files.base import ContentFile
+from django.core.files.storage import default_storage
+from django.core.serializers.json import DjangoJSONEncoder
+from django.db.transaction import atomic, on_commit
 from django.utils.timezone import now, timedelta
 
 from catalog.models import (
@@ -7,7 +17,28 @@ from catalog.models import (
     ProductConfig, SupplierProducts,
     Manufacturer, ProductReview,
     ProductRatings, ProductImages,
-    ShippingAndOrdering
+    ShippingAndOrdering, ProductChange
+)
+from catalog.constants import (
+    ALL_PRODUCTS_SNAPSHOT_KEY, CATALOG_SNAPSHOT_CHUNK_SIZE, CATALOG_SNAPSHOT_MANIFEST, CATALOG_SNAPSHOT_LOCK_KEY,
+    CATALOG_SNAPSHOT_LOCK_TIMEOUT, PRODUCT_IMAGE_DERIVATIVES_DIRECTORY, SIMILAR_PRODUCTS_COUNT,
+    SIMILAR_PRODUCTS_DIMENSIONS, SIMILAR_PRODUCTS_BLOCK_SIZE, SIMILAR_PRODUCTS_SAVE_BATCH_SIZE,
+    SIMILAR_PRODUCTS_MIN_SCORE, SIMILAR_PRODUCTS_FIELD_WEIGHTS, SIMILAR_PRODUCTS_LOCK_KEY,
+    SIMILAR_PRODUCTS_LOCK_TIMEOUT, PRODUCT_CARD_REFRESH_MAX_RETRIES, PRODUCT_CARD_REFRESH_RETRY_DELAY
+)
+from catalog.db_interactors import (
+    db_get_catalog_snapshots, db_get_category_snapshot_states, db_get_snapshot_product_cards,
+    db_save_catalog_snapshot, db_get_queryset_validators, db_get_product_images_needing_derivatives,
+    db_get_product_image_derivatives_by_source, db_get_product_image_sources_in_use,
+    db_save_product_image_derivatives, db_touch_products, db_refresh_product_cards, db_log_product_changes,
+    db_iter_similarity_documents,
+    db_get_similarity_states, db_get_product_ids_by_neighbors, db_save_similar_products
+)
+from catalog.serializers import ProductCardSerializer, CatalogSnapshotSerializer
+from catalog.similarity import hash_term_frequencies, apply_idf, top_k_neighbors, max_similarity
+from catalog.utils import (
+    publish_snapshot_file, render_gzipped_snapshot, remove_snapshot_file, render_image_derivatives,
+    get_image_derivative_paths, bump_product_detail_versions, set_cached_product_cards_complete
 )
 from pronto.celery import app
 from utils.constants import (
@@ -18,8 +49,12 @@ from utils.constants import (
 from utils.helpers import notification_mail, get_required_details_for_mail
 from utils.db_interactors import get_record_by_filters, get_record_by_id, db_create_record, db_update_instance, \
     db_update_records_with_filters
+from utils.cache_interface import add_value, remove_keys
+from utils.storage import get_content_blob_digest
 from utils.tasks import base_task
 
+logger = logging.getLogger(__name__)
+
 
 @app.task(name='InitiateAccountVerification')
 def create_product(user_id: int):
@@ -27,3 +62,309 @@ def create_product(user_id: int):
     This task creates an entry in product table in database
     """
     return
+
+
+def publish_catalog_snapshot(key: str, snapshot=None, source_updated=None, category_id: int = None,
+                             category_name: str = None):
+    generated = now()
+    version = int(generated.timestamp() * 1000)
+    header = {'key': key, 'version': version, 'generated': generated}
+    if category_id is not None:
+        header['category'] = {'id': category_id, 'name': category_name}
+    cards = db_get_snapshot_product_cards(category_id=category_id).iterator(chunk_size=CATALOG_SNAPSHOT_CHUNK_SIZE)
+    counter = {}
+    path = publish_snapshot_file(
+        f'{key}-{version}.json.gz',
+        render_gzipped_snapshot(header, (ProductCardSerializer(card).data for card in cards), counter)
+    )
+    status, saved_snapshot = db_save_catalog_snapshot(key=key, data={
+        'category_id': category_id,
+        'version': version,
+        'path': path,
+        'previous_path': snapshot.path if snapshot else None,
+        'product_count': counter['count'],
+        'source_updated': source_updated,
+        'generated': generated,
+    })
+    if not status:
+        remove_snapshot_file(path)
+        raise Exception(f'Error occured while saving catalog snapshot {key}: {saved_snapshot}')
+    # The file before the previous one is no longer referenced by any published manifest.
+    if snapshot:
+        remove_snapshot_file(snapshot.previous_path)
+
+
+def publish_catalog_snapshot_manifest():
+    snapshots = CatalogSnapshotSerializer(db_get_catalog_snapshots().values(), many=True).data
+    publish_snapshot_file(CATALOG_SNAPSHOT_MANIFEST, [
+        json.dumps({'generated': now(), 'snapshots': snapshots}, cls=DjangoJSONEncoder).encode()
+    ])
+
+
+@app.task(name='PublishCatalogSnapshots')
+def publish_catalog_snapshots():
+    """
+    Regenerate the snapshots of the categories changed since they were last published, and the whole catalog
+    snapshot when any product changed, then republish the manifest listing them.
+    """
+    status, acquired = add_value(key=CATALOG_SNAPSHOT_LOCK_KEY, value=1, expire_on=CATALOG_SNAPSHOT_LOCK_TIMEOUT)
+    if not status or not acquired:
+        logger.info('Catalog snapshots are already being published')
+        return
+    try:
+        snapshots = db_get_catalog_snapshots()
+        changed = False
+        for category_id, (category_name, last_change) in db_get_category_snapshot_states().items():
+            snapshot = snapshots.get(str(category_id))
+            if snapshot and snapshot.source_updated and snapshot.source_updated >= last_change:
+                continue
+            publish_catalog_snapshot(str(category_id), snapshot, last_change, category_id, category_name)
+            changed = True
+
+        status, validators = db_get_queryset_validators(queryset=Product.objects.all())
+        if not status:
+            raise Exception(f'Error occured while reading catalog validators {validators}')
+        snapshot = snapshots.get(ALL_PRODUCTS_SNAPSHOT_KEY)
+        # Comparing counts catches deleted products, which leave no newer update behind.
+        if not snapshot or snapshot.source_updated != validators['last_modified'] \
+                or snapshot.product_count != validators['count']:
+            publish_catalog_snapshot(ALL_PRODUCTS_SNAPSHOT_KEY, snapshot, validators['last_modified'])
+            changed = True
+
+        for key, snapshot in snapshots.items():
+            if key != ALL_PRODUCTS_SNAPSHOT_KEY and snapshot.category_id is None:
+                remove_snapshot_file(snapshot.path)
+                remove_snapshot_file(snapshot.previous_path)
+                snapshot.delete()
+                changed = True
+
+        if changed:
+            publish_catalog_snapshot_manifest()
+    finally:
+        remove_keys(key_list=[CATALOG_SNAPSHOT_LOCK_KEY])
+
+
+def read_original_image(image) -> bytes:
+    try:
+        with image.image.storage.open(image.image.name, 'rb') as file:
+            return file.read()
+    except OSError:
+        return b''
+
+
+def store_image_derivatives(name: str, rendered: dict) -> dict:
+    """
+    Store the rendered derivatives of the original `name` next to it. Those of a content blob are named after its
+    digest, so files already stored for the same blob are reused instead of being written again.
+    """
+    directory = os.path.join(os.path.dirname(name), PRODUCT_IMAGE_DERIVATIVES_DIRECTORY)
+    stem = os.path.splitext(os.path.basename(name))[0]
+    is_blob = get_content_blob_digest(name) is not None
+
+    def store(path, content):
+        if is_blob and default_storage.exists(path):
+            return path
+        return default_storage.save(path, ContentFile(content))
+
+    return {
+        'thumbnail': store(f'{directory}/{stem}-thumbnail.jpg', rendered['thumbnail']),
+        'widths': [
+            [width, store(f'{directory}/{stem}-{width}w.webp', content)] for width, content in rendered['widths']
+        ],
+    }
+
+
+def delete_unused_image_derivatives(stale_derivatives: dict) -> None:
+    """
+    Delete the derivatives in {original name: derivatives} of the originals no ProductImages row uses any more.
+    Rows sharing a blob share its derivatives, so they are kept while one of them still points at it.
+    """
+    sources_in_use = db_get_product_image_sources_in_use(sources=list(stale_derivatives))
+    for source, derivatives in stale_derivatives.items():
+        if source not in sources_in_use:
+            for path in get_image_derivative_paths(derivatives):
+                default_storage.delete(path)
+
+
+def generate_image_derivatives(image_ids: list, map_function=map) -> int:
+    """
+    Generate and record the thumbnail and WebP derivatives of the given ProductImages rows.
+    Each original is rendered once, however many rows point at it, and derivatives another row already has for it
+    are reused. `map_function` runs render_image_derivatives over the originals, e.g. ProcessPoolExecutor.map to
+    spread the Pillow work over processes. Returns the number of images processed.
+    """
+    images = db_get_product_images_needing_derivatives(image_ids=image_ids)
+    if not images:
+        return 0
+
+    derivatives_by_source = db_get_product_image_derivatives_by_source(
+        sources=list({image.image.name for image in images})
+    )
+    pending = {}
+    for image in images:
+        if image.image.name not in derivatives_by_source:
+            pending.setdefault(image.image.name, image)
+    rendered_images = map_function(render_image_derivatives, (read_original_image(image) for image in pending.values()))
+    for (name, image), rendered in zip(pending.items(), rendered_images):
+        if rendered is None:
+            # Recorded as processed anyway so an unreadable upload is not retried on every run.
+            logger.warning(f'Could not render derivatives of product image {image.id}: {name}')
+            derivatives_by_source[name] = {}
+        else:
+            derivatives_by_source[name] = store_image_derivatives(name, rendered)
+
+    stale_derivatives = {}
+    for image in images:
+        if image.derivatives:
+            stale_derivatives[image.derivatives_source] = image.derivatives
+        image.derivatives, image.derivatives_source = derivatives_by_source[image.image.name], image.image.name
+
+    # The change is logged in the transaction that rebuilds the cards, as on the signal path, so the feed never
+    # sees it ahead of the card carrying the new derivatives.
+    product_ids = list({image.product_id for image in images})
+    with atomic():
+        status, response = db_save_product_image_derivatives(images=images)
+        if not status:
+            raise Exception(f'Error occured while saving product image derivatives {response}')
+        db_touch_products(product_ids=product_ids)
+        db_log_product_changes(product_ids=product_ids, action=ProductChange.Action.UPDATED)
+        refresh_product_cards(product_ids)
+        on_commit(lambda: bump_product_detail_versions(product_ids))
+    delete_unused_image_derivatives(stale_derivatives)
+    return len(images)
+
+
+def refresh_product_cards(product_ids: list) -> None:
+    # A failed rebuild would leave the cards stale until the next write, so it is handed to a retried task
+    status, response = db_refresh_product_cards(product_ids=product_ids)
+    if not status:
+        logger.warning(f'Could not refresh the cards of products {product_ids}, retrying: {response}')
+        # The list reads the products until the retry has rebuilt the cards
+        set_cached_product_cards_complete(False)
+        # Queued once the calling transaction commits, the task must read the rows it wrote
+        on_commit(lambda: retry_product_card_refresh.delay(product_ids))
+
+
+@app.task(name='RefreshProductCards', bind=True, max_retries=PRODUCT_CARD_REFRESH_MAX_RETRIES)
+def retry_product_card_refresh(self, product_ids: list):
+    status, response = db_refresh_product_cards(product_ids=product_ids)
+    if not status:
+        logger.warning(f'Could not refresh the cards of products {product_ids}: {response}')
+        raise self.retry(countdown=PRODUCT_CARD_REFRESH_RETRY_DELAY * 2 ** self.request.retries)
+    return len(response)
+
+
+@app.task(name='GenerateProductImageDerivatives')
+def generate_product_image_derivatives(image_ids: list):
+    # Celery's prefork pool already is the process pool here; its daemonic workers cannot start pools of their
+    # own. The generate_image_derivatives command uses a ProcessPoolExecutor for backfills.
+    return generate_image_derivatives(image_ids)
+
+
+def get_similarity_signature(document: dict) -> str:
+    return md5(json.dumps(document, sort_keys=True).encode()).hexdigest()
+
+
+def get_similarity_signatures() -> dict:
+    return {
+        product_id: get_similarity_signature(document)
+        for documents in db_iter_similarity_documents(chunk_size=SIMILAR_PRODUCTS_BLOCK_SIZE)
+        for product_id, document in documents.items()
+    }
+
+
+def build_similarity_vectors(file) -> tuple:
+    """
+    TF-IDF vectors of every product as (ids, vectors). The rows are written to `file` chunk by chunk and mapped
+    back from it, so the 4 KB per product matrix lives on disk and is paged in block by block.
+    """
+    ids, document_frequency = [], np.zeros(SIMILAR_PRODUCTS_DIMENSIONS, dtype=np.int64)
+    for documents in db_iter_similarity_documents(chunk_size=SIMILAR_PRODUCTS_BLOCK_SIZE):
+        term_frequencies = hash_term_frequencies(
+            [
+                [(document[field], weight) for field, weight in SIMILAR_PRODUCTS_FIELD_WEIGHTS.items()]
+                for document in documents.values()
+            ],
+            SIMILAR_PRODUCTS_DIMENSIONS
+        )
+        document_frequency += np.count_nonzero(term_frequencies, axis=0)
+        file.write(term_frequencies.tobytes())
+        ids.extend(documents)
+    file.flush()
+    if not ids:
+        return np.array(ids, dtype=np.int64), np.zeros((0, SIMILAR_PRODUCTS_DIMENSIONS), dtype=np.float32)
+    vectors = np.memmap(file.name, dtype=np.float32, mode='r+', shape=(len(ids), SIMILAR_PRODUCTS_DIMENSIONS))
+    apply_idf(vectors, document_frequency, len(ids), SIMILAR_PRODUCTS_BLOCK_SIZE)
+    # Ordered by id, which keeps ids sorted for the searchsorted lookups
+    return np.array(ids, dtype=np.int64), vectors
+
+
+def compute_similar_products(full: bool = False) -> int:
+    """
+    Recompute the stored neighbors of the products whose text changed since their last build, plus the products
+    such a change can reach: those listing a changed product, those a changed product now beats the weakest
+    neighbor of, and those that lost a deleted neighbor. `full` recomputes every product.
+    Returns the number of products recomputed.
+
+    Resident memory is the per product bookkeeping (id, signature and stored state, a few hundred bytes each)
+    plus block x block similarity matrices; the vectors stay in a temporary file.
+    """
+    signatures = get_similarity_signatures()
+    states = {} if full else db_get_similarity_states(k=SIMILAR_PRODUCTS_COUNT)
+    changed_ids = [
+        product_id for product_id, signature in signatures.items() if states.get(product_id, (None,))[0] != signature
+    ]
+    affected_ids = set(changed_ids) | {product_id for product_id, (_, _, short) in states.items() if short}
+    if not affected_ids:
+        return 0
+
+    with NamedTemporaryFile(suffix='.vectors') as file:
+        ids, vectors = build_similarity_vectors(file)
+        # Products created between the two reads are left to the next run
+        vector_ids = set(ids.tolist())
+        changed_rows = np.searchsorted(ids, [product_id for product_id in changed_ids if product_id in vector_ids])
+        if len(changed_rows) and states:
+            affected_ids.update(db_get_product_ids_by_neighbors(neighbor_ids=changed_ids))
+            best_scores = np.full(len(ids), -np.inf, dtype=np.float32)
+            for start in range(0, len(changed_rows), SIMILAR_PRODUCTS_BLOCK_SIZE):
+                target_vectors = vectors[changed_rows[start:start + SIMILAR_PRODUCTS_BLOCK_SIZE]]
+                np.maximum(
+                    best_scores, max_similarity(vectors, target_vectors, SIMILAR_PRODUCTS_BLOCK_SIZE), out=best_scores
+                )
+            affected_ids.update(
+                product_id for product_id, score in zip(ids.tolist(), best_scores.tolist())
+                if product_id in states and score >= max(states[product_id][1], SIMILAR_PRODUCTS_MIN_SCORE)
+            )
+
+        affected_ids = np.array(sorted(affected_ids.intersection(signatures, vector_ids)), dtype=np.int64)
+        for start in range(0, len(affected_ids), SIMILAR_PRODUCTS_SAVE_BATCH_SIZE):
+            batch_ids = affected_ids[start:start + SIMILAR_PRODUCTS_SAVE_BATCH_SIZE]
+            neighbor_ids, scores = top_k_neighbors(
+                vectors[np.searchsorted(ids, batch_ids)], batch_ids, vectors, ids, SIMILAR_PRODUCTS_COUNT,
+                SIMILAR_PRODUCTS_BLOCK_SIZE
+            )
+            neighbors = {
+                product_id: [
+                    (neighbor_id, round(score, 6))
+                    for neighbor_id, score in zip(row_neighbor_ids, row_scores)
+                    if score >= SIMILAR_PRODUCTS_MIN_SCORE
+                ]
+                for product_id, row_neighbor_ids, row_scores
+                in zip(batch_ids.tolist(), neighbor_ids.tolist(), scores.tolist())
+            }
+            status, response = db_save_similar_products(neighbors=neighbors, signatures=signatures)
+            if not status:
+                raise Exception(f'Error occured while saving similar products {response}')
+    return len(affected_ids)
+
+
+@app.task(name='BuildSimilarProducts')
+def build_similar_products(full: bool = False):
+    status, acquired = add_value(key=SIMILAR_PRODUCTS_LOCK_KEY, value=1, expire_on=SIMILAR_PRODUCTS_LOCK_TIMEOUT)
+    if not status or not acquired:
+        logger.info('Similar products are already being built')
+        return 0
+    try:
+        return compute_similar_products(full=full)
+    finally:
+        remove_keys(key_list=[SIMILAR_PRODUCTS_LOCK_KEY])
@@ -0,0 +1,1144 @@
+import gzip
+import hashlib
+import json
+import os
+import tempfile
+from datetime import timedelta
+from decimal import Decimal
+from io import BytesIO, StringIO
+from unittest.mock import Mock, patch
+from urllib.parse import parse_qs, urlparse
+
+from django.conf import settings
+from django.core.cache import cache
+from django.core.files.storage import default_storage
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.core.management import call_command
+from django.db import connection
+from django.db.transaction import atomic
+from django.test import SimpleTestCase, TestCase, TransactionTestCase
+from django.test.utils import CaptureQueriesContext, override_settings
+from django.urls import reverse
+from django.utils.timezone import now
+from elasticsearch import Elasticsearch
+from PIL import Image
+from rest_framework_simplejwt.tokens import AccessToken
+
+from accounts.models import AccountManager, Company, User
+from common.location.models import Country
+from common.models import ContentBlob
+from utils.storage import get_content_blob_name
+from .constants import PRODUCT_DETAIL_VERSION_KEY
+from .db_interactors import db_refresh_product_cards
+from .filtersets import ProductFilterSet
+from .models import (
+    Product, Manufacturer, SupplierProducts, ProductImages, ShippingAndOrdering, ProductRatings,
+    ProductReview, ProductVariant, Category, CatalogSnapshot, ProductConfig, ProductChange, ProductCard
+)
+from .quantities import parse_quantity
+from .tasks import (
+    publish_catalog_snapshots, compute_similar_products, refresh_product_cards, generate_image_derivatives
+)
+from .utils import (
+    render_image_derivatives, get_product_detail_version, get_product_detail_cache_stats
+)
+
+# Keeps cached payloads from leaking between runs, since database ids restart for every test database.
+LOCMEM_CACHES = {'default': {'BACKEND': 'django.core.cache.backends.locmem.LocMemCache'}}
+
+
+def create_products(count: int = None, names: list = None, **fields) -> list:
+    """
+    Products named `Product <index>`, or after `names`, with the required columns filled in and `fields` applied.
+    """
+    names = names or [f'Product {index}' for index in range(count)]
+    return [
+        Product.objects.create(
+            name=name, description='Description', bar_code=f'{index:08d}',
+            bar_code_type=Product.BarCodeType.EUROPEAN_ARTICLE_NUMBER, **fields
+        )
+        for index, name in enumerate(names)
+    ]
+
+
+def create_supplier() -> Company:
+    return Company.objects.create(
+        name='Acme Traders', tax_id='TAX-0001', annual_turnover=Company.AnnualTurnover.TILL_5M,
+        hq_location='Pune', company_type='Supplier', legal_address='1 Market Road, Pune',
+        country=Country.objects.create(name='India')
+    )
+
+
+def create_account_manager(company: Company, username: str = 'manager'):
+    user = User.objects.create_user(username=username, first_name='Asha', password='Secret-123')
+    AccountManager.objects.create(user=user, title='Owner', department='Sales', company=company)
+    return user
+
+
+def authenticate(client, user) -> None:
+    client.defaults['HTTP_AUTHORIZATION'] = f'Bearer {AccessToken.for_user(user)}'
+
+
+def walk_cursor_pages(client, url: str, params: dict = None) -> list:
+    """
+    Ids of every row of a keyset paginated list, following the next links from the first page.
+    """
+    ids, params = [], {'cursor': '', **(params or {})}
+    while True:
+        response = client.get(url, params)
+        assert response.status_code == 200, response.data
+        data = response.data['data']
+        ids.extend(row['id'] for row in data['results'])
+        if not data['next']:
+            return ids
+        params['cursor'] = parse_qs(urlparse(data['next']).query)['cursor'][0]
+
+
+def get_shared_millisecond_timestamps(count: int) -> list:
+    # Distinct and repeated microsecond timestamps, all inside one millisecond
+    base = now().replace(microsecond=123000)
+    return [base + timedelta(microseconds=index % 4 * 100) for index in range(count)]
+
+
+class ProductListQueryCountTest(TestCase):
+
+    @classmethod
+    def setUpTestData(cls):
+        company = create_supplier()
+        manufacturer = Manufacturer.objects.create(name='Acme Foods', brand_name='Acme', ingredients='Salt')
+        # The cards are built by the on-commit handlers; derivative generation is left out
+        with patch('catalog.signals.generate_product_image_derivatives'), cls.captureOnCommitCallbacks(execute=True):
+            for product in create_products(30, manufacturer=manufacturer):
+                SupplierProducts.objects.create(product=product, supplier=company)
+                ProductImages.objects.create(product=product, image=f'catalog/{product.id}/front.png')
+
+    def setUp(self):
+        # Caches that every product has a card, which is otherwise checked once before the first card read
+        cache.clear()
+        self.client.get(reverse('catalog:product-list'), {'page': 1})
+
+    def _get_list_query_count(self, page_size, params: dict = None):
+        with CaptureQueriesContext(connection) as context:
+            response = self.client.get(
+                reverse('catalog:product-list'), {'page': 1, 'page_size': page_size, **(params or {})}
+            )
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(len(response.data['data']['results']), page_size)
+        return len(context.captured_queries)
+
+    def test_list_query_count_does_not_depend_on_page_size(self):
+        self.assertEqual(self._get_list_query_count(page_size=5), self._get_list_query_count(page_size=25))
+
+    def test_list_resolves_page_in_fixed_number_of_queries(self):
+        # validators (max updated + count), page count, cards; nothing is joined
+        self.assertEqual(self._get_list_query_count(page_size=10), 3)
+
+    def test_product_rows_resolve_page_in_fixed_number_of_queries(self):
+        # An ordering the cards do not carry is served from the products through ProductListSerializer:
+        # validators, page count, products joined with manufacturer, suppliers, images
+        params = {'ordering': 'created'}
+        self.assertEqual(self._get_list_query_count(page_size=5, params=params), 5)
+        self.assertEqual(self._get_list_query_count(page_size=25, params=params), 5)
+
+    def test_list_reads_only_the_card_table(self):
+        with CaptureQueriesContext(connection) as context:
+            self.client.get(reverse('catalog:product-list'), {'page': 1, 'page_size': 10})
+        for query in context.captured_queries:
+            self.assertIn(f'FROM "{ProductCard._meta.db_table}"', query['sql'])
+            self.assertNotIn('JOIN', query['sql'])
+
+    def test_expanded_relations_are_read_from_the_products(self):
+        with CaptureQueriesContext(connection) as context:
+            response = self.client.get(
+                reverse('catalog:product-list'), {'page': 1, 'page_size': 1, 'expand': 'manufacturer'}
+            )
+        self.assertEqual(response.data['data']['results'][0]['manufacturer']['name'], 'Acme Foods')
+        self.assertIn(f'FROM "{Product._meta.db_table}"', context.captured_queries[-1]['sql'])
+
+    def test_list_reads_supplier_and_image_from_the_cards(self):
+        response = self.client.get(reverse('catalog:product-list'), {'page': 1, 'page_size': 1})
+        product = response.data['data']['results'][0]
+        self.assertEqual(product['manufacturer_name'], 'Acme Foods')
+        self.assertEqual(product['supplier_name'], 'Acme Traders')
+        self.assertEqual(product['supplier_address'], '1 Market Road, Pune')
+        self.assertEqual(product['image'], f'/media/catalog/{product["id"]}/front.png')
+
+    def test_sparse_fieldset_selects_only_requested_columns_and_relations(self):
+        with CaptureQueriesContext(connection) as context:
+            response = self.client.get(
+                reverse('catalog:product-list'), {'page': 1, 'page_size': 10, 'fields': 'id,name,manufacturer_name'}
+            )
+        self.assertEqual(set(response.data['data']['results'][0]), {'id', 'name', 'manufacturer_name'})
+        # validators, page count, cards
+        self.assertEqual(len(context.captured_queries), 3)
+        self.assertNotIn('"description"', context.captured_queries[-1]['sql'])
+
+    def test_list_answers_not_modified_for_matching_etag(self):
+        url = reverse('catalog:product-list')
+        etag = self.client.get(url, {'page': 1})['ETag']
+        with self.assertNumQueries(1):
+            response = self.client.get(url, {'page': 1}, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 304)
+
+
+@override_settings(CACHES=LOCMEM_CACHES)
+class ProductListCardFallbackTest(TestCase):
+
+    def setUp(self):
+        cache.clear()
+        with self.captureOnCommitCallbacks(execute=True):
+            self.products = create_products(3)
+
+    def _get_ids(self):
+        # Listed ids and whether they were read from the cards
+        with CaptureQueriesContext(connection) as context:
+            response = self.client.get(reverse('catalog:product-list'), {'page': 1})
+        self.assertEqual(response.status_code, 200)
+        reads_cards = any(f'FROM "{ProductCard._meta.db_table}"' in query['sql'] for query in context.captured_queries)
+        return sorted(product['id'] for product in response.data['data']['results']), reads_cards
+
+    def test_product_without_a_card_is_listed_from_the_products(self):
+        ids = sorted(product.id for product in self.products)
+        ProductCard.objects.filter(product=self.products[1]).delete()
+        self.assertEqual(self._get_ids(), (ids, False))
+        db_refresh_product_cards(product_ids=[self.products[1].id])
+        self.assertEqual(self._get_ids(), (ids, True))
+
+    def test_failed_refresh_moves_the_list_back_to_the_products(self):
+        self.assertTrue(self._get_ids()[1])
+        product = self.products[0]
+        with patch('catalog.tasks.db_refresh_product_cards', return_value=(False, 'deadlock detected')), \
+                patch('catalog.tasks.retry_product_card_refresh.delay'), self.assertLogs('catalog.tasks'), \
+                self.captureOnCommitCallbacks(execute=True):
+            ProductCard.objects.filter(product=product).delete()
+            refresh_product_cards([product.id])
+        ids, reads_cards = self._get_ids()
+        self.assertIn(product.id, ids)
+        self.assertFalse(reads_cards)
+
+
+class ProductCardRefreshTest(TestCase):
+
+    def test_failed_refresh_is_handed_to_a_retried_task(self):
+        with patch('catalog.tasks.db_refresh_product_cards', return_value=(False, 'deadlock detected')), \
+                patch('catalog.tasks.retry_product_card_refresh.delay') as delay, self.assertLogs('catalog.tasks'):
+            with self.captureOnCommitCallbacks() as callbacks:
+                refresh_product_cards([7, 9])
+            # Not queued before the rows it has to read are committed
+            delay.assert_not_called()
+            for callback in callbacks:
+                callback()
+        delay.assert_called_once_with([7, 9])
+
+
+@override_settings(CACHES=LOCMEM_CACHES)
+class ProductListConditionalGetTest(TestCase):
+
+    def setUp(self):
+        with self.captureOnCommitCallbacks(execute=True):
+            self.products = create_products(3)
+        self.category = Category.objects.create(name='Oils')
+
+    def _get_etag(self, params: dict):
+        response = self.client.get(reverse('catalog:product-list'), params)
+        self.assertEqual(response.status_code, 200)
+        return response['ETag']
+
+    def test_cursor_page_validators_skip_the_count(self):
+        with CaptureQueriesContext(connection) as context:
+            etag = self._get_etag({'cursor': '', 'page_size': 2})
+        self.assertFalse([query for query in context.captured_queries if 'COUNT(' in query['sql']])
+        response = self.client.get(
+            reverse('catalog:product-list'), {'cursor': '', 'page_size': 2}, HTTP_IF_NONE_MATCH=etag
+        )
+        self.assertEqual(response.status_code, 304)
+
+    def test_category_links_change_the_etag(self):
+        params = {'page': 1, 'category': str(self.category.id)}
+        etag = self._get_etag(params)
+        with self.captureOnCommitCallbacks(execute=True):
+            self.products[0].category.add(self.category)
+        self.assertNotEqual(self._get_etag(params), etag)
+
+    def test_stock_swaps_of_equal_count_change_the_etag(self):
+        configs = [
+            ProductConfig.objects.create(product=product, is_in_stock=index == 0)
+            for index, product in enumerate(self.products[:2])
+        ]
+        params = {'page': 1, 'in_stock': 'true'}
+        etag = self._get_etag(params)
+        with self.captureOnCommitCallbacks(execute=True):
+            for config in configs:
+                config.is_in_stock = not config.is_in_stock
+                config.save()
+        self.assertNotEqual(self._get_etag(params), etag)
+
+
+class ProductKeysetPaginationTest(TestCase):
+
+    @classmethod
+    def setUpTestData(cls):
+        with cls.captureOnCommitCallbacks(execute=True):
+            products = create_products(9)
+        for product, updated in zip(products, get_shared_millisecond_timestamps(9)):
+            Product.objects.filter(id=product.id).update(updated=updated)
+            ProductCard.objects.filter(product=product).update(updated=updated)
+
+    def test_cursor_keeps_rows_sharing_a_millisecond(self):
+        ids = walk_cursor_pages(self.client, reverse('catalog:product-list'), {'ordering': '-updated', 'page_size': 2})
+        self.assertEqual(ids, list(ProductCard.objects.order_by('-updated', '-pk').values_list('pk', flat=True)))
+
+    def test_product_rows_cursor_keeps_rows_sharing_a_millisecond(self):
+        params = {'ordering': '-updated', 'page_size': 2, 'expand': 'manufacturer'}
+        ids = walk_cursor_pages(self.client, reverse('catalog:product-list'), params)
+        self.assertEqual(ids, list(Product.objects.order_by('-updated', '-id').values_list('id', flat=True)))
+
+
+@override_settings(CACHES=LOCMEM_CACHES)
+class ProductAutocompleteTest(TestCase):
+
+    @classmethod
+    def setUpTestData(cls):
+        manufacturer = Manufacturer.objects.create(name='Acme Foods', brand_name='Acme', ingredients='Salt')
+        create_products(names=['Extra Virgin Olive Oil', 'Basmati Rice'], manufacturer=manufacturer)
+
+    def _get_suggestions(self, text: str, **params):
+        response = self.client.get(reverse('catalog:product-autocomplete'), {'q': text, **params})
+        self.assertEqual(response.status_code, 200)
+        return response.data['data']
+
+    def test_suggests_misspelled_product_and_brand_names(self):
+        products = self._get_suggestions('olve oil')['products']
+        self.assertEqual([product['name'] for product in products], ['Extra Virgin Olive Oil'])
+        brands = self._get_suggestions('ACME  fods')['brands']
+        self.assertEqual([(brand['name'], brand['brand_name']) for brand in brands], [('Acme Foods', 'Acme')])
+
+    def test_repeated_prefixes_are_answered_from_the_cache(self):
+        suggestions = self._get_suggestions('basmati', limit=5)
+        with self.assertNumQueries(0):
+            # Case and spacing are normalised before the cache lookup
+            self.assertEqual(self._get_suggestions(' Basmati ', limit=5), suggestions)
+
+    def test_short_text_returns_nothing_without_queries(self):
+        with self.assertNumQueries(0):
+            self.assertEqual(self._get_suggestions('o'), {'products': [], 'brands': []})
+
+
+class ProductSearchTest(TestCase):
+    es_response = {
+        'took': 3,
+        'timed_out': False,
+        '_shards': {'total': 1, 'successful': 1, 'skipped': 0, 'failed': 0},
+        'hits': {
+            'total': {'value': 1, 'relation': 'eq'},
+            'max_score': 7.5,
+            'hits': [{
+                '_index': 'products',
+                '_id': '7',
+                '_score': 7.5,
+                '_source': {
+                    'id': 7, 'name': 'Extra Virgin Olive Oil', 'grade': 'A', 'bar_code': '00000007',
+                    'manufacturer_name': 'Acme Foods', 'supplier_name': 'Acme Traders', 'image': '/media/catalog/7/a.png'
+                }
+            }]
+        }
+    }
+
+    def test_search_renders_hits_without_database_queries(self):
+        with patch.object(Elasticsearch, 'search', return_value=self.es_response) as es_search, \
+                self.assertNumQueries(0):
+            response = self.client.get(
+                reverse('catalog:product-search'), {'search': 'olive oil', 'grade': 'A,B', 'page_size': 5}
+            )
+
+        self.assertEqual(response.status_code, 200)
+        data = response.data['data']
+        self.assertEqual(data['count'], 1)
+        self.assertEqual(data['results'][0]['name'], 'Extra Virgin Olive Oil')
+        self.assertEqual(data['results'][0]['score'], 7.5)
+        body = es_search.call_args.kwargs['body']
+        self.assertEqual(body['size'], 5)
+        self.assertIn('{"terms": {"grade": ["A", "B"]}}', json.dumps(body['query']))
+
+
+@override_settings(CACHES=LOCMEM_CACHES)
+class ProductFullTextSearchTest(TestCase):
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.manufacturer = Manufacturer.objects.create(name='Acme Foods', brand_name='Sunfield', ingredients='Salt')
+        create_products(names=['Olive Oil', 'Olive Pickles'], manufacturer=cls.manufacturer)
+        create_products(names=['Basmati Rice'])
+        pickles = Product.objects.get(name='Olive Pickles')
+        pickles.description = 'Green olives in brine with olive oil'
+        pickles.save()
+
+    def _search(self, text: str) -> list:
+        with CaptureQueriesContext(connection) as context:
+            response = self.client.get(reverse('catalog:product-list'), {'search': text})
+        self.assertEqual(response.status_code, 200)
+        for query in context.captured_queries:
+            # Only the product vector is matched, nothing is ORed across the manufacturer join
+            self.assertNotIn('"catalog_manufacturer"."search_vector"', query['sql'])
+        return [product['name'] for product in response.data['data']]
+
+    def test_matches_are_ranked(self):
+        self.assertEqual(self._search('olive oil'), ['Olive Oil', 'Olive Pickles'])
+
+    def test_manufacturer_text_is_part_of_the_product_vector(self):
+        self.assertEqual(sorted(self._search('sunfield')), ['Olive Oil', 'Olive Pickles'])
+        self.manufacturer.brand_name = 'Meadow'
+        self.manufacturer.save()
+        self.assertEqual(self._search('sunfield'), [])
+        self.assertEqual(sorted(self._search('meadow')), ['Olive Oil', 'Olive Pickles'])
+
+
+class ParseQuantityTest(SimpleTestCase):
+
+    def test_parses_value_and_normalizes_unit(self):
+        self.assertEqual(parse_quantity('1,000 pcs'), (Decimal('1000'), 'pcs'))
+        self.assertEqual(parse_quantity('2.5 Kg'), (Decimal('2500'), 'g'))
+        self.assertEqual(parse_quantity('1,5 l'), (Decimal('1500'), 'ml'))
+        self.assertEqual(parse_quantity('500ml'), (Decimal('500'), 'ml'))
+
+    def test_returns_none_without_a_number(self):
+        self.assertEqual(parse_quantity('on request'), (None, None))
+        self.assertEqual(parse_quantity(None), (None, None))
+
+
+class ImageDerivativesTest(SimpleTestCase):
+
+    def _get_png(self, width, height):
+        buffer = BytesIO()
+        Image.new('RGB', (width, height), 'red').save(buffer, 'PNG')
+        return buffer.getvalue()
+
+    def test_renders_square_thumbnail_and_webp_widths(self):
+        derivatives = render_image_derivatives(self._get_png(1600, 800))
+        self.assertEqual(Image.open(BytesIO(derivatives['thumbnail'])).size, (160, 160))
+        self.assertEqual([width for width, _ in derivatives['widths']], [320, 640, 1024])
+        self.assertEqual(Image.open(BytesIO(derivatives['widths'][0][1])).format, 'WEBP')
+
+    def test_never_upscales_and_skips_unreadable_images(self):
+        self.assertEqual([width for width, _ in render_image_derivatives(self._get_png(500, 400))['widths']], [320, 500])
+        self.assertIsNone(render_image_derivatives(b'not an image'))
+
+
+class ProductQuantityFilterTest(TestCase):
+
+    @classmethod
+    def setUpTestData(cls):
+        with cls.captureOnCommitCallbacks(execute=True):
+            products = create_products(3)
+        for product, moq in zip(products, ['100 cartons', '1,000 cartons', 'on request']):
+            ShippingAndOrdering.objects.create(product=product, quantity_in_the_box='10', payment_terms='-', moq=moq)
+
+    def test_moq_range_is_filtered_on_the_parsed_column(self):
+        response = self.client.get(reverse('catalog:product-list'), {'moq_max': 500})
+        self.assertEqual([product['name'] for product in response.data['data']], ['Product 0'])
+        self.assertEqual(ShippingAndOrdering.objects.get(product__name='Product 2').moq_value, None)
+
+
+class ProductAdditionalDataFilterTest(TestCase):
+
+    @classmethod
+    def setUpTestData(cls):
+        with cls.captureOnCommitCallbacks(execute=True):
+            for product, additional_data in zip(create_products(3), [
+                {'origin': 'India', 'certifications': ['FSSAI', 'ISO 22000']},
+                {'origin': 'Italy', 'certifications': ['ISO 22000'], 'vegan': True},
+                {'certifications': []},
+            ]):
+                product.additional_data = additional_data
+                product.save()
+
+    def _get_names(self, params):
+        response = self.client.get(reverse('catalog:product-list'), params)
+        self.assertEqual(response.status_code, 200)
+        return sorted(product['name'] for product in response.data['data'])
+
+    def test_containment_and_key_existence(self):
+        self.assertEqual(
+            self._get_names({'data_contains': '{"certifications": ["ISO 22000"]}'}), ['Product 0', 'Product 1']
+        )
+        self.assertEqual(self._get_names({'data_has_keys': 'origin,vegan'}), ['Product 1'])
+        self.assertEqual(self._get_names({'data_has_any_keys': 'origin,vegan'}), ['Product 0', 'Product 1'])
+
+    def test_hot_key_filter(self):
+        self.assertEqual(self._get_names({'data_origin': 'Italy,Spain'}), ['Product 1'])
+
+    def test_filters_are_served_by_the_indexes(self):
+        with connection.cursor() as cursor:
+            # Three rows would always be scanned, the plan shows whether an index can answer the filter
+            cursor.execute('SET LOCAL enable_seqscan = off')
+        for params, index_names in [
+            # Both GIN indexes can answer containment
+            (
+                {'data_contains': '{"certifications": ["ISO 22000"]}'},
+                ['product_additional_data_idx', 'product_data_keys_idx']
+            ),
+            ({'data_has_keys': 'vegan,halal'}, ['product_data_keys_idx']),
+            ({'data_has_any_keys': 'origin,vegan'}, ['product_data_keys_idx']),
+            ({'data_origin': 'Italy'}, ['product_data_origin_idx']),
+        ]:
+            plan = ProductFilterSet(params, queryset=Product.objects.all()).qs.explain()
+            self.assertTrue(any(index_name in plan for index_name in index_names), plan)
+
+
+@override_settings(CACHES=LOCMEM_CACHES)
+class CategoryTreeFilterTest(TestCase):
+
+    def setUp(self):
+        self.food = Category.objects.create(name='Food')
+        self.oils = Category.objects.create(name='Oils', parent=self.food)
+        self.olive_oils = Category.objects.create(name='Olive Oils', parent=self.oils)
+        self.spices = Category.objects.create(name='Spices')
+        with self.captureOnCommitCallbacks(execute=True):
+            products = create_products(3)
+        for product, category in zip(products, [self.oils, self.olive_oils, self.spices]):
+            product.category.add(category)
+
+    def _get_names(self, category_ids):
+        response = self.client.get(reverse('catalog:product-list'), {'category': category_ids})
+        self.assertEqual(response.status_code, 200)
+        return sorted(product['name'] for product in response.data['data'])
+
+    def test_parent_category_includes_descendants(self):
+        self.assertEqual(self._get_names(f'{self.food.id}'), ['Product 0', 'Product 1'])
+        self.assertEqual(self._get_names(f'{self.olive_oils.id},{self.spices.id}'), ['Product 1', 'Product 2'])
+        self.assertEqual(self._get_names([self.olive_oils.id, self.spices.id]), ['Product 1', 'Product 2'])
+        self.assertEqual(self._get_names([f'{self.olive_oils.id},{self.spices.id}', self.oils.id]), [
+            'Product 0', 'Product 1', 'Product 2'
+        ])
+
+    def test_tree_edits_invalidate_cached_descendants(self):
+        self.assertEqual(self._get_names(f'{self.spices.id}'), ['Product 2'])
+        with self.captureOnCommitCallbacks(execute=True):
+            self.olive_oils.move_to(self.spices)
+        self.assertEqual(self._get_names(f'{self.spices.id}'), ['Product 1', 'Product 2'])
+        self.assertEqual(self._get_names(f'{self.food.id}'), ['Product 0'])
+
+
+@override_settings(CACHES=LOCMEM_CACHES)
+class SupplierStorefrontTest(TestCase):
+
+    def setUp(self):
+        self.company = create_supplier()
+        self.oils = Category.objects.create(name='Oils')
+        with self.captureOnCommitCallbacks(execute=True):
+            self.products = create_products(3)
+        for product in self.products[:2]:
+            SupplierProducts.objects.create(product=product, supplier=self.company)
+        self.products[0].category.add(self.oils)
+
+    def _get(self, path=''):
+        response = self.client.get(
+            reverse('catalog:supplier-product-list', kwargs={'supplier_id': self.company.id}) + path
+        )
+        self.assertEqual(response.status_code, 200)
+        return response.data['data']
+
+    def test_lists_only_the_supplier_products(self):
+        data = self._get()
+        self.assertEqual([product['name'] for product in data['results']], ['Product 1', 'Product 0'])
+        self.assertEqual(data['product_count'], 2)
+
+    def test_summary_is_cached_until_links_change(self):
+        self.assertEqual(self._get('/summary'), {
+            'product_count': 2, 'categories': [{'id': self.oils.id, 'name': 'Oils', 'parent': None, 'count': 1}]
+        })
+        with self.assertNumQueries(0):
+            self._get('/summary')
+        with self.captureOnCommitCallbacks(execute=True):
+            SupplierProducts.objects.create(product=self.products[2], supplier=self.company)
+        self.assertEqual(self._get('/summary')['product_count'], 3)
+
+    def test_cursor_keeps_cards_sharing_a_millisecond(self):
+        with self.captureOnCommitCallbacks(execute=True):
+            products = create_products(7)
+        for product, updated in zip(products, get_shared_millisecond_timestamps(7)):
+            SupplierProducts.objects.create(product=product, supplier=self.company)
+            ProductCard.objects.filter(product=product).update(updated=updated)
+        ids = walk_cursor_pages(
+            self.client, reverse('catalog:supplier-product-list', kwargs={'supplier_id': self.company.id}),
+            {'ordering': 'updated', 'page_size': 2}
+        )
+        self.assertEqual(ids, list(
+            ProductCard.objects.filter(product__supplierproducts__supplier=self.company).order_by(
+                'updated', 'pk'
+            ).values_list('product_id', flat=True)
+        ))
+
+
+@override_settings(CACHES=LOCMEM_CACHES)
+class ProductInStockFilterTest(TestCase):
+
+    @classmethod
+    def setUpTestData(cls):
+        with cls.captureOnCommitCallbacks(execute=True):
+            cls.products = create_products(3)
+        for index, product in enumerate(cls.products):
+            ProductConfig.objects.create(product=product, is_in_stock=index != 1)
+
+    def _get_names(self, params: dict = None):
+        response = self.client.get(reverse('catalog:product-list'), {'in_stock': 'true', **(params or {})})
+        self.assertEqual(response.status_code, 200)
+        data = response.data['data']
+        return sorted(product['name'] for product in (data['results'] if 'results' in data else data))
+
+    def _get_cursor_names(self):
+        ids = walk_cursor_pages(self.client, reverse('catalog:product-list'), {'in_stock': 'true', 'page_size': 1})
+        return sorted(Product.objects.get(id=product_id).name for product_id in ids)
+
+    def test_checks_cursor_page_candidates_against_the_availability_bitmap(self):
+        in_stock_ids = {product.id for product in self.products[:2]}
+        get_bitmap_bits = Mock(side_effect=lambda key, offsets: (True, [offset in in_stock_ids for offset in offsets]))
+        with patch('catalog.utils.get_bitmap_bits', get_bitmap_bits):
+            self.assertEqual(self._get_cursor_names(), ['Product 0', 'Product 1'])
+        # Only page sized batches of candidates are looked up
+        self.assertTrue(all(len(call.kwargs['offsets']) <= 4 for call in get_bitmap_bits.call_args_list))
+
+    def test_falls_back_to_the_database_without_a_bitmap(self):
+        # The locmem cache has no Redis connection behind it
+        self.assertEqual(self._get_cursor_names(), ['Product 0', 'Product 2'])
+        with patch('catalog.utils.get_bitmap_bits', return_value=(True, None)):
+            self.assertEqual(self._get_cursor_names(), ['Product 0', 'Product 2'])
+
+    def test_page_number_pagination_filters_in_the_database(self):
+        with patch('catalog.utils.get_bitmap_bits') as get_bitmap_bits:
+            self.assertEqual(self._get_names({'page': 1}), ['Product 0', 'Product 2'])
+        get_bitmap_bits.assert_not_called()
+
+
+@override_settings(CACHES=LOCMEM_CACHES)
+class ProductFacetCountsTest(TestCase):
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.oils = Category.objects.create(name='Oils')
+        cls.spices = Category.objects.create(name='Spices')
+        with cls.captureOnCommitCallbacks(execute=True):
+            products = create_products(3, grade='A')
+        products[0].category.add(cls.oils, cls.spices)
+        products[1].category.add(cls.oils)
+        # Mixed configs must count their product once, as in stock
+        for product, configs in zip(products, [(True, False), (False, False), ()]):
+            for is_in_stock in configs:
+                ProductConfig.objects.create(product=product, is_in_stock=is_in_stock)
+
+    def _get_counts(self, params: dict = None):
+        response = self.client.get(reverse('catalog:product-facets'), params or {})
+        self.assertEqual(response.status_code, 200)
+        return {
+            facet: {item['value']: item['count'] for item in values} for facet, values in response.data['data'].items()
+        }
+
+    def test_counts_every_product_once_per_bucket(self):
+        counts = self._get_counts()
+        self.assertEqual(counts['category'], {self.oils.id: 2, self.spices.id: 1, None: 1})
+        self.assertEqual(counts['grade'], {'A': 3})
+        self.assertEqual(counts['is_private_label_available'], {False: 3})
+        self.assertEqual(counts['is_in_stock'], {True: 1, False: 1, None: 1})
+
+    def test_counts_follow_the_filters(self):
+        counts = self._get_counts({'category': self.spices.id})
+        self.assertEqual(counts['category'], {self.oils.id: 1, self.spices.id: 1})
+        self.assertEqual(counts['is_in_stock'], {True: 1})
+
+
+class ProductRatingAggregatesTest(TestCase):
+
+    def setUp(self):
+        self.product, = create_products(names=['Olive Oil'])
+
+    def test_aggregates_follow_rating_writes(self):
+        ProductRatings.objects.create(product=self.product, buyer_name='A', rating=5)
+        rating = ProductRatings.objects.create(product=self.product, buyer_name='B', rating=2)
+        rating.rating = 4
+        rating.save()
+        self.product.refresh_from_db()
+        self.assertEqual((self.product.rating_count, self.product.rating_sum), (2, 9))
+        self.assertEqual(self.product.rating_average, Decimal('4.50'))
+        self.assertEqual((self.product.rating_2_count, self.product.rating_4_count), (0, 1))
+
+        rating.delete()
+        self.product.refresh_from_db()
+        self.assertEqual((self.product.rating_count, self.product.rating_average), (1, Decimal('5.00')))
+
+    def test_product_save_keeps_concurrent_aggregates(self):
+        stale_product = Product.objects.get(id=self.product.id)
+        ProductRatings.objects.create(product=self.product, buyer_name='A', rating=3)
+        stale_product.name = 'Extra Virgin Olive Oil'
+        stale_product.save()
+        self.product.refresh_from_db()
+        self.assertEqual((self.product.name, self.product.rating_count), ('Extra Virgin Olive Oil', 1))
+
+
+@override_settings(CACHES=LOCMEM_CACHES)
+class ProductReviewFeedTest(TestCase):
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.product, = create_products(names=['Olive Oil'])
+        reviews = ProductReview.objects.bulk_create([
+            ProductReview(product=cls.product, buyer_name=f'Buyer {index}', review='Good') for index in range(25)
+        ])
+        # bulk_create stamps every row with now(); spread them over one millisecond, some on the same microsecond,
+        # so the page boundaries fall inside it
+        for review, created in zip(reviews, get_shared_millisecond_timestamps(25)):
+            ProductReview.objects.filter(id=review.id).update(created=created)
+        Product.objects.filter(id=cls.product.id).update(review_count=25)
+
+    def test_cursor_walks_every_review_once_newest_first(self):
+        url = reverse('catalog:product-review-list', kwargs={'product_id': self.product.id})
+        self.assertEqual(self.client.get(url).data['data']['count'], 25)
+        self.assertEqual(
+            walk_cursor_pages(self.client, url, {'page_size': 10}),
+            list(ProductReview.objects.order_by('-created', '-id').values_list('id', flat=True))
+        )
+
+
+@override_settings(CACHES=LOCMEM_CACHES)
+class ProductBulkFetchTest(TestCase):
+
+    @classmethod
+    def setUpTestData(cls):
+        manufacturer = Manufacturer.objects.create(name='Acme Foods', brand_name='Acme', ingredients='Salt')
+        cls.products = create_products(12, manufacturer=manufacturer)
+
+    def _get_bulk(self, product_ids):
+        return self.client.get(reverse('catalog:product-bulk'), {'ids': ','.join(map(str, product_ids))})
+
+    def test_bulk_resolves_in_fixed_number_of_queries(self):
+        ids = [product.id for product in self.products]
+        # products joined with manufacturer, suppliers, images, shipping
+        with self.assertNumQueries(4):
+            self._get_bulk(ids[:2])
+        with self.assertNumQueries(4):
+            self._get_bulk(ids[2:])
+
+    def test_unknown_ids_leave_no_version_keys(self):
+        cache.clear()
+        self._get_bulk([self.products[0].id, 0])
+        self.client.get(reverse('catalog:product-detail', kwargs={'pk': 0}))
+        self.assertIsNotNone(cache.get(PRODUCT_DETAIL_VERSION_KEY.format(product_id=self.products[0].id)))
+        self.assertIsNone(cache.get(PRODUCT_DETAIL_VERSION_KEY.format(product_id=0)))
+
+    def test_bulk_reuses_cache_and_reports_missing_ids(self):
+        ids = [self.products[1].id, self.products[0].id]
+        self._get_bulk(ids[:1])
+        with self.assertNumQueries(4):
+            data = self._get_bulk([*ids, 0]).data['data']
+        self.assertEqual([product['id'] for product in data['results']], ids)
+        self.assertEqual(data['missing'], [0])
+        with self.assertNumQueries(0):
+            self._get_bulk(ids)
+
+
+@override_settings(CACHES=LOCMEM_CACHES)
+class ProductDetailCacheTest(TestCase):
+
+    def setUp(self):
+        # The locmem cache outlives a test, the hit and miss counters must start from zero
+        cache.clear()
+        manufacturer = Manufacturer.objects.create(name='Acme Foods', brand_name='Acme', ingredients='Salt')
+        with self.captureOnCommitCallbacks(execute=True):
+            self.product, = create_products(names=['Olive Oil'], manufacturer=manufacturer)
+        self.url = reverse('catalog:product-detail', kwargs={'pk': self.product.id})
+
+    def _get(self):
+        response = self.client.get(self.url)
+        self.assertEqual(response.status_code, 200, response.data)
+        return response.data['data']
+
+    def test_repeated_reads_are_served_from_the_cache(self):
+        self._get()
+        # Only the last modified lookup behind the conditional headers
+        with self.assertNumQueries(1):
+            self.assertEqual(self._get()['name'], 'Olive Oil')
+        self.assertEqual(get_product_detail_cache_stats(), {'hits': 1, 'misses': 1, 'hit_ratio': 0.5})
+
+    def test_product_writes_bump_the_version(self):
+        self._get()
+        version = get_product_detail_version(self.product.id)
+        with self.captureOnCommitCallbacks(execute=True):
+            self.product.name = 'Pomace Oil'
+            self.product.save()
+        self.assertGreater(get_product_detail_version(self.product.id), version)
+        self.assertEqual(self._get()['name'], 'Pomace Oil')
+
+    def test_child_row_writes_invalidate_the_payload(self):
+        self.assertIsNone(self._get()['shipping_data'])
+        version = get_product_detail_version(self.product.id)
+        with self.captureOnCommitCallbacks(execute=True):
+            ShippingAndOrdering.objects.create(
+                product=self.product, quantity_in_the_box='12', payment_terms='Net 30', moq='100 kg'
+            )
+        self.assertGreater(get_product_detail_version(self.product.id), version)
+        with CaptureQueriesContext(connection) as context:
+            self.assertEqual(self._get()['shipping_data']['moq'], '100 kg')
+        self.assertGreater(len(context.captured_queries), 1)
+        with self.assertNumQueries(1):
+            self._get()
+
+    def test_stats_command_reports_the_counters(self):
+        for _ in range(3):
+            self._get()
+        stdout = StringIO()
+        call_command('product_detail_cache_stats', stdout=stdout)
+        self.assertIn('hits: 2, misses: 1, hit ratio: 0.6667', stdout.getvalue())
+
+
+class ProductExportTest(TestCase):
+
+    @classmethod
+    def setUpTestData(cls):
+        manufacturer = Manufacturer.objects.create(name='Acme Foods', brand_name='Acme', ingredients='Salt')
+        for product in create_products(3, manufacturer=manufacturer):
+            ProductVariant.objects.create(product=product, net_weight_per_volume='500 g')
+
+    def test_ndjson_export_is_streamed_gzipped(self):
+        response = self.client.get(reverse('catalog:product-export'), HTTP_ACCEPT_ENCODING='gzip')
+        self.assertEqual(response['Content-Encoding'], 'gzip')
+        lines = gzip.decompress(b''.join(response.streaming_content)).decode().splitlines()
+        rows = [json.loads(line) for line in lines]
+        self.assertEqual([row['name'] for row in rows], ['Product 0', 'Product 1', 'Product 2'])
+        self.assertEqual(rows[0]['brand_name'], 'Acme')
+        self.assertEqual(rows[0]['variants'][0]['net_weight_per_volume'], '500 g')
+
+    def test_csv_export_has_header_and_one_line_per_product(self):
+        response = self.client.get(reverse('catalog:product-export'), {'file_format': 'csv'})
+        lines = b''.join(response.streaming_content).decode().splitlines()
+        self.assertEqual(lines[0].split(',')[:2], ['id', 'name'])
+        self.assertEqual(len(lines), 4)
+
+
+@override_settings(CACHES=LOCMEM_CACHES, MEDIA_ROOT=tempfile.mkdtemp())
+class CatalogSnapshotTest(TestCase):
+
+    def setUp(self):
+        self.oils, self.spices = Category.objects.create(name='Oils'), Category.objects.create(name='Spices')
+        with self.captureOnCommitCallbacks(execute=True):
+            self.product, = create_products(names=['Olive Oil'])
+        self.product.category.add(self.oils)
+
+    def _get_paths(self):
+        return dict(CatalogSnapshot.objects.values_list('key', 'path'))
+
+    def test_publishes_category_and_catalog_snapshots(self):
+        publish_catalog_snapshots()
+        snapshot = CatalogSnapshot.objects.get(key=str(self.oils.id))
+        with gzip.open(os.path.join(settings.MEDIA_ROOT, snapshot.path)) as file:
+            data = json.load(file)
+        self.assertEqual([product['name'] for product in data['results']], ['Olive Oil'])
+        self.assertEqual(data['version'], snapshot.version)
+        self.assertEqual(set(self._get_paths()), {str(self.oils.id), str(self.spices.id), 'all'})
+
+    def test_regenerates_only_touched_categories(self):
+        publish_catalog_snapshots()
+        paths = self._get_paths()
+        publish_catalog_snapshots()
+        self.assertEqual(self._get_paths(), paths)
+
+        self.product.category.add(self.spices)
+        publish_catalog_snapshots()
+        self.assertEqual(self._get_paths()[str(self.oils.id)], paths[str(self.oils.id)])
+        spices = CatalogSnapshot.objects.get(key=str(self.spices.id))
+        self.assertEqual((spices.previous_path, spices.product_count), (paths[str(self.spices.id)], 1))
+
+    def test_category_snapshot_holds_its_whole_subtree(self):
+        olive_oils = Category.objects.create(name='Olive Oils', parent=self.oils)
+        with self.captureOnCommitCallbacks(execute=True):
+            pomace, = create_products(names=['Pomace Oil'])
+        pomace.category.add(olive_oils, self.oils)
+        publish_catalog_snapshots()
+        self.assertEqual(CatalogSnapshot.objects.get(key=str(self.oils.id)).product_count, 2)
+        paths = self._get_paths()
+
+        # A change below the category is a change of its snapshot
+        with self.captureOnCommitCallbacks(execute=True):
+            create_products(names=['Extra Virgin Oil'])[0].category.add(olive_oils)
+        publish_catalog_snapshots()
+        oils = CatalogSnapshot.objects.get(key=str(self.oils.id))
+        self.assertEqual((oils.previous_path, oils.product_count), (paths[str(self.oils.id)], 3))
+        self.assertEqual(self._get_paths()[str(self.spices.id)], paths[str(self.spices.id)])
+
+
+@override_settings(MEDIA_ROOT=tempfile.mkdtemp())
+class ContentAddressedImagesTest(TestCase):
+
+    def setUp(self):
+        self.product, = create_products(names=['Olive Oil'])
+
+    def _upload(self, name, content):
+        return ProductImages.objects.create(product=self.product, image=SimpleUploadedFile(name, content))
+
+    def test_repeated_uploads_share_one_blob(self):
+        first, second = self._upload('front.png', b'same bytes'), self._upload('back.png', b'same bytes')
+        first.refresh_from_db()
+        second.refresh_from_db()
+        self.assertEqual(first.image.name, second.image.name)
+        self.assertEqual(first.blob_id, second.blob_id)
+        self.assertEqual(ContentBlob.objects.get().size, len(b'same bytes'))
+        self.assertNotEqual(self._upload('side.png', b'other bytes').image.name, first.image.name)
+
+    def test_rows_sharing_a_blob_share_their_derivatives(self):
+        buffer = BytesIO()
+        Image.new('RGB', (400, 300), 'red').save(buffer, 'PNG')
+        first, second = self._upload('front.png', buffer.getvalue()), self._upload('back.png', buffer.getvalue())
+        with patch('catalog.tasks.render_image_derivatives', wraps=render_image_derivatives) as render:
+            generate_image_derivatives([first.id, second.id])
+        render.assert_called_once()
+        first.refresh_from_db()
+        second.refresh_from_db()
+        self.assertEqual(first.derivatives, second.derivatives)
+
+        # A later upload of the same content reuses them without rendering
+        third = self._upload('side.png', buffer.getvalue())
+        with patch('catalog.tasks.render_image_derivatives') as render:
+            generate_image_derivatives([third.id])
+        render.assert_not_called()
+        third.refresh_from_db()
+        self.assertEqual(third.derivatives, first.derivatives)
+
+        # Deleting one row keeps the files the others still point at
+        with self.captureOnCommitCallbacks(execute=True):
+            first.delete()
+        self.assertTrue(default_storage.exists(second.derivatives['thumbnail']))
+
+    def test_dedup_command_collapses_existing_copies(self):
+        for index in range(2):
+            path = os.path.join(settings.MEDIA_ROOT, f'catalog/{index}/front.png')
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+            with open(path, 'wb') as file:
+                file.write(b'same bytes')
+            ProductImages.objects.create(product=self.product, image=f'catalog/{index}/front.png')
+
+        call_command('dedup_content_blobs', stdout=StringIO())
+        self.assertEqual(len(set(ProductImages.objects.values_list('image', 'blob'))), 1)
+        self.assertFalse(os.path.exists(os.path.join(settings.MEDIA_ROOT, 'catalog/0/front.png')))
+
+
+class SimilarProductsTest(TestCase):
+
+    def setUp(self):
+        with self.captureOnCommitCallbacks(execute=True):
+            products = create_products(names=['Extra Virgin Olive Oil', 'Pomace Olive Oil', 'Black Pepper Whole'])
+        self.products = {product.name: product for product in products}
+
+    def _get_similar_names(self, name):
+        response = self.client.get(reverse('catalog:product-similar', kwargs={'pk': self.products[name].id}))
+        self.assertEqual(response.status_code, 200)
+        return [product['name'] for product in response.data['data']['results']]
+
+    def test_serves_precomputed_neighbors(self):
+        self.assertEqual(compute_similar_products(), 3)
+        self.assertEqual(self._get_similar_names('Extra Virgin Olive Oil')[0], 'Pomace Olive Oil')
+
+    def test_rebuild_only_recomputes_changed_rows(self):
+        compute_similar_products()
+        self.assertEqual(compute_similar_products(), 0)
+        product = self.products['Black Pepper Whole']
+        product.name = 'Black Olive Oil'
+        product.save()
+        self.assertGreaterEqual(compute_similar_products(), 1)
+        self.assertIn('Extra Virgin Olive Oil', self._get_similar_names('Black Pepper Whole'))
+        self.assertEqual(compute_similar_products(full=True), 3)
+
+
+class ProductChangesFeedTest(TransactionTestCase):
+    # The feed only replays transactions older than every one in progress, the test case transaction included,
+    # so the writes here have to commit.
+
+    def _create_product(self, index):
+        return create_products(names=[f'Product {index}'])[0]
+
+    def _get_changes(self, **params):
+        response = self.client.get(reverse('catalog:product-changes'), params)
+        self.assertEqual(response.status_code, 200)
+        return response.data['data']
+
+    def test_replays_changes_after_the_token(self):
+        kept, removed = self._create_product(0), self._create_product(1)
+        token = self._get_changes()['next']
+        added = self._create_product(2)
+        kept.name = 'Renamed'
+        kept.save()
+        removed.delete()
+
+        changes = self._get_changes(since=token)
+        self.assertEqual([card['id'] for card in changes['created']], [added.id])
+        self.assertEqual([card['name'] for card in changes['updated']], ['Renamed'])
+        self.assertEqual(changes['deleted'], [removed.id])
+        self.assertFalse(changes['has_more'])
+        self.assertEqual(self._get_changes(since=changes['next'])['created'], [])
+
+    def test_pages_through_the_log(self):
+        products = [self._create_product(index) for index in range(3)]
+        seen, token, has_more = [], '0.0', True
+        while has_more:
+            changes = self._get_changes(since=token, limit=2, fields='name')
+            seen += [card['id'] for card in changes['created']]
+            token, has_more = changes['next'], changes['has_more']
+        self.assertEqual(seen, [product.id for product in products])
+
+    def test_rolled_back_writes_leave_no_changes(self):
+        with self.assertRaises(RuntimeError), atomic():
+            self._create_product(0)
+            raise RuntimeError
+        self.assertFalse(ProductChange.objects.exists())
+
+    def test_token_stops_before_a_change_whose_card_is_pending(self):
+        first, pending, last = [self._create_product(index) for index in range(3)]
+        ProductCard.objects.filter(product=pending).delete()
+        changes = self._get_changes(since='0.0')
+        self.assertEqual([card['id'] for card in changes['created']], [first.id])
+        self.assertFalse(changes['has_more'])
+
+        db_refresh_product_cards(product_ids=[pending.id])
+        changes = self._get_changes(since=changes['next'])
+        self.assertEqual([card['id'] for card in changes['created']], [pending.id, last.id])
+
+    def test_token_stops_before_a_change_the_card_does_not_reflect_yet(self):
+        stale, fresh = self._create_product(0), self._create_product(1)
+        token = self._get_changes()['next']
+        # As when the on-commit rebuild failed and waits for the retried task
+        with patch('catalog.signals.refresh_product_cards'):
+            stale.name = 'Renamed'
+            stale.save()
+        fresh.name = 'Renamed'
+        fresh.save()
+        changes = self._get_changes(since=token)
+        self.assertEqual(changes['updated'], [])
+        self.assertEqual(changes['next'], token)
+        self.assertFalse(changes['has_more'])
+
+        db_refresh_product_cards(product_ids=[stale.id])
+        changes = self._get_changes(since=token)
+        self.assertEqual([(card['id'], card['name']) for card in changes['updated']], [
+            (stale.id, 'Renamed'), (fresh.id, 'Renamed')
+        ])
+
+    def test_skips_products_deleted_since(self):
+        removed, kept = self._create_product(0), self._create_product(1)
+        token = self._get_changes()['next']
+        removed.name = 'Renamed'
+        removed.save()
+        kept.name = 'Renamed'
+        kept.save()
+        # Its card goes with it, while the log still holds the update ahead of the tombstone
+        Product.objects.filter(id=removed.id).delete()
+        changes = self._get_changes(since=token, limit=2)
+        self.assertEqual([card['id'] for card in changes['updated']], [kept.id])
+        self.assertEqual(self._get_changes(since=changes['next'])['deleted'], [removed.id])
+
+    def test_compaction_keeps_the_latest_change(self):
+        product = self._create_product(0)
+        for name in ('First', 'Second'):
+            product.name = name
+            product.save()
+        call_command('compact_product_changes', stdout=StringIO())
+        self.assertEqual(
+            list(ProductChange.objects.filter(product_id=product.id).values_list('action', flat=True)),
+            [ProductChange.Action.UPDATED]
+        )
+        self.assertEqual([card['name'] for card in self._get_changes(since='0.0')['updated']], ['Second'])
+
+    def test_rejects_invalid_tokens(self):
+        for token in ['abc', '12', '-1.0']:
+            response = self.client.get(reverse('catalog:product-changes'), {'since': token})
+            self.assertEqual(response.status_code, 400)
+
+
+@override_settings(MEDIA_ROOT=tempfile.mkdtemp())
+class ProductListingWriteTest(TestCase):
+
+    def setUp(self):
+        self.category = Category.objects.create(name='Oils')
+        self.manager = create_account_manager(create_supplier())
+        authenticate(self.client, self.manager)
+
+    def _get_png(self, color):
+        buffer = BytesIO()
+        Image.new('RGB', (8, 8), color).save(buffer, 'PNG')
+        return SimpleUploadedFile(f'{color}.png', buffer.getvalue(), content_type='image/png')
+
+    def _get_listing_data(self, variant_count, colors):
+        return {
+            'name': 'Olive Oil', 'description': 'Description', 'bar_code': '00000001',
+            'bar_code_type': Product.BarCodeType.EUROPEAN_ARTICLE_NUMBER, 'is_in_stock': 'true',
+            'variants': json.dumps([{'net_weight_per_volume': f'{index + 1} l'} for index in range(variant_count)]),
+            'shipping': json.dumps([{'quantity_in_the_box': '12', 'payment_terms': 'Net 30', 'moq': '100 kg'}]),
+            'category': json.dumps([self.category.id]),
+            'images': [self._get_png(color) for color in colors],
+        }
+
+    def _get_blob_path(self, color):
+        content = self._get_png(color).read()
+        return os.path.join(settings.MEDIA_ROOT, get_content_blob_name(hashlib.sha256(content).hexdigest(), '.png'))
+
+    def _create(self, variant_count, colors):
+        with CaptureQueriesContext(connection) as context:
+            response = self.client.post(reverse('catalog:product-list'), self._get_listing_data(variant_count, colors))
+        self.assertEqual(response.status_code, 200, response.data)
+        inserts = sum(query['sql'].startswith('INSERT') for query in context.captured_queries)
+        return Product.objects.get(id=response.data['data']['id']), inserts
+
+    def test_creates_the_whole_listing_with_a_fixed_number_of_inserts(self):
+        _, small_inserts = self._create(1, ['red'])
+        product, inserts = self._create(5, ['green', 'blue', 'white'])
+        self.assertEqual(inserts, small_inserts)
+        self.assertEqual(ProductVariant.objects.filter(product=product).count(), 5)
+        self.assertEqual(ShippingAndOrdering.objects.get(product=product).moq_value, Decimal('100000'))
+        self.assertEqual(ProductImages.objects.filter(product=product, blob__isnull=False).count(), 3)
+        self.assertTrue(ProductConfig.objects.get(product=product).is_in_stock)
+        self.assertEqual(list(product.category.all()), [self.category])
+
+    def test_update_replaces_only_the_nested_rows_sent(self):
+        product, _ = self._create(3, ['red'])
+        response = self.client.patch(
+            reverse('catalog:product-detail', kwargs={'pk': product.id}),
+            data=json.dumps({'name': 'Pomace Oil', 'variants': [{'net_weight_per_volume': '5 l'}]}),
+            content_type='application/json'
+        )
+        self.assertEqual(response.status_code, 200, response.data)
+        product.refresh_from_db()
+        self.assertEqual(product.name, 'Pomace Oil')
+        self.assertEqual(
+            list(ProductVariant.objects.filter(product=product).values_list('net_weight_per_volume', flat=True)),
+            ['5 l']
+        )
+        self.assertEqual(ProductImages.objects.filter(product=product).count(), 1)
+
+    def test_failed_listing_removes_the_blobs_it_stored(self):
+        self._create(1, ['red'])
+        with patch.object(ProductConfig.objects, 'create', side_effect=Exception('Config write failed')):
+            response = self.client.post(reverse('catalog:product-list'), self._get_listing_data(1, ['red', 'orange']))
+        self.assertNotEqual(response.status_code, 200)
+        self.assertEqual(Product.objects.count(), 1)
+        # The blob recorded by the first listing stays, the one only the failed listing stored is gone
+        self.assertTrue(os.path.exists(self._get_blob_path('red')))
+        self.assertFalse(os.path.exists(self._get_blob_path('orange')))
+
+    def test_writes_require_a_manager_of_a_supplier(self):
+        product, _ = self._create(1, [])
+        self.assertTrue(SupplierProducts.objects.filter(product=product, supplier__accountmanager__user=self.manager))
+        url = reverse('catalog:product-detail', kwargs={'pk': product.id})
+        patch_data = {'data': json.dumps({'name': 'Pomace Oil'}), 'content_type': 'application/json'}
+
+        self.client.defaults.pop('HTTP_AUTHORIZATION')
+        response = self.client.post(reverse('catalog:product-list'), self._get_listing_data(1, []))
+        self.assertEqual(response.status_code, 401)
+        self.assertEqual(self.client.patch(url, **patch_data).status_code, 401)
+        authenticate(self.client, create_account_manager(Company.objects.create(
+            name='Other Traders', tax_id='TAX-0002', annual_turnover=Company.AnnualTurnover.TILL_5M,
+            hq_location='Pune', company_type='Supplier', legal_address='2 Market Road, Pune',
+            country=Country.objects.get()
+        ), username='other'))
+        self.assertEqual(self.client.patch(url, **patch_data).status_code, 403)
+        self.assertEqual(self.client.delete(url).status_code, 403)
+        self.assertEqual(Product.objects.count(), 1)
+
+        authenticate(self.client, self.manager)
+        self.assertEqual(self.client.delete(url).status_code, 200)
+        self.assertFalse(Product.objects.exists())
@@ -1,9 +1,11 @@
 from rest_framework.routers import SimpleRouter
 
-from catalog.views import ProductViewSet
+from catalog.views import ProductViewSet, ProductReviewViewSet, SupplierStorefrontViewSet
 
 router = SimpleRouter(trailing_slash=False)
 router.register(r'product', ProductViewSet, basename='product')
+router.register(r'product/(?P<product_id>\d+)/review', ProductReviewViewSet, basename='product-review')
+router.register(r'supplier/(?P<supplier_id>\d+)/product', SupplierStorefrontViewSet, basename='supplier-product')
 
 app_name = 'catalog'
 
@@ -0,0 +1,396 @@
+import csv
+import gzip
+import io
+import json
+import os
+import tempfile
+import time
+
+from PIL import Image, ImageOps, UnidentifiedImageError
+from django.conf import settings
+from django.core.serializers.json import DjangoJSONEncoder
+
+from utils.helpers import create_directory_if_not_exists
+from utils.cache_interface import (
+    get_value, set_value, remove_keys, add_value, increment_value, get_many_values, set_many_values, get_bitmap_bits,
+    set_existing_bitmap_bits, replace_bitmap
+)
+from .constants import (
+    PRODUCT_DETAIL_VERSION_KEY,
+    PRODUCT_MEMBERSHIP_VERSION_KEY,
+    PRODUCT_CARDS_COMPLETE_KEY,
+    PRODUCT_CARDS_COMPLETE_TIMEOUT,
+    PRODUCT_DETAIL_CACHE_KEY,
+    PRODUCT_DETAIL_CACHE_HITS_KEY,
+    PRODUCT_DETAIL_CACHE_MISSES_KEY,
+    PRODUCT_DETAIL_CACHE_TIMEOUT,
+    PRODUCT_REVIEWS_VERSION_KEY,
+    PRODUCT_REVIEWS_CACHE_KEY,
+    PRODUCT_REVIEWS_CACHE_TIMEOUT,
+    SPARSE_FIELDS_QUERY_PARAM,
+    SPARSE_EXPAND_QUERY_PARAM,
+    PRODUCT_EXPORT_COLUMNS,
+    CATALOG_SNAPSHOT_DIRECTORY,
+    PRODUCT_IMAGE_THUMBNAIL_SIZE,
+    PRODUCT_IMAGE_THUMBNAIL_QUALITY,
+    PRODUCT_IMAGE_WIDTHS,
+    PRODUCT_IMAGE_WEBP_QUALITY,
+    CATEGORY_TREE_VERSION_KEY,
+    CATEGORY_DESCENDANTS_CACHE_KEY,
+    CATEGORY_DESCENDANTS_CACHE_TIMEOUT,
+    SUPPLIER_STOREFRONT_VERSION_KEY,
+    SUPPLIER_STOREFRONT_SUMMARY_CACHE_KEY,
+    SUPPLIER_STOREFRONT_SUMMARY_CACHE_TIMEOUT,
+    PRODUCT_STOCK_BITMAP_KEY
+)
+
+
+def get_cache_version(key: str) -> int:
+    # A missing (never set or evicted) version starts from the current time in milliseconds, so it can never
+    # collide with a version whose payload is still cached.
+    _, version = get_value(key=key)
+    if version is None:
+        add_value(key=key, value=int(time.time() * 1000))
+        _, version = get_value(key=key)
+    return version
+
+
+def bump_cache_version(key: str) -> None:
+    get_cache_version(key)
+    increment_value(key=key)
+
+
+def get_product_detail_version(product_id: int) -> int:
+    return get_cache_version(PRODUCT_DETAIL_VERSION_KEY.format(product_id=product_id))
+
+
+def bump_product_detail_versions(product_ids: list) -> None:
+    for product_id in set(product_ids):
+        bump_cache_version(PRODUCT_DETAIL_VERSION_KEY.format(product_id=product_id))
+
+
+def get_product_membership_version() -> int:
+    return get_cache_version(PRODUCT_MEMBERSHIP_VERSION_KEY)
+
+
+def bump_product_membership_version() -> None:
+    bump_cache_version(PRODUCT_MEMBERSHIP_VERSION_KEY)
+
+
+def get_cached_product_cards_complete() -> bool:
+    _, complete = get_value(key=PRODUCT_CARDS_COMPLETE_KEY)
+    return bool(complete)
+
+
+def set_cached_product_cards_complete(complete: bool) -> None:
+    # Only completeness is cached, a product without a card is looked for again on the next request
+    if complete:
+        set_value(key=PRODUCT_CARDS_COMPLETE_KEY, value=True, expire_on=PRODUCT_CARDS_COMPLETE_TIMEOUT)
+    else:
+        remove_keys(key_list=[PRODUCT_CARDS_COMPLETE_KEY])
+
+
+def get_cached_product_detail(product_id: int) -> tuple:
+    """
+    Returns the current detail version of the product and its cached payload, or None on a miss.
+    """
+    version = get_product_detail_version(product_id)
+    _, data = get_value(key=PRODUCT_DETAIL_CACHE_KEY.format(product_id=product_id, version=version))
+    increment_value(key=PRODUCT_DETAIL_CACHE_HITS_KEY if data is not None else PRODUCT_DETAIL_CACHE_MISSES_KEY)
+    return version, data
+
+
+def set_cached_product_detail(product_id: int, version: int, data: dict) -> None:
+    set_value(
+        key=PRODUCT_DETAIL_CACHE_KEY.format(product_id=product_id, version=version),
+        value=data,
+        expire_on=PRODUCT_DETAIL_CACHE_TIMEOUT
+    )
+
+
+def get_cached_product_details(product_ids: list) -> tuple:
+    """
+    Bulk variant of get_cached_product_detail: returns {product_id: version} and {product_id: payload} for the
+    products whose payload is cached, reading all keys with two round trips. Missing versions are not created
+    here, so unknown ids leave no keys behind; set_cached_product_details creates them for fetched products.
+    """
+    version_keys = {product_id: PRODUCT_DETAIL_VERSION_KEY.format(product_id=product_id) for product_id in product_ids}
+    _, found_versions = get_many_values(key_list=list(version_keys.values()))
+    found_versions = found_versions if isinstance(found_versions, dict) else {}
+    versions = {product_id: found_versions[key] for product_id, key in version_keys.items() if key in found_versions}
+    data_keys = {
+        product_id: PRODUCT_DETAIL_CACHE_KEY.format(product_id=product_id, version=version)
+        for product_id, version in versions.items()
+    }
+    _, found_data = get_many_values(key_list=list(data_keys.values())) if data_keys else (True, {})
+    found_data = found_data if isinstance(found_data, dict) else {}
+    data = {product_id: found_data[key] for product_id, key in data_keys.items() if key in found_data}
+    if data:
+        increment_value(key=PRODUCT_DETAIL_CACHE_HITS_KEY, delta=len(data))
+    if len(data) < len(product_ids):
+        increment_value(key=PRODUCT_DETAIL_CACHE_MISSES_KEY, delta=len(product_ids) - len(data))
+    return versions, data
+
+
+def set_cached_product_details(versions: dict, data: dict) -> None:
+    """
+    Caches the fetched payloads under the versions read before the fetch. A product that had no version gets one
+    now; when a concurrent write created it first the payload may predate that write and is not cached.
+    """
+    versions = dict(versions)
+    for product_id in data.keys() - versions.keys():
+        version = int(time.time() * 1000)
+        _, added = add_value(key=PRODUCT_DETAIL_VERSION_KEY.format(product_id=product_id), value=version)
+        if added is True:
+            versions[product_id] = version
+    set_many_values(
+        data={
+            PRODUCT_DETAIL_CACHE_KEY.format(product_id=product_id, version=versions[product_id]): payload
+            for product_id, payload in data.items() if product_id in versions
+        },
+        expire_on=PRODUCT_DETAIL_CACHE_TIMEOUT
+    )
+
+
+def get_product_detail_cache_stats() -> dict:
+    _, hits = get_value(key=PRODUCT_DETAIL_CACHE_HITS_KEY)
+    _, misses = get_value(key=PRODUCT_DETAIL_CACHE_MISSES_KEY)
+    hits, misses = hits or 0, misses or 0
+    return {
+        'hits': hits,
+        'misses': misses,
+        'hit_ratio': round(hits / (hits + misses), 4) if hits + misses else None
+    }
+
+
+def get_cached_product_reviews(product_id: int, page_size: int) -> tuple:
+    """
+    Returns the cache key of the newest review page of the product and its cached payload, or None on a miss.
+    """
+    version = get_cache_version(PRODUCT_REVIEWS_VERSION_KEY.format(product_id=product_id))
+    cache_key = PRODUCT_REVIEWS_CACHE_KEY.format(product_id=product_id, page_size=page_size, version=version)
+    _, data = get_value(key=cache_key)
+    return cache_key, data
+
+
+def set_cached_product_reviews(cache_key: str, data: dict) -> None:
+    set_value(key=cache_key, value=data, expire_on=PRODUCT_REVIEWS_CACHE_TIMEOUT)
+
+
+def bump_product_reviews_version(product_id: int) -> None:
+    bump_cache_version(PRODUCT_REVIEWS_VERSION_KEY.format(product_id=product_id))
+
+
+def get_cached_category_descendant_ids(category_ids: list) -> tuple:
+    """
+    Returns the current category tree version and {category_id: descendant ids, itself included} for the
+    categories whose descendant set is cached. Any tree edit bumps the version, dropping every cached set at once.
+    """
+    version = get_cache_version(CATEGORY_TREE_VERSION_KEY)
+    keys = {
+        category_id: CATEGORY_DESCENDANTS_CACHE_KEY.format(category_id=category_id, version=version)
+        for category_id in category_ids
+    }
+    _, found = get_many_values(key_list=list(keys.values()))
+    found = found if isinstance(found, dict) else {}
+    return version, {category_id: found[key] for category_id, key in keys.items() if key in found}
+
+
+def set_cached_category_descendant_ids(version: int, descendant_ids: dict) -> None:
+    set_many_values(
+        data={
+            CATEGORY_DESCENDANTS_CACHE_KEY.format(category_id=category_id, version=version): ids
+            for category_id, ids in descendant_ids.items()
+        },
+        expire_on=CATEGORY_DESCENDANTS_CACHE_TIMEOUT
+    )
+
+
+def bump_category_tree_version() -> None:
+    bump_cache_version(CATEGORY_TREE_VERSION_KEY)
+
+
+def get_cached_supplier_storefront_summary(supplier_id: int) -> tuple:
+    """
+    Returns the cache key of the supplier's product count and category breakdown and its cached payload, or None
+    on a miss. The key follows the supplier's link changes and the category tree, whose names it shows.
+    """
+    cache_key = SUPPLIER_STOREFRONT_SUMMARY_CACHE_KEY.format(
+        supplier_id=supplier_id,
+        version=get_cache_version(SUPPLIER_STOREFRONT_VERSION_KEY.format(supplier_id=supplier_id)),
+        tree_version=get_cache_version(CATEGORY_TREE_VERSION_KEY)
+    )
+    _, data = get_value(key=cache_key)
+    return cache_key, data
+
+
+def set_cached_supplier_storefront_summary(cache_key: str, data: dict) -> None:
+    set_value(key=cache_key, value=data, expire_on=SUPPLIER_STOREFRONT_SUMMARY_CACHE_TIMEOUT)
+
+
+def bump_supplier_storefront_versions(supplier_ids: list) -> None:
+    for supplier_id in supplier_ids:
+        bump_cache_version(SUPPLIER_STOREFRONT_VERSION_KEY.format(supplier_id=supplier_id))
+
+
+def get_product_stock_bits(product_ids: list):
+    """
+    In stock flags of the given products read from the Redis availability bitmap in one round trip, or None when
+    the bitmap is not available (Redis down, or not built yet after a cold start) and callers have to ask the
+    database.
+    """
+    status, bits = get_bitmap_bits(key=PRODUCT_STOCK_BITMAP_KEY, offsets=product_ids)
+    return bits if status else None
+
+
+def set_product_stock_bits(availability: dict) -> None:
+    # availability is {product_id: in stock}; a missing bitmap is left for rebuild_product_stock_bitmap
+    if availability:
+        set_existing_bitmap_bits(key=PRODUCT_STOCK_BITMAP_KEY, bits=availability)
+
+
+def rebuild_product_stock_bitmap(product_ids) -> tuple:
+    return replace_bitmap(key=PRODUCT_STOCK_BITMAP_KEY, offsets=product_ids)
+
+
+def get_product_change_token(position: tuple) -> str:
+    # Opaque to clients: the (transaction_id, id) position of the last change they received
+    return '{}.{}'.format(*position)
+
+
+def parse_product_change_token(token: str):
+    try:
+        position = tuple(int(part) for part in token.split('.'))
+    except ValueError:
+        return None
+    if len(position) != 2 or min(position) < 0:
+        return None
+    return position
+
+
+def get_sparse_fieldset(request) -> tuple:
+    """
+    The (fields, expand) lists requested with `?fields=a,b` and `?expand=c`, each None when not given.
+    """
+    def get_names(param):
+        names = [name.strip() for name in request.GET.get(param, '').split(',') if name.strip()]
+        return names or None
+
+    return get_names(SPARSE_FIELDS_QUERY_PARAM), get_names(SPARSE_EXPAND_QUERY_PARAM)
+
+
+def trim_to_fieldset(data: dict, fields: list = None) -> dict:
+    # Sparse fieldsets for payloads that are cached whole, e.g. product details.
+    if not fields:
+        return data
+    return {name: value for name, value in data.items() if name in fields}
+
+
+def render_ndjson_batches(batches):
+    # One JSON document per product, one string per batch.
+    for rows in batches:
+        yield ''.join(json.dumps(row, cls=DjangoJSONEncoder) + '\n' for row in rows)
+
+
+def render_csv_batches(batches):
+    # One CSV line per product; the nested variants and shipping columns hold JSON.
+    buffer = io.StringIO()
+    writer = csv.writer(buffer)
+    writer.writerow(PRODUCT_EXPORT_COLUMNS)
+    yield buffer.getvalue()
+    buffer.seek(0)
+    buffer.truncate()
+    for rows in batches:
+        for row in rows:
+            writer.writerow([
+                json.dumps(row[column], cls=DjangoJSONEncoder) if column in ('variants', 'shipping') else row[column]
+                for column in PRODUCT_EXPORT_COLUMNS
+            ])
+        yield buffer.getvalue()
+        buffer.seek(0)
+        buffer.truncate()
+
+
+def publish_snapshot_file(name: str, content) -> str:
+    """
+    Write the byte chunks of content to CATALOG_SNAPSHOT_DIRECTORY/<name> under MEDIA_ROOT. The file is written
+    and synced under a temporary name in the same directory and then renamed, so readers only ever see
+    complete files. Returns the path relative to MEDIA_ROOT.
+    """
+    directory = os.path.join(settings.MEDIA_ROOT, CATALOG_SNAPSHOT_DIRECTORY)
+    create_directory_if_not_exists(directory)
+    descriptor, temp_path = tempfile.mkstemp(dir=directory, prefix='.', suffix='.tmp')
+    try:
+        with os.fdopen(descriptor, 'wb') as file:
+            for chunk in content:
+                file.write(chunk)
+            file.flush()
+            os.fsync(file.fileno())
+        os.chmod(temp_path, 0o644)
+        os.replace(temp_path, os.path.join(directory, name))
+    except Exception:
+        os.remove(temp_path)
+        raise
+    return os.path.join(CATALOG_SNAPSHOT_DIRECTORY, name)
+
+
+def render_gzipped_snapshot(header: dict, rows, counter: dict):
+    """
+    Gzipped `{**header, "results": [...rows], "count": n}` as byte chunks, without holding all rows in memory.
+    The number of rows is also stored in counter['count'].
+    """
+    buffer = io.BytesIO()
+    with gzip.GzipFile(fileobj=buffer, mode='wb') as file:
+        file.write(json.dumps(header, cls=DjangoJSONEncoder)[:-1].encode() + b', "results": [')
+        counter['count'] = 0
+        for row in rows:
+            file.write((b', ' if counter['count'] else b'') + json.dumps(row, cls=DjangoJSONEncoder).encode())
+            counter['count'] += 1
+            if buffer.tell():
+                yield buffer.getvalue()
+                buffer.seek(0)
+                buffer.truncate()
+        file.write(f'], "count": {counter["count"]}}}'.encode())
+    yield buffer.getvalue()
+
+
+def remove_snapshot_file(path: str) -> None:
+    if path:
+        try:
+            os.remove(os.path.join(settings.MEDIA_ROOT, path))
+        except FileNotFoundError:
+            pass
+
+
+def render_image_derivatives(content: bytes):
+    """
+    Render the derivatives of an original product image: a square JPEG thumbnail and one WebP per srcset width
+    (never upscaled). Returns {'thumbnail': bytes, 'widths': [(width, bytes), ...]}, or None for unreadable
+    images. Only depends on Pillow so it can run in a worker process.
+    """
+    try:
+        with Image.open(io.BytesIO(content)) as original:
+            image = ImageOps.exif_transpose(original)
+            image = image.convert('RGBA' if 'A' in image.getbands() or 'transparency' in image.info else 'RGB')
+    except (UnidentifiedImageError, OSError):
+        return None
+
+    thumbnail = ImageOps.fit(image, (PRODUCT_IMAGE_THUMBNAIL_SIZE, PRODUCT_IMAGE_THUMBNAIL_SIZE), Image.LANCZOS)
+    buffer = io.BytesIO()
+    thumbnail.convert('RGB').save(
+        buffer, 'JPEG', quality=PRODUCT_IMAGE_THUMBNAIL_QUALITY, optimize=True, progressive=True)
+    derivatives = {'thumbnail': buffer.getvalue(), 'widths': []}
+
+    for width in sorted({min(width, image.width) for width in PRODUCT_IMAGE_WIDTHS}):
+        resized = image if width == image.width else image.resize(
+            (width, max(round(image.height * width / image.width), 1)), Image.LANCZOS)
+        buffer = io.BytesIO()
+        resized.save(buffer, 'WEBP', quality=PRODUCT_IMAGE_WEBP_QUALITY, method=4)
+        derivatives['widths'].append((width, buffer.getvalue()))
+    return derivatives
+
+
+def get_image_derivative_paths(derivatives: dict) -> list:
+    if not derivatives:
+        return []
+    return [derivatives['thumbnail'], *(path for _, path in derivatives.get('widths', []))]
@@ -1,43 +1,100 @@
 import logging
-from collections import OrderedDict
+from hashlib import md5
 
-from django.db.models import Q
-from django.db.transaction import atomic, set_rollback
-from django.utils.timezone import now
+from django.conf import settings
+from django.http import StreamingHttpResponse
+from django.utils.cache import patch_vary_headers
+from django.utils.module_loading import import_string
+from django.utils.text import compress_sequence
+from django.db.transaction import atomic, set_rollback, on_commit
 from django_filters.rest_framework import DjangoFilterBackend
 from rest_framework.decorators import action
 from rest_framework.filters import SearchFilter, OrderingFilter
-from rest_framework.mixins import CreateModelMixin, ListModelMixin, UpdateModelMixin, DestroyModelMixin
-from rest_framework.permissions import IsAuthenticated
-
-from rest_framework.response import Response
-from rest_framework.viewsets import GenericViewSet, ModelViewSet
+from rest_framework.mixins import (
+    CreateModelMixin, ListModelMixin, UpdateModelMixin, DestroyModelMixin, RetrieveModelMixin
+)
+from rest_framework.settings import api_settings
+from rest_framework.viewsets import GenericViewSet
 
-from utils.helpers import create_response, load_request_json_data, get_hostname_from_request
-from utils.db_interactors import get_record_by_filters, get_record_by_id, get_single_record_by_filters, \
-    get_select_related_object_list
+from utils.helpers import (
+    create_response, load_request_json_data, get_etag, get_not_modified_response,
+    set_conditional_headers, get_image_path
+)
+from accounts.models import Company
+from utils.db_interactors import get_single_record_by_filters, db_check_existing_record
 from .constants import (
     PRODUCT_NOT_EXIST_ERROR,
     PRODUCT_CREATE_SUCCESS,
+    PRODUCT_UPDATE_SUCCESS,
+    PRODUCT_DELETE_SUCCESS,
+    PRODUCT_LISTING_JSON_KEYS,
     PRODUCT_LIST_SUCCESS,
-    PRODUCT_RETRIEVE_SUCCESS
+    PRODUCT_RETRIEVE_SUCCESS,
+    PRODUCT_SEARCH_SUCCESS,
+    AUTOCOMPLETE_SUCCESS,
+    AUTOCOMPLETE_MIN_LENGTH,
+    AUTOCOMPLETE_DEFAULT_LIMIT,
+    AUTOCOMPLETE_MAX_LIMIT,
+    AUTOCOMPLETE_CACHE_KEY,
+    AUTOCOMPLETE_CACHE_TIMEOUT,
+    PRODUCT_FACETS_SUCCESS,
+    PRODUCT_FACETS_CACHE_KEY,
+    PRODUCT_FACETS_CACHE_TIMEOUT,
+    NON_FILTER_QUERY_PARAMS,
+    PRODUCT_REVIEW_LIST_SUCCESS,
+    PRODUCT_REVIEW_CREATE_SUCCESS,
+    PRODUCT_REVIEW_RETRIEVE_SUCCESS,
+    PRODUCT_REVIEW_NOT_EXIST_ERROR,
+    PRODUCT_BULK_SUCCESS,
+    PRODUCT_BULK_IDS_REQUIRED_ERROR,
+    PRODUCT_BULK_MAX_IDS,
+    PRODUCT_BULK_MAX_IDS_ERROR,
+    PRODUCT_EXPORT_FORMATS,
+    PRODUCT_EXPORT_DEFAULT_FORMAT,
+    PRODUCT_EXPORT_FORMAT_ERROR,
+    PRODUCT_EXPORT_CHUNK_SIZE,
+    CATALOG_SNAPSHOTS_SUCCESS,
+    CATALOG_SNAPSHOT_DIRECTORY,
+    CATALOG_SNAPSHOT_MANIFEST,
+    SUPPLIER_STOREFRONT_SUCCESS,
+    SUPPLIER_STOREFRONT_SUMMARY_SUCCESS,
+    SUPPLIER_NOT_EXIST_ERROR,
+    SIMILAR_PRODUCTS_SUCCESS,
+    PRODUCT_CHANGES_SUCCESS,
+    PRODUCT_CHANGES_TOKEN_ERROR,
+    PRODUCT_CHANGES_DEFAULT_LIMIT,
+    PRODUCT_CHANGES_MAX_LIMIT
 )
-from .filtersets import ProductFilterSet
-from .models import (
-    Product, Category, ProductVariant,
-    ProductConfig, SupplierProducts,
-    Manufacturer, ProductReview,
-    ProductRatings, ProductImages,
-    ShippingAndOrdering
+from .documents import ProductDocument, get_product_search_query, get_product_search_filters
+from .filters import ProductInStockFilter
+from .filtersets import ProductFilterSet, ProductCardFilterSet
+from .models import ProductReview, ProductChange
+from utils.cache_interface import get_value, set_value
+from utils.elasticsearch import es_get_records_q_filters, es_search_records
+from utils.paginations import StandardResultsSetPagination, KeysetCursorPagination
+from .db_interactors import (
+    db_get_product_list_queryset, db_get_product_details, db_get_all_product_cards, db_get_autocomplete_suggestions,
+    db_get_queryset_validators, db_get_product_last_modified, db_get_all_products, db_get_product_facet_counts,
+    db_get_product_reviews, db_get_product_review_count, db_get_products_details_in_bulk,
+    db_get_sparse_product_queryset, db_get_sparse_product_cards, db_iter_product_export_batches,
+    db_get_catalog_snapshots, db_get_supplier_product_cards, db_get_supplier_storefront_summary,
+    db_get_similar_products, db_get_product_change_token, db_get_product_changes, db_get_product_cards_by_ids,
+    db_save_product_listing, db_get_existing_product_ids, db_get_product_card_times,
+    db_get_products_without_cards_exist, db_delete_product, db_get_managed_company_ids
 )
-from utils.paginations import StandardResultsSetPagination
-from .db_interactors import db_get_all_products
-from .permissions import ProductPermission
+from .permissions import ProductPermission, ProductReviewPermission, SupplierStorefrontPermission
 from .serializers import (
 	ProductCreateSerializer, ProductListSerializer, ProductDetailsSerializer, 
-    ManufacturerSerializer, ProductReviewSerializer
+    ProductReviewSerializer, ProductCardSerializer, CatalogSnapshotSerializer
+)
+from .tasks import generate_product_image_derivatives
+from .utils import (
+    get_cached_product_detail, set_cached_product_detail, get_cached_product_reviews, set_cached_product_reviews,
+    get_cached_product_details, set_cached_product_details, get_sparse_fieldset, trim_to_fieldset,
+    render_ndjson_batches, render_csv_batches, get_cached_supplier_storefront_summary,
+    set_cached_supplier_storefront_summary, get_product_membership_version, get_product_change_token,
+    parse_product_change_token, get_cached_product_cards_complete, set_cached_product_cards_complete
 )
-from .tasks import create_product
 
 LOGGER = logging.getLogger(__name__)
 
@@ -45,166 +102,625 @@ LOGGER = logging.getLogger(__name__)
 class ProductViewSet(GenericViewSet, CreateModelMixin, ListModelMixin, UpdateModelMixin, DestroyModelMixin):
     permission_classes = [ProductPermission]
     pagination_class = StandardResultsSetPagination
-    filter_backends = [DjangoFilterBackend, SearchFilter, OrderingFilter]
+    cursor_pagination_class = KeysetCursorPagination
+    # Search runs after OrderingFilter so a ranking backend's ordering wins unless an ordering was requested.
+    filter_backends = [
+        DjangoFilterBackend, ProductInStockFilter, OrderingFilter, import_string(settings.PRODUCT_SEARCH_FILTER_BACKEND)
+    ]
     filterset_class = ProductFilterSet
-    ordering_fields = ['name', 'created_at', 'updated_at']
-    ordering = ['valid_to']
-    search_fields = ['name']
+    ordering_fields = ['name', 'created', 'updated', 'rating_average']
+    ordering = ['-pk']
+    paginated_actions = ['list', 'cards']
+    card_ordering_fields = ['name', 'updated', 'rating_average']
+
+    @property
+    def paginator(self):
+        """
+        Clients opt into keyset pagination by sending the cursor parameter (empty for the first page).
+        Only the list actions page their results, the others get no paginator.
+        """
+        if not hasattr(self, '_paginator'):
+            if self.action not in self.paginated_actions:
+                self._paginator = None
+            elif self.cursor_pagination_class.cursor_query_param in self.request.query_params:
+                self._paginator = self.cursor_pagination_class()
+            elif self.pagination_class is None:
+                self._paginator = None
+            else:
+                self._paginator = self.pagination_class()
+        return self._paginator
 
     def get_object(self, *args, **kwargs):
-        status, product = get_record_by_id(model=Product, _id=self.kwargs.get('pk'))
+        status, product = db_get_product_details(_id=self.kwargs.get('pk'))
         if not status:
             return False, PRODUCT_NOT_EXIST_ERROR
 
         self.check_object_permissions(request=self.request, obj=product)
         return True, product
 
+    def lists_from_cards(self) -> bool:
+        """
+        The list is served from the ProductCard read model unless the request needs the product rows themselves:
+        expanded relations, ranked full-text search or an ordering on a column the cards do not carry. It is also
+        served from the products while any of them has no card, before the cards are first built or after a
+        refresh failed, so no product drops out of the list.
+        """
+        if self.action != 'list':
+            return False
+        _, expand = get_sparse_fieldset(self.request)
+        ordering = self.request.query_params.get(api_settings.ORDERING_PARAM, '')
+        return not expand and not self.request.query_params.get(api_settings.SEARCH_PARAM, '').strip() and {
+            field.strip().lstrip('-') for field in ordering.split(',') if field.strip()
+        }.issubset(self.card_ordering_fields) and self.cards_are_complete()
+
+    def cards_are_complete(self) -> bool:
+        if not hasattr(self, '_cards_are_complete'):
+            self._cards_are_complete = get_cached_product_cards_complete()
+            if not self._cards_are_complete:
+                self._cards_are_complete = not db_get_products_without_cards_exist()
+                set_cached_product_cards_complete(self._cards_are_complete)
+        return self._cards_are_complete
+
     def get_queryset(self, validated_data=None, exam=None):
-        if self.action == 'list':
+        if self.lists_from_cards():
+            fields, _ = get_sparse_fieldset(self.request)
+            if fields:
+                return db_get_sparse_product_cards(fields=fields, extra_columns=self.card_ordering_fields)
+            return db_get_all_product_cards()
+        elif self.action == 'list':
+            fields, expand = get_sparse_fieldset(self.request)
+            if fields or expand:
+                return db_get_sparse_product_queryset(
+                    fields=[*(fields or ProductListSerializer.Meta.fields), *(expand or ())],
+                    extra_columns=self.ordering_fields
+                )
+            return db_get_product_list_queryset()
+        elif self.action in ['facets', 'export']:
             return db_get_all_products()
+        elif self.action == 'cards':
+            fields, _ = get_sparse_fieldset(self.request)
+            if fields:
+                return db_get_sparse_product_cards(fields=fields, extra_columns=self.ordering_fields)
+            return db_get_all_product_cards()
 
     def filter_queryset(self, queryset=None):
-        for backend in list(self.filter_backends):
+        filter_backends = self.filter_backends
+        if self.lists_from_cards():
+            # Product filters run on the product table and reach the cards as one semi-join on the card key
+            products = DjangoFilterBackend().filter_queryset(self.request, db_get_all_products(), view=self)
+            if products.query.has_filters():
+                queryset = queryset.filter(product_id__in=products.order_by().values('id'))
+            filter_backends = [ProductInStockFilter, OrderingFilter]
+        for backend in list(filter_backends):
             queryset = backend().filter_queryset(self.request, queryset, view=self)
         return queryset
 
+    def get_serializer_context(self):
+        context = super().get_serializer_context()
+        if self.action in ['list', 'cards']:
+            context['fields'], context['expand'] = get_sparse_fieldset(self.request)
+        return context
+
     def get_serializer_class(self):
         if self.action == 'create':
             return ProductCreateSerializer
         elif self.action == 'list':
-            return ProductListSerializer
+            return ProductCardSerializer if self.lists_from_cards() else ProductListSerializer
+        elif self.action == 'cards':
+            return ProductCardSerializer
         elif self.action == 'retrieve':
             return ProductDetailsSerializer
-        elif self.action == 'update':
-            return ProductUpdateSerializer
+        elif self.action in ['update', 'partial_update']:
+            return ProductCreateSerializer
+
+    def get_listing_data(self, request) -> dict:
+        data = load_request_json_data(request_data=request.data, json_key_list=PRODUCT_LISTING_JSON_KEYS)
+        if request.FILES.getlist('images'):
+            data['images'] = request.FILES.getlist('images')
+        return data
+
+    @staticmethod
+    def schedule_image_derivatives(images: list = None):
+        # The images were bulk inserted, so the post_save handler that normally queues this never ran
+        image_ids = [image.id for image in images or () if image.image]
+        if image_ids:
+            on_commit(lambda: generate_product_image_derivatives.delay(image_ids))
 
     @atomic()
     def create(self, request, *args, **kwargs):
+        """
+        Creates a whole listing in one request: the product fields plus optional `variants`, `shipping`,
+        `images` (repeated file field), `is_in_stock` and `category`, written with a fixed number of INSERTs.
+        """
         serializer_class = self.get_serializer_class()
-        data = load_request_json_data(
-            request_data=request.data,
-            json_key_list=[
-            ]
-        )
-
-        serializer = serializer_class(data=data, context=self.get_serializer_context())
+        serializer = serializer_class(data=self.get_listing_data(request), context=self.get_serializer_context())
         if not serializer.is_valid():
             set_rollback(True)
             return create_response(message=serializer.errors)
 
-            if not serializer.is_valid():
-                set_rollback(True)
-                return create_response(message=serializer.errors)
-
-        status, response = exam_serializer.create(validated_data)
+        status, response = db_save_product_listing(
+            data=serializer.validated_data, supplier_ids=db_get_managed_company_ids(user=request.user)
+        )
         if not status:
             set_rollback(True)
             return create_response(message=response)
-        return create_response(message=PRODUCT_CREATE_SUCCESS, success=True, data={'exam': response})
+        product, images = response
+        self.schedule_image_derivatives(images)
+        return create_response(message=PRODUCT_CREATE_SUCCESS, success=True, data={'id': product.id})
 
     def list(self, request, *args, **kwargs):
-        import pdb;pdb.set_trace()
-        page = request.GET.get('page')
-        queryset = self.get_queryset()
-        # if not status:
-        #     return create_response(message=exam_queryset)
-        # queryset = self.filter_queryset(queryset=exam_queryset)
+        page = request.GET.get('page') or self.cursor_pagination_class.cursor_query_param in request.GET
+        queryset = self.filter_queryset(queryset=self.get_queryset())
+
+        # Validators are computed before any row is serialized. Category links and stock move products in and out
+        # of a filtered list without touching their `updated`, the membership version covers those.
+        parts = [get_product_membership_version(), sorted(request.GET.lists())]
+        keyset = isinstance(self.paginator, KeysetCursorPagination)
+        if keyset:
+            # A keyset page is a cheap range scan, its own rows make the validators without counting the whole set
+            queryset = self.paginate_queryset(queryset)
+            last_modified = max((product.updated for product in queryset), default=None)
+            parts += [[product.pk for product in queryset], self.paginator.has_next, self.paginator.has_previous]
+        else:
+            status, validators = db_get_queryset_validators(queryset=queryset)
+            if not status:
+                return create_response(message=validators)
+            last_modified = validators['last_modified']
+            parts.append(validators['count'])
+        etag = get_etag(last_modified, *parts)
+        not_modified_response = get_not_modified_response(request, etag=etag, last_modified=last_modified)
+        if not_modified_response:
+            return not_modified_response
+
+        if page and not keyset:
+            queryset = self.paginate_queryset(queryset)
+        serializer = self.get_serializer(queryset, many=True)
+        if page:
+            serializer = self.get_paginated_response(serializer.data)
+        response = create_response(success=True, message=PRODUCT_LIST_SUCCESS, data=serializer.data)
+        return set_conditional_headers(response, etag=etag, last_modified=last_modified)
+
+    @action(
+        detail=False, url_path='cards', filterset_class=ProductCardFilterSet,
+        filter_backends=[DjangoFilterBackend, ProductInStockFilter, SearchFilter, OrderingFilter],
+        ordering_fields=['name', 'updated', 'rating_average'], ordering=['-pk'], search_fields=['name']
+    )
+    def cards(self, request, *args, **kwargs):
+        """
+        Product list served from the denormalized ProductCard read model, without joins.
+        """
+        page = request.GET.get('page') or self.cursor_pagination_class.cursor_query_param in request.GET
+        queryset = self.filter_queryset(queryset=self.get_queryset())
         if page:
-            exam_queryset = self.paginate_queryset(exam_queryset)
+            queryset = self.paginate_queryset(queryset)
         serializer = self.get_serializer(queryset, many=True)
         if page:
             serializer = self.get_paginated_response(serializer.data)
         return create_response(success=True, message=PRODUCT_LIST_SUCCESS, data=serializer.data)
 
-    def retrieve(self, request, *args, **kwargs):
-        status, product = self.get_object(*args, **kwargs)
+    @action(detail=False, url_path='search')
+    def search(self, request, *args, **kwargs):
+        """
+        Ranked product search served from the Elasticsearch index; results are built from the hits alone.
+        """
+        paginator = StandardResultsSetPagination()
+        page_size = paginator.get_page_size(request)
+        fields, _ = get_sparse_fieldset(request)
+        try:
+            page = max(int(request.GET.get('page', 1)), 1)
+        except ValueError:
+            page = 1
+
+        status, search = es_get_records_q_filters(ProductDocument, get_product_search_filters(request.GET))
         if not status:
-            return create_response(message=product)
-        serializer_class = self.get_serializer_class()
-        return create_response(success=True, message=PRODUCT_RETRIEVE_SUCCESS,
-                                    data=serializer_class(product, context=self.get_serializer_context()).data)
+            return create_response(message=search)
+        status, response = es_search_records(
+            search,
+            query=get_product_search_query(request.GET.get('search')),
+            offset=(page - 1) * page_size,
+            limit=page_size,
+            source=[field for field in ProductListSerializer.Meta.fields if not fields or field in fields]
+        )
+        if not status:
+            return create_response(message=response)
 
-    @atomic()
-    def update(self, request, *args, **kwargs):
-        status, exam = self.get_object(*args, **kwargs)
-        if not status:
-            return create_response(message=exam)
-        data = load_request_json_data(
-            request_data=request.data,
-            json_key_list=[
-                'question_set_data',
-                'difficulty_distribution',
-                'reasoning_type_distribution',
-            ]
+        count = response.hits.total.value
+        results = [{**hit.to_dict(), 'score': hit.meta.score} for hit in response]
+        return create_response(success=True, message=PRODUCT_SEARCH_SUCCESS, data={
+            'count': count,
+            'next': page + 1 if page * page_size < count else None,
+            'previous': page - 1 if page > 1 else None,
+            'results': results
+        })
+
+    @action(detail=False, url_path='autocomplete')
+    def autocomplete(self, request, *args, **kwargs):
+        """
+        Typo tolerant product and brand suggestions. Popular prefixes are answered from a short lived cache.
+        """
+        text = ' '.join(request.GET.get('q', '').lower().split())
+        try:
+            limit = min(int(request.GET.get('limit', AUTOCOMPLETE_DEFAULT_LIMIT)), AUTOCOMPLETE_MAX_LIMIT)
+        except ValueError:
+            limit = AUTOCOMPLETE_DEFAULT_LIMIT
+        if len(text) < AUTOCOMPLETE_MIN_LENGTH or limit <= 0:
+            return create_response(success=True, message=AUTOCOMPLETE_SUCCESS, data={'products': [], 'brands': []})
+
+        cache_key = AUTOCOMPLETE_CACHE_KEY.format(limit=limit, text_hash=md5(text.encode()).hexdigest())
+        _, suggestions = get_value(key=cache_key)
+        if suggestions is None:
+            status, suggestions = db_get_autocomplete_suggestions(text=text, limit=limit)
+            if not status:
+                return create_response(message=suggestions)
+            set_value(key=cache_key, value=suggestions, expire_on=AUTOCOMPLETE_CACHE_TIMEOUT)
+        return create_response(success=True, message=AUTOCOMPLETE_SUCCESS, data=suggestions)
+
+    @action(detail=False, url_path='facets')
+    def facets(self, request, *args, **kwargs):
+        """
+        Sidebar facet counts for the current search and filters, in one aggregate query.
+        """
+        filters = sorted((key, value) for key, value in request.GET.lists() if key not in NON_FILTER_QUERY_PARAMS)
+        cache_key = PRODUCT_FACETS_CACHE_KEY.format(filters_hash=md5(str(filters).encode()).hexdigest())
+        _, facets = get_value(key=cache_key)
+        if facets is None:
+            queryset = self.filter_queryset(queryset=self.get_queryset())
+            status, facets = db_get_product_facet_counts(queryset=queryset)
+            if not status:
+                return create_response(message=facets)
+            set_value(key=cache_key, value=facets, expire_on=PRODUCT_FACETS_CACHE_TIMEOUT)
+        return create_response(success=True, message=PRODUCT_FACETS_SUCCESS, data=facets)
+
+    @action(detail=False, url_path='snapshots')
+    def snapshots(self, request, *args, **kwargs):
+        """
+        URLs and versions of the published category snapshots. The same listing is published as a static manifest.
+        """
+        snapshots = CatalogSnapshotSerializer(db_get_catalog_snapshots().values(), many=True).data
+        return create_response(success=True, message=CATALOG_SNAPSHOTS_SUCCESS, data={
+            'manifest': get_image_path(f'{CATALOG_SNAPSHOT_DIRECTORY}/{CATALOG_SNAPSHOT_MANIFEST}'),
+            'snapshots': snapshots
+        })
+
+    @action(detail=False, url_path='changes')
+    def changes(self, request, *args, **kwargs):
+        """
+        Products created, updated or deleted after the change token ?since=, for clients mirroring the catalog.
+
+        Without a token only the current one is returned: take it, load a snapshot, then follow the feed from it.
+        Changes already in the snapshot are replayed, which is harmless as every change is an upsert or a delete.
+        A batch holds the cards of the created and updated products (sparse with ?fields=) and the deleted ids,
+        each product once. Request again with `next` while `has_more` is set.
+        """
+        since = request.GET.get('since')
+        if since is None:
+            return create_response(success=True, message=PRODUCT_CHANGES_SUCCESS, data={
+                'created': [], 'updated': [], 'deleted': [],
+                'next': get_product_change_token(db_get_product_change_token()), 'has_more': False
+            })
+        position = parse_product_change_token(since)
+        if position is None:
+            return create_response(message=PRODUCT_CHANGES_TOKEN_ERROR)
+        try:
+            limit = min(int(request.GET.get('limit', PRODUCT_CHANGES_DEFAULT_LIMIT)), PRODUCT_CHANGES_MAX_LIMIT)
+        except ValueError:
+            limit = PRODUCT_CHANGES_DEFAULT_LIMIT
+        if limit <= 0:
+            limit = PRODUCT_CHANGES_DEFAULT_LIMIT
+
+        status, changes = db_get_product_changes(since=position, limit=limit)
+        if not status:
+            return create_response(message=changes)
+        # A card is rebuilt after the write commits, or later by the retried refresh task. The batch ends at the
+        # first change its product's card does not reflect yet, missing or rebuilt before the change was logged,
+        # so `next` never moves past a change whose payload was not returned. A product that is gone since has a
+        # tombstone further on and is skipped.
+        actions = self.get_product_change_actions(changes)
+        upserted_ids = [
+            product_id for product_id, change_action in actions.items() if change_action != ProductChange.Action.DELETED
+        ]
+        card_times = db_get_product_card_times(product_ids=upserted_ids)
+        missing_ids = set(upserted_ids).difference(card_times)
+        existing_ids = db_get_existing_product_ids(product_ids=list(missing_ids)) if missing_ids else set()
+        pending_index = next((
+            index for index, (_, _, product_id, change_action, created) in enumerate(changes)
+            if change_action != ProductChange.Action.DELETED
+            and (product_id in existing_ids or product_id in card_times and card_times[product_id] < created)
+        ), None)
+        if pending_index is not None:
+            changes = changes[:pending_index]
+            actions = self.get_product_change_actions(changes)
+
+        fields, _ = get_sparse_fieldset(request)
+        fields = [*fields, 'id'] if fields else fields
+        cards = self.get_change_cards(actions, fields)
+
+        return create_response(success=True, message=PRODUCT_CHANGES_SUCCESS, data={
+            'created': [
+                cards[product_id] for product_id, change_action in actions.items()
+                if change_action == ProductChange.Action.CREATED and product_id in cards
+            ],
+            'updated': [
+                cards[product_id] for product_id, change_action in actions.items()
+                if change_action == ProductChange.Action.UPDATED and product_id in cards
+            ],
+            'deleted': [
+                product_id for product_id, change_action in actions.items()
+                if change_action == ProductChange.Action.DELETED
+            ],
+            'next': get_product_change_token(changes[-1][:2]) if changes else since,
+            'has_more': pending_index is None and len(changes) == limit
+        })
+
+    @staticmethod
+    def get_product_change_actions(changes: list) -> dict:
+        # {product_id: action} of a batch of (transaction_id, id, product_id, action, created) changes, each
+        # product once
+        actions = {}
+        for _, _, product_id, change_action, _ in changes:
+            # Still new to the client when it was created earlier in the same batch
+            if not (change_action == ProductChange.Action.UPDATED
+                    and actions.get(product_id) == ProductChange.Action.CREATED):
+                actions[product_id] = change_action
+        return actions
+
+    def get_change_cards(self, actions: dict, fields: list = None) -> dict:
+        upserted_ids = [
+            product_id for product_id, change_action in actions.items() if change_action != ProductChange.Action.DELETED
+        ]
+        return {
+            card['id']: card for card in ProductCardSerializer(
+                db_get_product_cards_by_ids(product_ids=upserted_ids, fields=fields), many=True,
+                context={**self.get_serializer_context(), 'fields': fields}
+            ).data
+        }
+
+    @action(detail=False, url_path='export')
+    def export(self, request, *args, **kwargs):
+        """
+        The whole (filtered) catalog as one streamed NDJSON or CSV file (?file_format=), gzipped when accepted.
+        """
+        file_format = request.GET.get('file_format', PRODUCT_EXPORT_DEFAULT_FORMAT)
+        if file_format not in PRODUCT_EXPORT_FORMATS:
+            return create_response(message=PRODUCT_EXPORT_FORMAT_ERROR)
+
+        queryset = self.filter_queryset(queryset=self.get_queryset())
+        batches = db_iter_product_export_batches(queryset=queryset, chunk_size=PRODUCT_EXPORT_CHUNK_SIZE)
+        content = render_csv_batches(batches) if file_format == 'csv' else render_ndjson_batches(batches)
+        content = (chunk.encode() for chunk in content)
+        gzipped = 'gzip' in request.META.get('HTTP_ACCEPT_ENCODING', '')
+        response = StreamingHttpResponse(
+            compress_sequence(content) if gzipped else content, content_type=PRODUCT_EXPORT_FORMATS[file_format]
         )
-        data['exam'] = exam.id
+        if gzipped:
+            response['Content-Encoding'] = 'gzip'
+        patch_vary_headers(response, ('Accept-Encoding',))
+        response['Content-Disposition'] = f'attachment; filename="catalog.{file_format}"'
+        return response
 
-        serializer = self.get_serializer(data=data, context=self.get_serializer_context())
+    @action(detail=False, url_path='bulk')
+    def bulk(self, request, *args, **kwargs):
+        """
+        Details of many products (?ids=1,2,3) in request order. Cached payloads are reused and the rest is
+        resolved with one in_bulk query plus the detail prefetches, whatever the number of ids.
+        """
+        try:
+            product_ids = list(dict.fromkeys(
+                int(_id) for _id in request.GET.get('ids', '').split(',') if _id.strip()
+            ))
+        except ValueError:
+            return create_response(message=PRODUCT_BULK_IDS_REQUIRED_ERROR)
+        if not product_ids:
+            return create_response(message=PRODUCT_BULK_IDS_REQUIRED_ERROR)
+        if len(product_ids) > PRODUCT_BULK_MAX_IDS:
+            return create_response(message=PRODUCT_BULK_MAX_IDS_ERROR)
 
-        if serializer.is_valid():
-            # update exam
-            status, response = serializer.update(instance=exam, validated_data=serializer.validated_data)
+        versions, cached_data = get_cached_product_details(product_ids)
+        uncached_ids = [product_id for product_id in product_ids if product_id not in cached_data]
+        fetched_data = {}
+        if uncached_ids:
+            status, products = db_get_products_details_in_bulk(product_ids=uncached_ids)
             if not status:
-                set_rollback(True)
-                return create_response(message=response)
+                return create_response(message=products)
+            fetched_data = {
+                product_id: ProductDetailsSerializer(product, context=self.get_serializer_context()).data
+                for product_id, product in products.items()
+            }
+            set_cached_product_details(versions, fetched_data)
 
-            return create_response(success=True, message=EXAM_UPDATE_SUCCESS)
-        else:
+        data = {**cached_data, **fetched_data}
+        fields, _ = get_sparse_fieldset(request)
+        return create_response(success=True, message=PRODUCT_BULK_SUCCESS, data={
+            'results': [trim_to_fieldset(data[product_id], fields) for product_id in product_ids if product_id in data],
+            'missing': [product_id for product_id in product_ids if product_id not in data]
+        })
+
+    @action(detail=True, url_path='similar')
+    def similar(self, request, *args, **kwargs):
+        """
+        Cards of the products most similar to this one, best first, read from the precomputed neighbors.
+        """
+        status, neighbors = db_get_similar_products(product_id=self.kwargs.get('pk'))
+        if not status:
+            return create_response(message=neighbors)
+        neighbors = list(neighbors)
+        fields, _ = get_sparse_fieldset(request)
+        cards = ProductCardSerializer(
+            [neighbor.neighbor.card for neighbor in neighbors], many=True,
+            context={**self.get_serializer_context(), 'fields': fields}
+        ).data
+        return create_response(success=True, message=SIMILAR_PRODUCTS_SUCCESS, data={'results': [
+            {**card, 'score': neighbor.score} for card, neighbor in zip(cards, neighbors)
+        ]})
+
+    def retrieve(self, request, *args, **kwargs):
+        # The rendered payload is cached per product version; catalog writes bump the version.
+        try:
+            product_id = int(self.kwargs.get('pk'))
+        except (TypeError, ValueError):
+            return create_response(message=PRODUCT_NOT_EXIST_ERROR)
+
+        status, last_modified = db_get_product_last_modified(_id=product_id)
+        if not status:
+            return create_response(message=PRODUCT_NOT_EXIST_ERROR)
+        etag = get_etag(product_id, last_modified.isoformat(), sorted(request.GET.lists()))
+        not_modified_response = get_not_modified_response(request, etag=etag, last_modified=last_modified)
+        if not_modified_response:
+            return not_modified_response
+
+        version, data = get_cached_product_detail(product_id)
+        if data is None:
+            status, product = self.get_object(*args, **kwargs)
+            if not status:
+                return create_response(message=product)
+            serializer_class = self.get_serializer_class()
+            data = serializer_class(product, context=self.get_serializer_context()).data
+            set_cached_product_detail(product_id, version, data)
+        fields, _ = get_sparse_fieldset(request)
+        response = create_response(
+            success=True, message=PRODUCT_RETRIEVE_SUCCESS, data=trim_to_fieldset(data, fields))
+        return set_conditional_headers(response, etag=etag, last_modified=last_modified)
+
+    @atomic()
+    def update(self, request, *args, **kwargs):
+        """
+        Updates a listing like create does. Nested keys that are sent replace the stored rows, the rest are kept.
+        """
+        status, product = self.get_object(*args, **kwargs)
+        if not status:
+            return create_response(message=product)
+
+        serializer = self.get_serializer(
+            product, data=self.get_listing_data(request), partial=kwargs.get('partial', False)
+        )
+        if not serializer.is_valid():
             set_rollback(True)
             return create_response(message=serializer.errors)
 
+        status, response = db_save_product_listing(product=product, data=serializer.validated_data)
+        if not status:
+            set_rollback(True)
+            return create_response(message=response)
+        self.schedule_image_derivatives(response[1])
+        return create_response(success=True, message=PRODUCT_UPDATE_SUCCESS, data={'id': product.id})
+
     @atomic()
     def destroy(self, request, *args, **kwargs):
-        status, exam = self.get_object(*args, **kwargs)
+        status, product = self.get_object(*args, **kwargs)
         if not status:
-            set_rollback(True)
-            return create_response(message=exam)
+            return create_response(message=product)
 
-        status, delete_exam = delete_exam_service(exam=exam, user=request.user)
+        status, response = db_delete_product(product=product)
         if not status:
             set_rollback(True)
-            return create_response(message=delete_exam)
-
-        return create_response(success=True, message=DELETE_EXAM_SUCCESS)
+            return create_response(message=response)
+        return create_response(success=True, message=PRODUCT_DELETE_SUCCESS)
 
 
-class ProductReviewViewSet(ModelViewSet):
-    permission_classes=[IsAuthenticated]
-    pagination_class = StandardResultsSetPagination
-    filter_backends = [DjangoFilterBackend, SearchFilter, OrderingFilter]
-    ordering_fields = ['id', 'exam__name', 'due_date']
-    ordering = ['-due_date']
-    search_fields = ['exam__name']
+class ProductReviewViewSet(GenericViewSet, CreateModelMixin, ListModelMixin, RetrieveModelMixin):
+    """
+    Reviews of one product (`product/<product_id>/review`), newest first.
 
-    def get_object(self):
-        return get_record_by_id(model=ExamCreationRequest, _id=self.kwargs.get('pk'))
+    The feed is keyset paginated on (created, id) so deep pages cost the same as the first one. The newest page
+    is cached per product and dropped by a version bump on every review write.
+    """
+    permission_classes = [ProductReviewPermission]
+    pagination_class = KeysetCursorPagination
+    serializer_class = ProductReviewSerializer
 
-    def get_queryset(self, validated_data=None):
+    def get_queryset(self):
         if getattr(self, 'swagger_fake_view', False):
-            return Exam.objects.none()
-        elif self.action == 'list':
-            return db_get_exam_assign_requests(user=self.request.user)
+            return ProductReview.objects.none()
+        return db_get_product_reviews(product_id=self.kwargs['product_id'])
 
-    def get_serializer_class(self):
-        if self.action == 'list':
-            return ExamCreationRequestSerializer
+    def get_object(self):
+        return get_single_record_by_filters(
+            model=ProductReview, filters={'id': self.kwargs.get('pk'), 'product_id': self.kwargs['product_id']})
+
+    def create(self, request, *args, **kwargs):
+        status, _ = db_get_product_review_count(product_id=self.kwargs['product_id'])
+        if not status:
+            return create_response(message=PRODUCT_NOT_EXIST_ERROR)
+        serializer = self.get_serializer(data=request.data)
+        if not serializer.is_valid():
+            return create_response(message=serializer.errors)
+        serializer.save(product_id=self.kwargs['product_id'])
+        return create_response(success=True, message=PRODUCT_REVIEW_CREATE_SUCCESS, data=serializer.data)
 
     def list(self, request, *args, **kwargs):
-        page = request.GET.get('page')
-        status, exam_assign_queryset = self.get_queryset()
+        product_id = int(self.kwargs['product_id'])
+        cache_key = None
+        if self.paginator.cursor_query_param not in request.GET:
+            cache_key, data = get_cached_product_reviews(product_id, self.paginator.get_page_size(request))
+            if data is not None:
+                return create_response(success=True, message=PRODUCT_REVIEW_LIST_SUCCESS, data=data)
+
+        status, review_count = db_get_product_review_count(product_id=product_id)
         if not status:
-            return create_response(message=exam_assign_queryset)
-        exam_assign_queryset = self.filter_queryset(queryset=exam_assign_queryset)
-        if page:
-            exam_assign_queryset = self.paginate_queryset(exam_assign_queryset)
-        serializer = self.get_serializer(exam_assign_queryset, many=True)
-        if page:
-            serializer = self.get_paginated_response(serializer.data)
-        return create_response(success=True, message=LIST_EXAM_ASSIGN_REQUEST_SUCCESS, data=serializer.data)
+            return create_response(message=PRODUCT_NOT_EXIST_ERROR)
+        page = self.paginate_queryset(self.get_queryset())
+        data = self.get_paginated_response(self.get_serializer(page, many=True).data).data
+        data['count'] = review_count
+        if cache_key:
+            set_cached_product_reviews(cache_key, data)
+        return create_response(success=True, message=PRODUCT_REVIEW_LIST_SUCCESS, data=data)
 
     def retrieve(self, request, *args, **kwargs):
         status, obj = self.get_object()
         if not status:
-            return create_response(message=CREATION_REQUEST_DOES_NOT_EXIST)
+            return create_response(message=PRODUCT_REVIEW_NOT_EXIST_ERROR)
         return create_response(
-            success=True, message=CREATION_REQUEST_FETCH_SUCCESS, data=ExamCreationRequestDetailSerializer(obj).data)
+            success=True, message=PRODUCT_REVIEW_RETRIEVE_SUCCESS, data=self.get_serializer(obj).data)
+
+
+class SupplierStorefrontViewSet(GenericViewSet, ListModelMixin):
+    """
+    Catalog of one supplier (`supplier/<supplier_id>/product`) served from the ProductCard read model.
+
+    Pages are keyset paginated and carry the supplier's product count; the count and the category breakdown
+    (`summary`) are cached per supplier until its product links or their categories change.
+    """
+    permission_classes = [SupplierStorefrontPermission]
+    pagination_class = KeysetCursorPagination
+    serializer_class = ProductCardSerializer
+    filter_backends = [DjangoFilterBackend, ProductInStockFilter, SearchFilter, OrderingFilter]
+    filterset_class = ProductCardFilterSet
+    ordering_fields = ['name', 'updated', 'rating_average']
+    ordering = ['-pk']
+    search_fields = ['name']
+
+    def get_queryset(self):
+        if getattr(self, 'swagger_fake_view', False):
+            return db_get_all_product_cards().none()
+        return db_get_supplier_product_cards(supplier_id=self.kwargs['supplier_id'])
+
+    def get_summary(self):
+        supplier_id = int(self.kwargs['supplier_id'])
+        cache_key, summary = get_cached_supplier_storefront_summary(supplier_id)
+        if summary is not None:
+            return True, summary
+
+        status, exists = db_check_existing_record(model=Company, filters={'id': supplier_id})
+        if not status or not exists:
+            return False, SUPPLIER_NOT_EXIST_ERROR
+        status, summary = db_get_supplier_storefront_summary(supplier_id=supplier_id)
+        if not status:
+            return False, summary
+        set_cached_supplier_storefront_summary(cache_key, summary)
+        return True, summary
+
+    def list(self, request, *args, **kwargs):
+        status, summary = self.get_summary()
+        if not status:
+            return create_response(message=summary)
+        page = self.paginate_queryset(self.filter_queryset(self.get_queryset()))
+        data = self.get_paginated_response(self.get_serializer(page, many=True).data).data
+        data['product_count'] = summary['product_count']
+        return create_response(success=True, message=SUPPLIER_STOREFRONT_SUCCESS, data=data)
+
+    @action(detail=False, url_path='summary')
+    def summary(self, request, *args, **kwargs):
+        status, summary = self.get_summary()
+        if not status:
+            return create_response(message=summary)
+        return create_response(success=True, message=SUPPLIER_STOREFRONT_SUMMARY_SUCCESS, data=summary)
@@ -0,0 +1,74 @@
+import os
+
+from django.db.models import Q
+
+from utils.storage import get_content_blob_digest
+from .models import ContentBlob
+
+
+def db_link_content_blob(instance=None, field_name: str = None):
+    """
+    Points instance.blob at the ContentBlob row of the file stored in `field_name`, creating the row the first
+    time a blob is referenced. Files stored outside the blob directory leave the instance unlinked.
+    """
+    try:
+        file = getattr(instance, field_name)
+        digest = get_content_blob_digest(file.name) if file else None
+        blob_id = None
+        if digest:
+            blob, _ = ContentBlob.objects.get_or_create(
+                path=file.name, defaults={'sha256': digest, 'size': file.storage.size(file.name)}
+            )
+            blob_id = blob.id
+        if blob_id != instance.blob_id:
+            type(instance).objects.filter(id=instance.id).update(blob_id=blob_id)
+            instance.blob_id = blob_id
+        return True, blob_id
+    except Exception as e:
+        return False, str(e)
+
+
+def db_get_content_blob_ids(files: list = None):
+    """
+    {path: ContentBlob id} for stored blob files, the bulk counterpart of db_link_content_blob. Rows missing for
+    any of the files are created with one INSERT.
+    """
+    try:
+        blobs = {}
+        for file in files:
+            digest = get_content_blob_digest(file.name)
+            if digest and file.name not in blobs:
+                blobs[file.name] = ContentBlob(path=file.name, sha256=digest, size=file.storage.size(file.name))
+        if not blobs:
+            return True, {}
+        ContentBlob.objects.bulk_create(blobs.values(), ignore_conflicts=True)
+        return True, dict(ContentBlob.objects.filter(path__in=blobs).values_list('path', 'id'))
+    except Exception as e:
+        return False, str(e)
+
+
+def db_delete_unrecorded_content_blobs(files: list = None):
+    """
+    Removes the stored blob files among `files` that no ContentBlob row records, as left behind by a transaction
+    that stored them and rolled back. Blobs recorded by committed rows stay in place.
+    """
+    try:
+        storages = {file.name: file.storage for file in files if get_content_blob_digest(file.name)}
+        recorded = set(ContentBlob.objects.filter(path__in=storages).values_list('path', flat=True))
+        deleted = 0
+        for name, storage in storages.items():
+            if name not in recorded and os.path.exists(storage.path(name)):
+                os.remove(storage.path(name))
+                deleted += 1
+        return True, deleted
+    except Exception as e:
+        return False, str(e)
+
+
+def db_get_unreferenced_content_blobs():
+    try:
+        return True, ContentBlob.objects.filter(
+            Q(product_images__isnull=True) & Q(certificate_documents__isnull=True)
+        ).order_by('id')
+    except Exception as e:
+        return False, str(e)
@@ -0,0 +1,37 @@
+import logging
+
+from django.core.management import BaseCommand
+from django.db.transaction import atomic
+
+from catalog.models import ProductVariant, ShippingAndOrdering
+
+logger = logging.getLogger(__name__)
+
+
+class Command(BaseCommand):
+    help = 'Backfill the parsed numeric quantity columns of product variants and shipping details in batches'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=1000)
+
+    def handle(self, *args, **kwargs):
+        batch_size = kwargs['batch_size']
+        for model in (ProductVariant, ShippingAndOrdering):
+            ids = model.objects.order_by('id').values_list('id', flat=True)
+            batch, updated = [], 0
+            for _id in ids.iterator(chunk_size=batch_size):
+                batch.append(_id)
+                if len(batch) == batch_size:
+                    updated += self._backfill(model, batch)
+                    batch = []
+            if batch:
+                updated += self._backfill(model, batch)
+            self.stdout.write(self.style.SUCCESS(f'Backfilled {updated} {model._meta.verbose_name_plural}'))
+
+    def _backfill(self, model, ids):
+        with atomic():
+            rows = list(model.objects.select_for_update().filter(id__in=ids).only('id', *model.numeric_fields))
+            for row in rows:
+                row.populate_numeric_fields()
+            model.objects.bulk_update(rows, model.get_numeric_shadow_fields())
+        return len(rows)
@@ -0,0 +1,14 @@
+from django.core.management import BaseCommand
+
+from catalog.tasks import build_similar_products
+
+
+class Command(BaseCommand):
+    help = 'Recompute the similar products neighbors of the products whose text changed, or of all with --full'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--full', action='store_true', help='Recompute the neighbors of every product')
+
+    def handle(self, *args, **kwargs):
+        recomputed = build_similar_products(full=kwargs['full'])
+        self.stdout.write(self.style.SUCCESS(f'Recomputed the similar products of {recomputed} products'))
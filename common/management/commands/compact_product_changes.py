@@ -0,0 +1,30 @@
+import logging
+
+from django.core.management import BaseCommand
+from django.db.models import Max, Min
+
+from catalog.db_interactors import db_compact_product_changes
+from catalog.models import ProductChange
+
+logger = logging.getLogger(__name__)
+
+
+class Command(BaseCommand):
+    help = 'Drop product change log entries superseded by a later change of the same product'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=10000, help='Log ids scanned per delete statement')
+
+    def handle(self, *args, **kwargs):
+        batch_size = kwargs['batch_size']
+        bounds = ProductChange.objects.aggregate(first=Min('id'), last=Max('id'))
+        if bounds['first'] is None:
+            self.stdout.write(self.style.SUCCESS('Product change log is empty'))
+            return
+        compacted = 0
+        for start in range(bounds['first'] - 1, bounds['last'], batch_size):
+            status, deleted = db_compact_product_changes(start=start, end=min(start + batch_size, bounds['last']))
+            if not status:
+                raise Exception(f'Error occured while compacting the product change log {deleted}')
+            compacted += deleted
+        self.stdout.write(self.style.SUCCESS(f'Removed {compacted} superseded product changes'))
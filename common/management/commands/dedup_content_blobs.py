@@ -0,0 +1,122 @@
+import logging
+import os
+import shutil
+from tempfile import NamedTemporaryFile
+
+from django.core.management import BaseCommand
+
+from accounts.models import CertificateDocument
+from catalog.db_interactors import db_touch_products, db_log_product_changes
+from catalog.models import ProductImages, ProductChange
+from catalog.tasks import refresh_product_cards
+from catalog.utils import bump_product_detail_versions
+from common.db_interactors import db_link_content_blob, db_get_unreferenced_content_blobs
+from utils.constants import CONTENT_BLOB_HASH_ALGORITHM, CONTENT_BLOB_TEMP_DIRECTORY
+from utils.helpers import get_stored_file_hash
+from utils.storage import content_addressed_storage, get_content_blob_digest, get_content_blob_name
+
+logger = logging.getLogger(__name__)
+
+CONTENT_BLOB_FIELDS = (
+    (ProductImages, 'image'),
+    (CertificateDocument, 'document'),
+)
+
+
+class Command(BaseCommand):
+    help = 'Move stored product images and certificate documents into content addressed blobs, collapsing duplicates'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=200)
+        parser.add_argument(
+            '--prune', action='store_true', help='Also delete blobs no longer referenced by any row'
+        )
+
+    def handle(self, *args, **kwargs):
+        batch_size = kwargs['batch_size']
+        self.storage = content_addressed_storage
+        collapsed, stored = 0, 0
+        for model, field_name in CONTENT_BLOB_FIELDS:
+            ids = model.objects.filter(blob__isnull=True).exclude(**{f'{field_name}__isnull': True}).exclude(
+                **{field_name: ''}
+            ).order_by('id').values_list('id', flat=True)
+            batch = []
+            for _id in ids.iterator(chunk_size=batch_size):
+                batch.append(_id)
+                if len(batch) == batch_size:
+                    batch_collapsed, batch_stored = self._dedup(model, field_name, batch)
+                    collapsed, stored, batch = collapsed + batch_collapsed, stored + batch_stored, []
+            if batch:
+                batch_collapsed, batch_stored = self._dedup(model, field_name, batch)
+                collapsed, stored = collapsed + batch_collapsed, stored + batch_stored
+        self.stdout.write(self.style.SUCCESS(f'Stored {stored} new blobs and collapsed {collapsed} duplicate files'))
+
+        if kwargs['prune']:
+            self.stdout.write(self.style.SUCCESS(f'Pruned {self._prune()} unreferenced blobs'))
+
+    def _dedup(self, model, field_name: str, ids: list):
+        collapsed, stored, legacy_names, product_ids = 0, 0, set(), set()
+        for instance in model.objects.filter(id__in=ids):
+            name = getattr(instance, field_name).name
+            if get_content_blob_digest(name) is None:
+                path = self.storage.path(name)
+                if not os.path.exists(path):
+                    logger.warning(f'Skipping {model.__name__} {instance.id}, {name} is missing from storage')
+                    continue
+                digest = get_stored_file_hash(path, algorithm=CONTENT_BLOB_HASH_ALGORITHM)
+                blob_name = get_content_blob_name(digest, name)
+                if self.storage.exists(blob_name):
+                    collapsed += 1
+                else:
+                    self._store_blob(path, blob_name)
+                    stored += 1
+
+                updates = {field_name: blob_name}
+                if getattr(instance, 'derivatives_source', None) == name:
+                    # Same bytes, so the derivatives rendered from the old file stay valid
+                    updates['derivatives_source'] = blob_name
+                model.objects.filter(id=instance.id).update(**updates)
+                setattr(instance, field_name, blob_name)
+                legacy_names.add(name)
+
+            status, response = db_link_content_blob(instance=instance, field_name=field_name)
+            if not status:
+                raise Exception(f'Error occured while linking {model.__name__} {instance.id} to its blob {response}')
+            if hasattr(instance, 'product_id'):
+                product_ids.add(instance.product_id)
+
+        # Legacy files are removed only after every row pointing at them moved, so an interrupted run can resume
+        for name in legacy_names:
+            if not any(
+                    other_model.objects.filter(**{other_field_name: name}).exists()
+                    for other_model, other_field_name in CONTENT_BLOB_FIELDS
+            ):
+                self.storage.delete(name)
+
+        if product_ids:
+            product_ids = list(product_ids)
+            db_touch_products(product_ids=product_ids)
+            db_log_product_changes(product_ids=product_ids, action=ProductChange.Action.UPDATED)
+            refresh_product_cards(product_ids)
+            bump_product_detail_versions(product_ids)
+        return collapsed, stored
+
+    def _store_blob(self, path: str, blob_name: str):
+        # Copied rather than moved, other rows may still point at the legacy file
+        temp_directory = self.storage.path(CONTENT_BLOB_TEMP_DIRECTORY)
+        os.makedirs(temp_directory, exist_ok=True)
+        with open(path, 'rb') as source, NamedTemporaryFile(dir=temp_directory, delete=False) as temp_file:
+            shutil.copyfileobj(source, temp_file)
+        self.storage.store_blob(temp_file.name, blob_name)
+
+    def _prune(self):
+        status, blobs = db_get_unreferenced_content_blobs()
+        if not status:
+            raise Exception(f'Error occured while fetching unreferenced blobs {blobs}')
+        pruned = 0
+        for blob in blobs.iterator():
+            blob.delete()
+            if os.path.exists(self.storage.path(blob.path)):
+                os.remove(self.storage.path(blob.path))
+            pruned += 1
+        return pruned
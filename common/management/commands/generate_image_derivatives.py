@@ -0,0 +1,35 @@
+import logging
+import os
+from concurrent.futures import ProcessPoolExecutor
+
+from django.core.management import BaseCommand
+
+from catalog.models import ProductImages
+from catalog.tasks import generate_image_derivatives
+
+logger = logging.getLogger(__name__)
+
+
+class Command(BaseCommand):
+    help = 'Generate missing or outdated product image thumbnails and WebP variants with a pool of processes'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--workers', type=int, default=os.cpu_count())
+        # Originals of a batch are held in memory while the pool renders them.
+        parser.add_argument('--batch-size', type=int, default=None)
+
+    def handle(self, *args, **kwargs):
+        workers = kwargs['workers']
+        batch_size = kwargs['batch_size'] or workers * 4
+        image_ids = ProductImages.objects.order_by('id').values_list('id', flat=True)
+        processed = 0
+        with ProcessPoolExecutor(max_workers=workers) as executor:
+            batch = []
+            for image_id in image_ids.iterator(chunk_size=batch_size):
+                batch.append(image_id)
+                if len(batch) == batch_size:
+                    processed += generate_image_derivatives(batch, map_function=executor.map)
+                    batch = []
+            if batch:
+                processed += generate_image_derivatives(batch, map_function=executor.map)
+        self.stdout.write(self.style.SUCCESS(f'Generated derivatives of {processed} product images'))
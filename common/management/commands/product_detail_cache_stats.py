@@ -0,0 +1,13 @@
+from django.core.management import BaseCommand
+
+from catalog.utils import get_product_detail_cache_stats
+
+
+class Command(BaseCommand):
+    help = 'Show hit/miss counters of the product detail cache'
+
+    def handle(self, *args, **kwargs):
+        stats = get_product_detail_cache_stats()
+        self.stdout.write(self.style.SUCCESS(
+            f"hits: {stats['hits']}, misses: {stats['misses']}, hit ratio: {stats['hit_ratio']}"
+        ))
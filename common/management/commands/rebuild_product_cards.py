@@ -0,0 +1,34 @@
+import logging
+
+from django.core.management import BaseCommand
+
+from catalog.db_interactors import db_refresh_product_cards
+from catalog.models import Product
+
+logger = logging.getLogger(__name__)
+
+
+class Command(BaseCommand):
+    help = 'Rebuild the denormalized ProductCard read model in batches'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=500)
+
+    def handle(self, *args, **kwargs):
+        batch_size = kwargs['batch_size']
+        product_ids = Product.objects.order_by('id').values_list('id', flat=True)
+        batch, rebuilt = [], 0
+        for product_id in product_ids.iterator(chunk_size=batch_size):
+            batch.append(product_id)
+            if len(batch) == batch_size:
+                rebuilt += self._rebuild(batch)
+                batch = []
+        if batch:
+            rebuilt += self._rebuild(batch)
+        self.stdout.write(self.style.SUCCESS(f'Rebuilt {rebuilt} product cards'))
+
+    def _rebuild(self, product_ids):
+        status, cards = db_refresh_product_cards(product_ids=product_ids)
+        if not status:
+            raise Exception(f'Error occured while rebuilding product cards {cards}')
+        return len(cards)
@@ -0,0 +1,26 @@
+from django.core.management import BaseCommand
+
+from catalog.db_interactors import db_iter_in_stock_product_ids
+from catalog.utils import rebuild_product_stock_bitmap
+
+
+class Command(BaseCommand):
+    help = 'Rebuild the Redis availability bitmap of in-stock products from ProductConfig, e.g. after a cold start'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=5000)
+
+    def handle(self, *args, **kwargs):
+        counter = {'products': 0}
+
+        def count(product_ids):
+            for product_id in product_ids:
+                counter['products'] += 1
+                yield product_id
+
+        status, response = rebuild_product_stock_bitmap(
+            count(db_iter_in_stock_product_ids(chunk_size=kwargs['batch_size']))
+        )
+        if not status:
+            raise Exception(f'Error occured while rebuilding the stock bitmap {response}')
+        self.stdout.write(self.style.SUCCESS(f'Rebuilt the stock bitmap with {counter["products"]} in-stock products'))
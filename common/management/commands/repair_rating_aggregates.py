@@ -0,0 +1,40 @@
+import logging
+
+from django.core.management import BaseCommand
+
+from catalog.db_interactors import db_repair_product_rating_aggregates, db_log_product_changes
+from catalog.models import Product, ProductChange
+from catalog.tasks import refresh_product_cards
+from catalog.utils import bump_product_detail_versions
+
+logger = logging.getLogger(__name__)
+
+
+class Command(BaseCommand):
+    help = 'Recompute the rating and review aggregates of products in batches and fix the ones that drifted'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=500)
+
+    def handle(self, *args, **kwargs):
+        batch_size = kwargs['batch_size']
+        product_ids = Product.objects.order_by('id').values_list('id', flat=True)
+        batch, repaired = [], 0
+        for product_id in product_ids.iterator(chunk_size=batch_size):
+            batch.append(product_id)
+            if len(batch) == batch_size:
+                repaired += self._repair(batch)
+                batch = []
+        if batch:
+            repaired += self._repair(batch)
+        self.stdout.write(self.style.SUCCESS(f'Repaired rating aggregates of {repaired} products'))
+
+    def _repair(self, product_ids):
+        status, repaired_ids = db_repair_product_rating_aggregates(product_ids=product_ids)
+        if not status:
+            raise Exception(f'Error occured while repairing rating aggregates {repaired_ids}')
+        if repaired_ids:
+            db_log_product_changes(product_ids=repaired_ids, action=ProductChange.Action.UPDATED)
+            refresh_product_cards(repaired_ids)
+            bump_product_detail_versions(repaired_ids)
+        return len(repaired_ids)
@@ -0,0 +1,24 @@
+# Generated by Django 4.0.7 on 2026-10-18 16:10
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    initial = True
+
+    dependencies = [
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ContentBlob',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('sha256', models.CharField(db_index=True, max_length=64, verbose_name='SHA-256')),
+                ('path', models.CharField(max_length=255, unique=True, verbose_name='Path')),
+                ('size', models.PositiveBigIntegerField(default=0, verbose_name='Size')),
+                ('created', models.DateTimeField(auto_now_add=True)),
+            ],
+        ),
+    ]
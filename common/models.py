@@ -0,0 +1,15 @@
+from django.db import models
+from django.utils.translation import gettext_lazy as _
+
+
+class ContentBlob(models.Model):
+    """
+    A stored file, kept once per distinct content under a name derived from its SHA-256 digest
+    """
+    sha256 = models.CharField(_('SHA-256'), max_length=64, db_index=True)
+    path = models.CharField(_('Path'), max_length=255, unique=True)
+    size = models.PositiveBigIntegerField(_('Size'), default=0)
+    created = models.DateTimeField(auto_now_add=True)
+
+    def __str__(self):
+        return f"{self.pk}, {self.path}"
@@ -0,0 +1,24 @@
+import logging
+
+from django.db.models.signals import post_save
+from django.dispatch import receiver
+
+from accounts.models import CertificateDocument
+from catalog.models import ProductImages
+from .db_interactors import db_link_content_blob
+
+logger = logging.getLogger(__name__)
+
+
+@receiver(post_save, sender=ProductImages)
+def product_image_stored(sender, instance, **kwargs):
+    status, response = db_link_content_blob(instance=instance, field_name='image')
+    if not status:
+        logger.warning(f'Could not link product image {instance.id} to its content blob: {response}')
+
+
+@receiver(post_save, sender=CertificateDocument)
+def certificate_document_stored(sender, instance, **kwargs):
+    status, response = db_link_content_blob(instance=instance, field_name='document')
+    if not status:
+        logger.warning(f'Could not link certificate document {instance.id} to its content blob: {response}')
@@ -53,6 +53,7 @@ INSTALLED_APPS = [
     'django.contrib.sessions',
     'django.contrib.messages',
     'django.contrib.staticfiles',
+    'django.contrib.postgres',
     'django_extensions',
     'rest_framework',
     # developed apps
@@ -64,7 +65,9 @@ INSTALLED_APPS = [
     'notification',
     'utils',
     # 3rd party apps
-    'corsheaders'
+    'corsheaders',
+    'django_elasticsearch_dsl',
+    'mptt'
 ]
 
 MIDDLEWARE = [
@@ -214,7 +217,61 @@ REST_FRAMEWORK = {
 IMAGE_MIME_TYPES = ['image/jpeg', 'image/jpg', 'image/png']
 MAX_PRODUCT_IMAGE_SIZE = 10000000  # 10 MB
 
+# Cache
+# Redis backs the cache once REDIS_CACHE_URL is set; without it Django's local memory cache stays the default.
+# The availability bitmap needs Redis and falls back to the database while it is unavailable.
+
+REDIS_CACHE_URL = env('REDIS_CACHE_URL', default=None)
+if REDIS_CACHE_URL:
+    CACHES = {
+        'default': {
+            'BACKEND': 'django_redis.cache.RedisCache',
+            'LOCATION': REDIS_CACHE_URL,
+            'OPTIONS': {
+                'CLIENT_CLASS': 'django_redis.client.DefaultClient',
+            }
+        }
+    }
+else:
+    CACHES = {
+        'default': {
+            'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+        }
+    }
+
+# Search
+# Filter backend answering ?search= on the product list. The default matches the stored Postgres tsvector; any
+# filter backend reading the same parameter can take its place.
+
+PRODUCT_SEARCH_FILTER_BACKEND = env(
+    'PRODUCT_SEARCH_FILTER_BACKEND', default='catalog.filters.ProductFullTextSearchFilter'
+)
+
+# Elasticsearch
+# Index updates on catalog writes only run when search is enabled, so writes never depend on a missing cluster.
+
+ELASTICSEARCH_ENABLED = env.bool('ELASTICSEARCH_ENABLED', default=False)
+ELASTICSEARCH_DSL = {
+    'default': {
+        'hosts': env('ELASTICSEARCH_HOST', default='localhost:9200')
+    },
+}
+ELASTICSEARCH_DSL_AUTOSYNC = ELASTICSEARCH_ENABLED
+ELASTICSEARCH_DSL_AUTO_REFRESH = False
+
 # Celery
 
 CELERY_BROKER_URL = 'redis://localhost:6379/0'
-CELERY_RESULT_BACKEND = 'redis://localhost:6379/0'
\ No newline at end of file
+CELERY_RESULT_BACKEND = 'redis://localhost:6379/0'
+CELERY_BEAT_SCHEDULE = {
+    # Only categories touched since their last snapshot are regenerated, so frequent runs stay cheap
+    'publish-catalog-snapshots': {
+        'task': 'PublishCatalogSnapshots',
+        'schedule': crontab(minute='*/15'),
+    },
+    # Incremental, only products whose text changed and the neighbors they affect are recomputed
+    'build-similar-products': {
+        'task': 'BuildSimilarProducts',
+        'schedule': crontab(minute=30),
+    },
+}
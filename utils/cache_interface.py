@@ -1,4 +1,5 @@
 from django.core.cache import cache
+from django_redis import get_redis_connection
 
 
 def get_value(key: str = None):
@@ -21,3 +22,97 @@ def remove_keys(key_list: list = None):
         return True, cache.delete_many(key_list)
     except Exception as e:
         return False, str(e)
+
+
+def add_value(key: str = None, value=None, expire_on: int = 2592000):
+    # Sets the value only when the key does not exist yet.
+    try:
+        return True, cache.add(key, value, expire_on)
+    except Exception as e:
+        return False, str(e)
+
+
+def increment_value(key: str = None, delta: int = 1, expire_on: int = 2592000):
+    try:
+        cache.add(key, 0, expire_on)
+        return True, cache.incr(key, delta)
+    except Exception as e:
+        return False, str(e)
+
+
+def get_many_values(key_list: list = None):
+    # Returns a dict holding only the keys that were found.
+    try:
+        return True, cache.get_many(key_list)
+    except Exception as e:
+        return False, str(e)
+
+
+def set_many_values(data: dict = None, expire_on: int = 2592000):
+    try:
+        return True, cache.set_many(data, expire_on)
+    except Exception as e:
+        return False, str(e)
+
+
+"""
+Bitmaps start. These talk to Redis directly, outside of the cache key prefixing and serialization.
+"""
+# Sets bits only while the bitmap exists, so writes during a cold start never create a partial bitmap
+SET_EXISTING_BITS_SCRIPT = """
+if redis.call('EXISTS', KEYS[1]) == 0 then
+    return 0
+end
+for index = 1, #ARGV, 2 do
+    redis.call('SETBIT', KEYS[1], ARGV[index], ARGV[index + 1])
+end
+return 1
+"""
+
+
+def get_bitmap_bits(key: str = None, offsets: list = None):
+    # Returns the bits at the offsets as booleans in one round trip, None when the bitmap does not exist.
+    try:
+        pipeline = get_redis_connection('default').pipeline(transaction=False)
+        pipeline.exists(key)
+        for offset in offsets:
+            pipeline.getbit(key, offset)
+        exists, *bits = pipeline.execute()
+        return True, [bool(bit) for bit in bits] if exists else None
+    except Exception as e:
+        return False, str(e)
+
+
+def set_existing_bitmap_bits(key: str = None, bits: dict = None):
+    # bits is {offset: 0 or 1}
+    try:
+        arguments = [argument for offset, value in bits.items() for argument in (offset, int(bool(value)))]
+        return True, bool(get_redis_connection('default').eval(SET_EXISTING_BITS_SCRIPT, 1, key, *arguments))
+    except Exception as e:
+        return False, str(e)
+
+
+def replace_bitmap(key: str = None, offsets=None, chunk_size: int = 10000):
+    # Builds the bitmap of the given set offsets under a temporary key and renames it over the old one.
+    try:
+        connection = get_redis_connection('default')
+        temp_key = f'{key}:REBUILD'
+        connection.delete(temp_key)
+        connection.setbit(temp_key, 0, 0)
+        pipeline, pending = connection.pipeline(transaction=False), 0
+        for offset in offsets:
+            pipeline.setbit(temp_key, offset, 1)
+            pending += 1
+            if pending == chunk_size:
+                pipeline.execute()
+                pending = 0
+        pipeline.execute()
+        connection.rename(temp_key, key)
+        return True, key
+    except Exception as e:
+        return False, str(e)
+
+
+"""
+Bitmaps end.
+"""
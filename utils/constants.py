@@ -211,4 +211,15 @@ Bucket start
 DATA_MIGRATION_BUCKET = 'pinakasolutions-migration-data'
 """
 Bucket end
-"""
\ No newline at end of file
+"""
+
+"""
+Content addressed storage start
+"""
+FILE_HASH_CHUNK_SIZE = 64 * 2 ** 10
+CONTENT_BLOB_DIRECTORY = 'blobs'
+CONTENT_BLOB_TEMP_DIRECTORY = 'blobs/tmp'
+CONTENT_BLOB_HASH_ALGORITHM = 'sha256'
+"""
+Content addressed storage end
+"""
@@ -46,3 +46,14 @@ def es_filter_search_records(search, q_filters) -> tuple[bool, any]:
 
 def es_bulk_create(actions_data: List[dict]) -> Tuple[int, Union[int, dict]]:
     return bulk(connections.get_connection(), actions=actions_data, raise_on_exception=True, stats_only=False)
+
+
+def es_search_records(search, query=None, offset: int = 0, limit: int = 10, source: list = None) -> tuple[bool, any]:
+    try:
+        if query is not None:
+            search = search.query(query)
+        if source:
+            search = search.source(includes=source)
+        return True, search[offset:offset + limit].execute()
+    except Exception as e:
+        return False, str(e)
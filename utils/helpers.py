@@ -18,11 +18,13 @@ from PIL import Image
 from django.core.files.uploadedfile import InMemoryUploadedFile
 from django.core.mail import EmailMultiAlternatives
 from django.template.loader import render_to_string
+from django.utils.http import http_date, parse_etags, parse_http_date_safe, quote_etag
 from django.utils.timezone import now, timedelta
 from pronto.settings import DEFAULT_FROM_EMAIL, SERVER_EMAIL, BACK_END_HOST
 from rest_framework.response import Response
 from rest_framework.status import (
     HTTP_200_OK,
+    HTTP_304_NOT_MODIFIED,
     HTTP_400_BAD_REQUEST,
     HTTP_404_NOT_FOUND, HTTP_403_FORBIDDEN
 )
@@ -34,7 +36,7 @@ from .constants import (
     INSUFFICIENT_PERMISSIONS,
     RESOURCE_NOT_FOUND, BRONZE_GEMS, BRONZE_BADGE, SILVER_GEMS, SILVER_BADGE, GOLD_GEMS, GOLD_BADGE, DIAMOND_GEMS,
     DIAMOND_BADGE, CHAMPION_GEMS, CHAMPION_BADGE, DEFAULT_SUPPORT_EMAIL, CORPORATE_HOST_LIST, DEFAULT_ORGANIZATION_NAME,
-    DEFAULT_ORG_LOGO_URL, MAILGUN_DOMAIN
+    DEFAULT_ORG_LOGO_URL, MAILGUN_DOMAIN, FILE_HASH_CHUNK_SIZE
 )
 import re
 
@@ -60,6 +62,35 @@ def create_response(
     return Response(status=status, data={'status': data_status, 'message': message, 'data': data})
 
 
+def get_etag(*parts) -> str:
+    return quote_etag(md5(':'.join(str(part) for part in parts).encode()).hexdigest())
+
+
+def get_not_modified_response(request, etag: str = None, last_modified=None):
+    """
+    Returns a 304 response when the request's If-None-Match / If-Modified-Since validators match,
+    otherwise None. If-None-Match takes precedence as per RFC 7232.
+    """
+    if_none_match = request.headers.get('If-None-Match')
+    if if_none_match is not None:
+        client_etags = [tag[2:] if tag.startswith('W/') else tag for tag in parse_etags(if_none_match)]
+        if not etag or not ('*' in client_etags or etag in client_etags):
+            return None
+    else:
+        if_modified_since = parse_http_date_safe(request.headers.get('If-Modified-Since') or '')
+        if if_modified_since is None or not last_modified or int(last_modified.timestamp()) > if_modified_since:
+            return None
+    return set_conditional_headers(Response(status=HTTP_304_NOT_MODIFIED), etag, last_modified)
+
+
+def set_conditional_headers(response: Response, etag: str = None, last_modified=None) -> Response:
+    if etag:
+        response['ETag'] = etag
+    if last_modified:
+        response['Last-Modified'] = http_date(last_modified.timestamp())
+    return response
+
+
 def calculate_file_size(file=None):
     file.seek(0, SEEK_END)
     size = file.tell()
@@ -67,19 +98,23 @@ def calculate_file_size(file=None):
     return size
 
 
-def get_stored_file_hash(file_path=None):
-    md5_obj = md5()
+def get_stored_file_hash(file_path=None, algorithm: str = 'md5'):
     with open(file_path, 'rb') as file:
-        hash_value = file.read()
-        md5_obj.update(hash_value)
-        return md5_obj.hexdigest()
-
-
-def get_in_memory_file_hash(file=None):
-    md5_obj = md5()
-    hash_value = file.read()
-    md5_obj.update(hash_value)
-    return md5_obj.hexdigest()
+        return get_in_memory_file_hash(file=file, algorithm=algorithm)
+
+
+def get_in_memory_file_hash(file=None, algorithm: str = 'md5', sink=None):
+    """
+    Hex digest of a file read chunk by chunk, so large uploads are never held in memory whole. Each chunk is also
+    handed to `sink` when given, which lets a caller store the file in the same pass that hashes it.
+    """
+    hash_obj = hashlib.new(algorithm)
+    chunks = file.chunks() if hasattr(file, 'chunks') else iter(lambda: file.read(FILE_HASH_CHUNK_SIZE), b'')
+    for chunk in chunks:
+        hash_obj.update(chunk)
+        if sink is not None:
+            sink(chunk)
+    return hash_obj.hexdigest()
 
 
 def load_request_json_data(request_data=None, json_key_list=None):
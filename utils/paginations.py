@@ -1,7 +1,180 @@
-from rest_framework.pagination import PageNumberPagination
+import json
+from base64 import urlsafe_b64decode, urlsafe_b64encode
+from collections import OrderedDict
+from datetime import datetime, time
+
+from django.core.exceptions import FieldDoesNotExist, ValidationError
+from django.core.serializers.json import DjangoJSONEncoder
+from django.db.models import Q
+from rest_framework.exceptions import NotFound
+from rest_framework.pagination import BasePagination, PageNumberPagination
+from rest_framework.response import Response
+from rest_framework.utils.urls import replace_query_param
 
 
 class StandardResultsSetPagination(PageNumberPagination):
     page_size = 10
     page_size_query_param = 'page_size'
-    max_page_size = 100
\ No newline at end of file
+    max_page_size = 100
+
+
+class CursorJSONEncoder(DjangoJSONEncoder):
+    """
+    DjangoJSONEncoder cuts datetimes and times to milliseconds. A cursor must carry the exact boundary value, or
+    the rows sharing the boundary millisecond after the last returned one are skipped by the next page.
+    """
+
+    def default(self, o):
+        if isinstance(o, (datetime, time)):
+            return o.isoformat()
+        return super().default(o)
+
+
+class KeysetCursorPagination(BasePagination):
+    """
+    Keyset pagination on the queryset ordering.
+
+    The cursor carries the ordering values of the boundary row, so every page is a range scan on the ordering
+    index and no COUNT query is issued. A unique `pk` tiebreaker is appended to the ordering when missing.
+
+    A filter backend can leave a check to the page by setting `page_candidate_filter` on the view, a callable
+    taking a list of rows and returning a keep flag per row. Candidates are then read in batches following the
+    ordering until the page is full.
+    """
+    page_size = 10
+    page_size_query_param = 'page_size'
+    max_page_size = 100
+    cursor_query_param = 'cursor'
+    ordering = ('-pk',)
+    invalid_cursor_message = 'Invalid cursor'
+    candidate_batch_factor = 2
+
+    def paginate_queryset(self, queryset, request, view=None):
+        self.request = request
+        self.base_url = request.build_absolute_uri()
+        self.page_size = self.get_page_size(request)
+        self.ordering = self.get_ordering(queryset)
+        self.cursor = self.decode_cursor(request)
+
+        reverse = bool(self.cursor and self.cursor['reverse'])
+        if self.cursor:
+            position = self.parse_position(queryset, self.cursor['position'])
+            queryset = queryset.filter(self.get_position_filter(position, reverse))
+        queryset = queryset.order_by(*self.get_ordering_for_direction(reverse))
+        candidate_filter = getattr(view, 'page_candidate_filter', None)
+        if candidate_filter is None:
+            results = list(queryset[:self.page_size + 1])
+        else:
+            results = self.get_filtered_results(queryset, candidate_filter, reverse)
+        has_more = len(results) > self.page_size
+        self.page = results[:self.page_size]
+
+        if reverse:
+            self.page.reverse()
+            self.has_next, self.has_previous = True, has_more
+        else:
+            self.has_next, self.has_previous = has_more, self.cursor is not None
+        return self.page
+
+    def get_filtered_results(self, queryset, candidate_filter, reverse: bool) -> list:
+        results, batch_size, batch_queryset = [], (self.page_size + 1) * self.candidate_batch_factor, queryset
+        while len(results) <= self.page_size:
+            batch = list(batch_queryset[:batch_size])
+            results.extend(row for row, keep in zip(batch, candidate_filter(batch)) if keep)
+            if len(batch) < batch_size:
+                break
+            batch_queryset = queryset.filter(self.get_position_filter(self.get_position(batch[-1]), reverse))
+        return results[:self.page_size + 1]
+
+    def get_page_size(self, request):
+        try:
+            page_size = int(request.query_params[self.page_size_query_param])
+        except (KeyError, ValueError):
+            return self.page_size
+        if page_size <= 0:
+            return self.page_size
+        return min(page_size, self.max_page_size)
+
+    def get_ordering(self, queryset):
+        ordering = [
+            field for field in (queryset.query.order_by or queryset.model._meta.ordering or self.ordering)
+            if isinstance(field, str)
+        ]
+        if not {'id', '-id', 'pk', '-pk'}.intersection(ordering):
+            ordering.append('-pk' if ordering and ordering[0].startswith('-') else 'pk')
+        return ordering
+
+    def get_ordering_for_direction(self, reverse: bool):
+        if not reverse:
+            return self.ordering
+        return [field[1:] if field.startswith('-') else f'-{field}' for field in self.ordering]
+
+    def get_position_filter(self, position: list, reverse: bool) -> Q:
+        position_filter, equal_filter = Q(), Q()
+        for field, value in zip(self.ordering, position):
+            name = field.lstrip('-')
+            lookup = 'gt' if field.startswith('-') == reverse else 'lt'
+            position_filter |= equal_filter & Q(**{f'{name}__{lookup}': value})
+            equal_filter &= Q(**{name: value})
+        return position_filter
+
+    def parse_position(self, queryset, position: list) -> list:
+        # Cursor values come back from JSON as strings, the ordering fields turn them into their Python types again
+        values = []
+        for field, value in zip(self.ordering, position):
+            try:
+                model_field, model = None, queryset.model
+                for name in field.lstrip('-').split('__'):
+                    model_field = model._meta.pk if name == 'pk' else model._meta.get_field(name)
+                    model = model_field.related_model or model
+            except FieldDoesNotExist:
+                values.append(value)
+                continue
+            try:
+                values.append(None if value is None else model_field.to_python(value))
+            except ValidationError:
+                raise NotFound(self.invalid_cursor_message)
+        return values
+
+    def get_position(self, instance) -> list:
+        position = []
+        for field in self.ordering:
+            value = instance
+            for attr in field.lstrip('-').split('__'):
+                value = getattr(value, attr, None)
+            position.append(value)
+        return position
+
+    def encode_cursor(self, reverse: bool, instance) -> str:
+        data = {'reverse': reverse, 'ordering': self.ordering, 'position': self.get_position(instance)}
+        return urlsafe_b64encode(json.dumps(data, cls=CursorJSONEncoder).encode()).decode()
+
+    def decode_cursor(self, request):
+        encoded = request.query_params.get(self.cursor_query_param)
+        if not encoded:
+            return None
+        try:
+            cursor = json.loads(urlsafe_b64decode(encoded.encode()))
+        except (TypeError, ValueError):
+            raise NotFound(self.invalid_cursor_message)
+        if not isinstance(cursor, dict) or cursor.get('ordering') != self.ordering \
+                or len(cursor.get('position') or []) != len(self.ordering):
+            raise NotFound(self.invalid_cursor_message)
+        return cursor
+
+    def get_next_link(self):
+        if not self.has_next or not self.page:
+            return None
+        return replace_query_param(self.base_url, self.cursor_query_param, self.encode_cursor(False, self.page[-1]))
+
+    def get_previous_link(self):
+        if not self.has_previous or not self.page:
+            return None
+        return replace_query_param(self.base_url, self.cursor_query_param, self.encode_cursor(True, self.page[0]))
+
+    def get_paginated_response(self, data):
+        return Response(OrderedDict([
+            ('next', self.get_next_link()),
+            ('previous', self.get_previous_link()),
+            ('results', data)
+        ]))
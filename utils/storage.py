@@ -0,0 +1,65 @@
+import os
+from tempfile import NamedTemporaryFile
+
+from django.core.files.storage import FileSystemStorage
+from django.utils.deconstruct import deconstructible
+
+from .constants import CONTENT_BLOB_DIRECTORY, CONTENT_BLOB_TEMP_DIRECTORY, CONTENT_BLOB_HASH_ALGORITHM
+from .helpers import get_in_memory_file_hash
+
+
+def get_content_blob_name(digest: str, file_name: str) -> str:
+    """Storage name of the blob holding content with this digest, fanned out over two directory levels."""
+    extension = os.path.splitext(file_name or '')[1].lower()
+    return f'{CONTENT_BLOB_DIRECTORY}/{digest[:2]}/{digest[2:4]}/{digest}{extension}'
+
+
+def get_content_blob_digest(name: str):
+    """Digest encoded in a blob name, None for files stored outside the blob directory."""
+    if not name or not name.startswith(f'{CONTENT_BLOB_DIRECTORY}/'):
+        return None
+    digest = os.path.splitext(os.path.basename(name))[0]
+    return digest if get_content_blob_name(digest, name) == name else None
+
+
+@deconstructible
+class ContentAddressedStorage(FileSystemStorage):
+    """
+    File system storage that names every file after the hash of its content.
+
+    The upload is hashed while it is streamed to a temporary file, which is then renamed to its blob name. When a
+    blob with the same content already exists the temporary file is dropped and the existing name is returned, so
+    a repeated upload costs one read and no stored copy. The requested name only contributes its extension.
+    """
+
+    def get_available_name(self, name, max_length=None):
+        return name
+
+    def _save(self, name, content):
+        temp_directory = self.path(CONTENT_BLOB_TEMP_DIRECTORY)
+        os.makedirs(temp_directory, exist_ok=True)
+        with NamedTemporaryFile(dir=temp_directory, delete=False) as temp_file:
+            digest = get_in_memory_file_hash(file=content, algorithm=CONTENT_BLOB_HASH_ALGORITHM, sink=temp_file.write)
+
+        blob_name = get_content_blob_name(digest, name)
+        if self.exists(blob_name):
+            os.remove(temp_file.name)
+            return blob_name
+        self.store_blob(temp_file.name, blob_name)
+        return blob_name
+
+    def store_blob(self, file_path: str, blob_name: str):
+        """Moves a local file into place as the blob, atomically so readers never see a partial blob."""
+        blob_path = self.path(blob_name)
+        os.makedirs(os.path.dirname(blob_path), exist_ok=True)
+        if self.file_permissions_mode is not None:
+            os.chmod(file_path, self.file_permissions_mode)
+        os.replace(file_path, blob_path)
+
+    def delete(self, name):
+        # Blobs are shared between rows, unreferenced ones are removed by the dedup_content_blobs command
+        if get_content_blob_digest(name) is None:
+            super().delete(name)
+
+
+content_addressed_storage = ContentAddressedStorage()